@@ -7,7 +7,7 @@ import sys
 import asyncio
 import argparse
 import shutil
-from repo_analyzer import RepoAnalyzer, ExcelHandler
+from repo_analyzer import RepoAnalyzer, MirrorCache, ExcelHandler
 from logger_config import LoggerConfig
 
 logger = LoggerConfig.setup_logger('analyze_repos')
@@ -43,7 +43,8 @@ class AnalysisRunner:
             ExcelHandler.export_results(
                 repos_data,
                 self.analyzer.output_file,
-                self.analyzer.small_file_threshold
+                self.analyzer.small_file_threshold,
+                self.analyzer.output_mode
             )
 
             self.print_summary(repos_data)
@@ -73,11 +74,14 @@ class AnalysisRunner:
         total = len(repos_data)
         analyzed = sum(1 for r in repos_data if r['status'] == 'analyzed')
         failed = sum(1 for r in repos_data if r['status'] == 'clone_failed')
+        analysis_failed = sum(1 for r in repos_data if r['status'] == 'analysis_failed')
         no_url = sum(1 for r in repos_data if r['status'] == 'no_url')
 
         print(f"Total Repositories: {total}")
         print(f"Successfully Analyzed: {analyzed}")
         print(f"Clone Failed: {failed}")
+        if analysis_failed:
+            print(f"Analysis Failed: {analysis_failed}")
         print(f"No URL: {no_url}")
 
         if analyzed > 0:
@@ -108,19 +112,37 @@ Example:
   python analyze_repos.py --input Output_12.xlsx --output custom_output.xlsx
   python analyze_repos.py --input Output_12.xlsx --no-cleanup
   python analyze_repos.py --input Output_12.xlsx --temp-dir MyRepos
+  python analyze_repos.py --input Output_12.xlsx --workers 16
+  python analyze_repos.py --input Output_12.xlsx --large-repo-files 2000 --scan-threads 16
+  python analyze_repos.py --input Output_12.xlsx --clone-mode bare
+  python analyze_repos.py --input Output_12.xlsx --mirror-cache RepoCache --mirror-cache-size 4096
         """
     )
 
     parser.add_argument('--input', type=str, default='Output_12.xlsx',
-                        help='Input Excel file with GitHub URLs (default: Output_12.xlsx)')
+                        help='Input file with GitHub URLs, .xlsx/.csv/.jsonl/.parquet (default: Output_12.xlsx)')
     parser.add_argument('--output', type=str, default='Output_23.xlsx',
-                        help='Output Excel file with analysis results (default: Output_23.xlsx)')
+                        help='Output file with analysis results, format by extension (default: Output_23.xlsx)')
     parser.add_argument('--temp-dir', type=str, default='TempFiles',
                         help='Directory to store cloned repositories (default: TempFiles)')
     parser.add_argument('--no-cleanup', action='store_true',
                         help='Keep cloned repositories after analysis (default: cleanup)')
     parser.add_argument('--small-file-threshold', type=int, default=150,
                         help='Maximum line count for a file to be considered "small" (default: 150)')
+    parser.add_argument('--output-mode', choices=['overwrite', 'upsert'], default='overwrite',
+                        help="'upsert' adds new and updates changed rows of the output file by ID (default: overwrite)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Processes analyzing repositories in parallel (default: one per CPU)')
+    parser.add_argument('--large-repo-files', type=int, default=5000,
+                        help='Files from which a repository is counted on a thread pool, 0 disables it (default: 5000)')
+    parser.add_argument('--scan-threads', type=int, default=8,
+                        help='Threads counting the files of a large repository (default: 8)')
+    parser.add_argument('--clone-mode', choices=['checkout', 'bare'], default='checkout',
+                        help="'bare' counts lines from a bare clone without writing a working tree (default: checkout)")
+    parser.add_argument('--mirror-cache', type=str, default=None,
+                        help='Directory of persistent repository mirrors; repeat analyses fetch only new commits (default: off)')
+    parser.add_argument('--mirror-cache-size', type=int, default=2048,
+                        help='Size in MB above which least recently used mirrors are removed (default: 2048)')
 
     args = parser.parse_args()
 
@@ -128,11 +150,20 @@ Example:
         input_file=args.input,
         output_file=args.output,
         temp_dir=args.temp_dir,
-        small_file_threshold=args.small_file_threshold
+        small_file_threshold=args.small_file_threshold,
+        output_mode=args.output_mode,
+        workers=args.workers,
+        large_repo_files=args.large_repo_files,
+        scan_threads=args.scan_threads,
+        clone_mode=args.clone_mode,
+        mirror_cache=MirrorCache(args.mirror_cache, args.mirror_cache_size) if args.mirror_cache else None
     )
 
     runner = AnalysisRunner(analyzer)
-    await runner.run(cleanup=not args.no_cleanup)
+    try:
+        await runner.run(cleanup=not args.no_cleanup)
+    finally:
+        analyzer.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Line Counter Benchmark - Compare LineCounter with text-mode counting on a synthetic repository
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+from repo_analyzer import LineCounter
+from repo_analyzer.line_counter import BINARY_PREFIX
+
+LINE_ENDINGS = [b'\n', b'\n', b'\n', b'\r\n', b'\r']
+
+
+def make_text(rng, lines):
+    """Build file content with mixed line endings, stray invalid UTF-8 and an optional final line break"""
+    ending = rng.choice(LINE_ENDINGS)
+    parts = []
+    for number in range(lines):
+        line = f"    value_{number} = compute({number}, 'text')  # é".encode('utf-8')
+        if rng.random() < 0.01:
+            line += b'\xff\xfe'
+        parts.append(line + ending)
+    content = b''.join(parts)
+    if content and rng.random() < 0.2:
+        content = content[:-len(ending)]
+    return content
+
+
+def make_repo(root, files, seed):
+    """
+    Build a reproducible repository tree
+
+    Most files are small, a few are large; about 5% are binary. A '.git'
+    directory is added that the counters must skip.
+
+    Returns:
+        Total size of the files in bytes
+    """
+    rng = random.Random(seed)
+    size = 0
+    for index in range(files):
+        folder = os.path.join(root, f"pkg{index % 20}", f"module{index % 7}")
+        os.makedirs(folder, exist_ok=True)
+        if rng.random() < 0.05:
+            content = bytes(rng.randrange(256) for _ in range(4096)) + b'\0'
+            name = f"asset{index}.png"
+        else:
+            lines = rng.randint(1000, 5000) if rng.random() < 0.1 else rng.randint(0, 200)
+            content = make_text(rng, lines)
+            name = f"file{index}.py"
+        with open(os.path.join(folder, name), 'wb') as f:
+            f.write(content)
+        size += len(content)
+
+    git_dir = os.path.join(root, '.git', 'objects')
+    os.makedirs(git_dir)
+    with open(os.path.join(git_dir, 'pack'), 'wb') as f:
+        f.write(b'ignored\n' * 10000)
+    return size
+
+
+def text_mode_count(file_path):
+    """Count lines by iterating the file in text mode, as RepoAnalyzer did before LineCounter"""
+    try:
+        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+            return sum(1 for _ in f)
+    except Exception:
+        return 0
+
+
+def is_binary(file_path):
+    """Whether LineCounter treats a file as binary"""
+    with open(file_path, 'rb') as f:
+        return b'\0' in f.read(BINARY_PREFIX)
+
+
+def walk_files(root):
+    """List files with os.walk(), skipping '.git'"""
+    paths = []
+    for folder, dirs, files in os.walk(root):
+        if '.git' in dirs:
+            dirs.remove('.git')
+        paths.extend(os.path.join(folder, file) for file in files)
+    return paths
+
+
+def time_best(func, repeat):
+    """Run func repeatedly and return (best seconds, last result)"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    """Main function to run the line counter benchmark"""
+    parser = argparse.ArgumentParser(
+        description='Compare LineCounter with text-mode line counting on a synthetic repository'
+    )
+    parser.add_argument('--files', type=int, default=5000,
+                        help='Number of files in the synthetic repository (default: 5000)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Number of timed runs; the best is reported (default: 3)')
+    parser.add_argument('--threshold', type=int, default=150,
+                        help='Small file threshold in lines (default: 150)')
+    parser.add_argument('--threads', type=int, default=0,
+                        help='Also time LineCounter.tally_parallel on this many threads (default: off)')
+    parser.add_argument('--seed', type=int, default=42,
+                        help='Random seed for the repository (default: 42)')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='line_counter_bench_')
+    try:
+        print(f"Building synthetic repository of {args.files} files in {root}...")
+        size = make_repo(root, args.files, args.seed)
+        print(f"Repository size: {size / (1 << 20):.1f} MiB")
+
+        legacy_time, legacy_counts = time_best(
+            lambda: {path: text_mode_count(path) for path in walk_files(root)}, args.repeat)
+        counter_time, counts = time_best(
+            lambda: LineCounter.count_repo(root, args.threshold), args.repeat)
+
+        paths = sorted(legacy_counts)
+        if args.threads:
+            parallel_time, parallel_counts = time_best(
+                lambda: LineCounter.tally_parallel(list(LineCounter.iter_files(root)), args.threshold, args.threads),
+                args.repeat)
+        binary = {path for path in paths if is_binary(path)}
+        text_paths = [path for path in paths if path not in binary]
+        mismatched = [path for path in text_paths if LineCounter.count_lines(path) != legacy_counts[path]]
+        expected = (sum(legacy_counts[path] for path in text_paths),
+                    sum(legacy_counts[path] for path in text_paths if legacy_counts[path] < args.threshold))
+
+        print(f"\n{'='*70}")
+        print(f"Text-mode count:  {legacy_time:.3f}s ({len(paths) / legacy_time:,.0f} files/second)")
+        print(f"LineCounter:      {counter_time:.3f}s ({len(paths) / counter_time:,.0f} files/second)")
+        print(f"Speedup:          {legacy_time / counter_time:.1f}x (best of {args.repeat})")
+        if args.threads:
+            label = f"{args.threads} threads:"
+            print(f"{label:<18}{parallel_time:.3f}s "
+                  f"({len(paths) / parallel_time:,.0f} files/second, {legacy_time / parallel_time:.1f}x)")
+        print(f"Totals:           {counts[0]} lines, {counts[1]} in small files; "
+              f"{len(binary)} binary files skipped")
+        if mismatched or counts != expected or (args.threads and parallel_counts != counts):
+            print(f"✗ Counts differ from text mode for {len(mismatched)} files")
+        else:
+            print(f"✓ Counts match text mode for all {len(text_paths)} text files")
+        print(f"{'='*70}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -36,7 +36,7 @@ Examples:
     parser.add_argument(
         '--input',
         default='Output_34.xlsx',
-        help='Input Excel file with feedback messages (default: Output_34.xlsx)'
+        help='Input file with feedback messages, .xlsx/.csv/.jsonl/.parquet (default: Output_34.xlsx)'
     )
 
     parser.add_argument(
@@ -4,6 +4,7 @@ Gmail draft creation module
 import base64
 from email.mime.text import MIMEText
 from googleapiclient.errors import HttpError
+from gmail_api_pkg import QuotaScheduler
 from logger_config import LoggerConfig
 from .gmail_auth import GmailAuthenticator
 from .excel_reader import ExcelReader
@@ -14,17 +15,23 @@ logger = LoggerConfig.setup_logger('email_drafter')
 class EmailDrafter:
     """Create Gmail draft messages from feedback messages"""
 
-    def __init__(self, input_file='Output_34.xlsx', credentials_file='credentials.json'):
+    def __init__(self, input_file='Output_34.xlsx', credentials_file='credentials.json',
+                 scheduler=None, journal=None):
         """
         Initialize EmailDrafter
 
         Args:
             input_file: Excel file with feedback messages
             credentials_file: Path to OAuth credentials
+            scheduler: QuotaScheduler pacing API calls (defaults to the shared one)
+            journal: Optional stage journal (see pipeline_pkg.RunJournal); IDs
+                it holds a draft for are not drafted again
         """
         self.input_file = input_file
         self.credentials_file = credentials_file
         self.authenticator = GmailAuthenticator(credentials_file)
+        self.scheduler = scheduler or QuotaScheduler.shared()
+        self.journal = journal
         self.service = None
         self.data = []
 
@@ -50,13 +57,8 @@ class EmailDrafter:
             Draft ID if successful, None otherwise
         """
         try:
-            if subject_prefix:
-                subject = f"{subject_prefix} - Feedback message to {repo_id}"
-            else:
-                subject = f"Feedback message to {repo_id}"
-
             message = MIMEText(feedback_message)
-            message['subject'] = subject
+            message['subject'] = EmailDrafter.draft_subject(repo_id, subject_prefix)
 
             raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode('utf-8')
 
@@ -66,10 +68,10 @@ class EmailDrafter:
                 }
             }
 
-            draft = self.service.users().drafts().create(
+            draft = self.scheduler.execute(self.service.users().drafts().create(
                 userId='me',
                 body=draft_body
-            ).execute()
+            ))
 
             return draft['id']
 
@@ -84,6 +86,79 @@ class EmailDrafter:
             print(f"  ✗ Unexpected error: {e}")
             return None
 
+    @staticmethod
+    def draft_subject(repo_id, subject_prefix=None):
+        """Subject line of the draft for a repository"""
+        if subject_prefix:
+            return f"{subject_prefix} - Feedback message to {repo_id}"
+        return f"Feedback message to {repo_id}"
+
+    def create_draft_once(self, repo_id, feedback_message, subject_prefix=None):
+        """
+        Create a draft unless the journal shows it was already created
+
+        The ID is marked pending in the journal before the draft is created.
+        If a previous run stopped between creating a draft and recording it,
+        the draft is looked up by subject instead of being created twice.
+
+        Args:
+            repo_id: Repository ID for subject line
+            feedback_message: The feedback message content
+            subject_prefix: Optional subject prefix
+
+        Returns:
+            Tuple (draft ID or None, True if the draft already existed)
+        """
+        if self.journal is None:
+            return self.create_draft(repo_id, feedback_message, subject_prefix), False
+
+        saved = self.journal.get(repo_id)
+        if saved is not None:
+            return saved['draft_id'], True
+
+        draft_id = None
+        if self.journal.is_pending(repo_id):
+            draft_id = self.find_draft(EmailDrafter.draft_subject(repo_id, subject_prefix))
+        existed = draft_id is not None
+
+        if draft_id is None:
+            self.journal.mark_pending(repo_id)
+            draft_id = self.create_draft(repo_id, feedback_message, subject_prefix)
+
+        if draft_id:
+            self.journal.record(repo_id, {'draft_id': draft_id})
+        return draft_id, existed
+
+    def find_draft(self, subject):
+        """
+        Find an existing draft by its exact subject
+
+        Args:
+            subject: Subject line of the draft
+
+        Returns:
+            Draft ID, or None if there is no such draft or the lookup failed
+        """
+        try:
+            response = self.scheduler.execute(self.service.users().drafts().list(
+                userId='me',
+                q=f'subject:"{subject}"',
+                maxResults=10
+            ))
+            for draft in response.get('drafts', []):
+                details = self.scheduler.execute(self.service.users().drafts().get(
+                    userId='me',
+                    id=draft['id'],
+                    format='metadata'
+                ))
+                headers = details['message'].get('payload', {}).get('headers', [])
+                if any(h['name'].lower() == 'subject' and h['value'] == subject for h in headers):
+                    logger.info(f"Found existing draft {draft['id']} for '{subject}'")
+                    return draft['id']
+        except HttpError as error:
+            logger.warning(f"Could not look up existing drafts for '{subject}': {error}")
+        return None
+
     def create_all_drafts(self):
         """Create Gmail drafts for all feedback messages"""
         print(f"{'='*70}")
@@ -102,9 +177,14 @@ class EmailDrafter:
             logger.info(f"[{idx}/{len(self.data)}] Creating draft for ID: {repo_id}")
             print(f"[{idx}/{len(self.data)}] Creating draft for ID: {repo_id}")
 
-            draft_id = self.create_draft(repo_id, feedback, subject_prefix)
+            draft_id, existed = self.create_draft_once(repo_id, feedback, subject_prefix)
 
-            if draft_id:
+            if draft_id and existed:
+                logger.info(f"Draft for {repo_id} already created in a previous run, draft_id={draft_id}")
+                print(f"  ✓ Draft already created (ID: {draft_id})")
+                success_count += 1
+                results.append({'id': repo_id, 'draft_id': draft_id, 'status': 'success'})
+            elif draft_id:
                 logger.info(f"Draft created successfully for {repo_id}, draft_id={draft_id}")
                 print(f"  ✓ Draft created successfully (ID: {draft_id})")
                 success_count += 1
@@ -130,10 +210,19 @@ class EmailDrafter:
             'results': results
         }
 
-    def run(self):
-        """Main execution flow"""
+    def run(self, data=None):
+        """
+        Main execution flow
+
+        Args:
+            data: Feedback data handed over in memory, see
+                ExcelReader.from_message_records() (default: read the input file)
+        """
         self.authenticate()
-        self.read_excel_data()
+        if data is not None:
+            self.data = data
+        else:
+            self.read_excel_data()
 
         if not self.data:
             print("No feedback messages found to draft. Exiting.")
@@ -3,7 +3,7 @@ Excel reader for email drafting
 """
 import os
 import sys
-import openpyxl
+from tabular_io_pkg import open_reader
 from logger_config import LoggerConfig
 
 logger = LoggerConfig.setup_logger('email_drafter')
@@ -31,58 +31,59 @@ class ExcelReader:
             sys.exit(1)
 
         try:
-            wb = openpyxl.load_workbook(input_file)
-            ws = wb.active
-
-            headers = [cell.value for cell in ws[1]]
-
-            required_columns = ['ID', 'Feedback Message']
-            column_indices = {}
-
-            for col in required_columns:
-                try:
-                    column_indices[col] = headers.index(col)
-                except ValueError:
-                    for idx, header in enumerate(headers):
-                        if header and col.lower() in header.lower():
-                            column_indices[col] = idx
-                            break
-                    else:
-                        print(f"Error: Required column '{col}' not found in Excel file")
-                        print(f"Available columns: {headers}")
-                        sys.exit(1)
-
-            email_col = None
-            subject_col = None
-            for idx, header in enumerate(headers):
-                if header:
-                    if 'subject' in header.lower():
-                        subject_col = idx
-                    elif 'email' in header.lower() or 'recipient' in header.lower():
-                        email_col = idx
-
-            data = []
-            for row in ws.iter_rows(min_row=2, values_only=True):
-                if not row or not row[column_indices['ID']]:
-                    continue
-
-                repo_id = row[column_indices['ID']]
-                feedback_message = row[column_indices['Feedback Message']]
-
-                if not feedback_message or feedback_message == 'N/A':
-                    continue
-
-                data_row = {
-                    'id': str(repo_id),
-                    'feedback': str(feedback_message),
-                }
-
-                if subject_col is not None and row[subject_col]:
-                    data_row['subject'] = str(row[subject_col])
-                if email_col is not None and row[email_col]:
-                    data_row['recipient'] = str(row[email_col])
-
-                data.append(data_row)
+            with open_reader(input_file) as reader:
+                headers = reader.headers
+
+                required_columns = ['ID', 'Feedback Message']
+                column_indices = {}
+
+                for col in required_columns:
+                    try:
+                        column_indices[col] = headers.index(col)
+                    except ValueError:
+                        for idx, header in enumerate(headers):
+                            if header and col.lower() in header.lower():
+                                column_indices[col] = idx
+                                break
+                        else:
+                            print(f"Error: Required column '{col}' not found in Excel file")
+                            print(f"Available columns: {headers}")
+                            sys.exit(1)
+
+                email_col = None
+                subject_col = None
+                for idx, header in enumerate(headers):
+                    if header:
+                        if 'subject' in header.lower():
+                            subject_col = idx
+                        elif 'email' in header.lower() or 'recipient' in header.lower():
+                            email_col = idx
+
+                id_col = column_indices['ID']
+                feedback_col = column_indices['Feedback Message']
+
+                data = []
+                for row in reader.iter_rows():
+                    if not row or not row[id_col]:
+                        continue
+
+                    repo_id = row[id_col]
+                    feedback_message = row[feedback_col]
+
+                    if not feedback_message or feedback_message == 'N/A':
+                        continue
+
+                    data_row = {
+                        'id': str(repo_id),
+                        'feedback': str(feedback_message),
+                    }
+
+                    if subject_col is not None and row[subject_col]:
+                        data_row['subject'] = str(row[subject_col])
+                    if email_col is not None and row[email_col]:
+                        data_row['recipient'] = str(row[email_col])
+
+                    data.append(data_row)
 
         except Exception as e:
             print(f"Error reading Excel file: {e}")
@@ -93,3 +94,46 @@ class ExcelReader:
         logger.info(f"Found {len(data)} feedback messages to draft")
         print(f"Found {len(data)} feedback messages to draft\n")
         return data
+
+    @staticmethod
+    def from_message_records(message_data):
+        """
+        Build draft input from generated messages handed over in memory
+
+        Produces the dictionaries read_feedback_data() returns for the file
+        the message writer would have written.
+
+        Args:
+            message_data: List of repository data with a 'message' key
+
+        Returns:
+            List of dictionaries with feedback data
+        """
+        data = [row for row in map(ExcelReader.feedback_from_message, message_data) if row is not None]
+
+        logger.info(f"Found {len(data)} feedback messages to draft")
+        print(f"Found {len(data)} feedback messages to draft\n")
+        return data
+
+    @staticmethod
+    def feedback_from_message(repo):
+        """
+        Build the draft input of one generated message
+
+        Args:
+            repo: Repository data dictionary with a 'message' key
+
+        Returns:
+            Dictionary with feedback data, or None if there is nothing to draft
+        """
+        feedback_message = repo.get('message')
+        if not repo['id'] or not feedback_message or feedback_message == 'N/A':
+            return None
+
+        data_row = {
+            'id': str(repo['id']),
+            'feedback': str(feedback_message),
+        }
+        if repo.get('subject'):
+            data_row['subject'] = str(repo['subject'])
+        return data_row
@@ -41,7 +41,7 @@ Examples:
         '--output',
         type=str,
         default='gmail_export.xlsx',
-        help='Output Excel file path (default: gmail_export.xlsx)'
+        help='Output file path; .xlsx, .csv, .jsonl or .parquet (default: gmail_export.xlsx)'
     )
 
     parser.add_argument(
@@ -51,6 +51,43 @@ Examples:
         help='Maximum number of emails to retrieve (default: 100)'
     )
 
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=None,
+        help='Retrieve messages in batches of this size, max 100 (default: one request per message)'
+    )
+
+    parser.add_argument(
+        '--fetch-mode',
+        choices=['full', 'metadata', 'raw'],
+        default='full',
+        help="'metadata' fetches trimmed headers and then only the body parts; "
+             "'raw' fetches the RFC 822 source and parses it locally (default: full)"
+    )
+
+    parser.add_argument(
+        '--parse-workers',
+        type=int,
+        default=None,
+        help='With --fetch-mode raw and --batch-size, parse messages on this many processes'
+    )
+
+    parser.add_argument(
+        '--max-scan-bytes',
+        type=int,
+        default=None,
+        help='Decoded bytes of each message body searched for the repository URL; 0 scans the whole body '
+             '(default: 1048576)'
+    )
+
+    parser.add_argument(
+        '--output-mode',
+        choices=['overwrite', 'upsert'],
+        default='overwrite',
+        help="'upsert' adds new and updates changed rows of an existing output file by ID (default: overwrite)"
+    )
+
     parser.add_argument(
         '--credentials',
         type=str,
@@ -70,10 +107,12 @@ Examples:
         agent = GmailAgent(credentials_file=args.credentials)
         agent.authenticate()
 
-        emails = agent.search_emails(args.query, max_results=args.max)
+        emails = agent.search_emails(args.query, max_results=args.max, batch_size=args.batch_size,
+                                     fetch_mode=args.fetch_mode, parse_workers=args.parse_workers,
+                                     max_scan_bytes=args.max_scan_bytes)
 
         if emails:
-            agent.export_to_excel(emails, output_file=args.output)
+            agent.export_to_excel(emails, output_file=args.output, output_mode=args.output_mode)
             logger.info(f"Session completed successfully - {len(emails)} emails exported")
             print(f"\n✓ Complete! {len(emails)} emails exported to {args.output}")
         else:
@@ -5,5 +5,13 @@ from .agent import GmailAgent
 from .authenticator import GmailAuthenticator
 from .message_parser import MessageParser
 from .excel_exporter import ExcelExporter
+from .batch_fetcher import BatchFetcher
+from .message_fetcher import MessageFetcher
+from .raw_parser import RawMessageParser, ParserPool
+from .sync_state import SyncState
+from .message_cache import MessageCache
+from .message_registry import MessageRegistry
 
-__all__ = ['GmailAgent', 'GmailAuthenticator', 'MessageParser', 'ExcelExporter']
+__all__ = ['GmailAgent', 'GmailAuthenticator', 'MessageParser', 'ExcelExporter', 'BatchFetcher',
+           'MessageFetcher', 'RawMessageParser', 'ParserPool', 'SyncState', 'MessageCache',
+           'MessageRegistry']
@@ -1,113 +1,558 @@
 """
 Gmail Agent main class
 """
+import re
+from concurrent.futures import ThreadPoolExecutor
 from googleapiclient.errors import HttpError
+from gmail_api_pkg import QuotaScheduler
 from logger_config import LoggerConfig
 from .authenticator import GmailAuthenticator
-from .message_parser import MessageParser
 from .excel_exporter import ExcelExporter
+from .batch_fetcher import BatchFetcher
+from .message_fetcher import MessageFetcher, FetchStats
+from .raw_parser import ParserPool
 
 logger = LoggerConfig.setup_logger('gmail_agent')
 
+# Largest page size accepted by messages().list()
+LIST_PAGE_SIZE = 500
+
+# Queries that can be synced incrementally through users().history().list()
+LABEL_QUERY_PATTERN = re.compile(r'^\s*label:("[^"]+"|\S+)\s*$')
+
 
 class GmailAgent:
     """Agent to retrieve Gmail messages and export to Excel"""
 
-    def __init__(self, credentials_file='credentials.json'):
+    def __init__(self, credentials_file='credentials.json', cache=None, registry=None,
+                 scheduler=None):
         """
         Initialize the Gmail Agent
 
         Args:
             credentials_file: Path to the OAuth 2.0 credentials JSON file
+            cache: Optional MessageCache reused for parsed messages and query results
+            registry: Optional MessageRegistry shared by concurrently running agents
+            scheduler: QuotaScheduler pacing API calls (defaults to the shared one)
         """
         self.credentials_file = credentials_file
         self.authenticator = GmailAuthenticator(credentials_file)
+        self.cache = cache
+        self.registry = registry
+        self.scheduler = scheduler or QuotaScheduler.shared()
         self.service = None
+        self.failed_messages = []
+        self.fetch_stats = FetchStats()
 
     def authenticate(self):
         """Authenticate with Gmail API using OAuth 2.0"""
         self.service = self.authenticator.authenticate()
 
-    def search_emails(self, query, max_results=100):
+    def for_worker(self):
+        """
+        Create an agent for another thread
+
+        The worker shares credentials, cache and registry with this agent but
+        gets its own service object and HTTP transport, since httplib2
+        connections are not thread-safe.
+
+        Returns:
+            Authenticated GmailAgent instance
+        """
+        worker = GmailAgent(self.credentials_file, cache=self.cache, registry=self.registry,
+                            scheduler=self.scheduler)
+        worker.authenticator = self.authenticator
+        worker.service = self.authenticator.build_service()
+        return worker
+
+    def search_emails(self, query, max_results=100, batch_size=None, fetch_mode='full',
+                      parse_workers=None, max_scan_bytes=None):
         """
         Search for emails using Gmail search syntax
 
         Args:
             query: Gmail search query
             max_results: Maximum number of emails to retrieve
+            batch_size: If set, retrieve messages through the Gmail batch
+                endpoint with this many gets per HTTP request (max 100).
+                Messages that fail individually are recorded in
+                self.failed_messages instead of failing the search.
+            fetch_mode: 'full', 'metadata' or 'raw', see MessageFetcher
+            parse_workers: Number of processes parsing raw messages, see iter_emails()
+            max_scan_bytes: Decoded body bytes searched for the repository URL, see iter_emails()
 
         Returns:
             List of email data dictionaries
         """
-        logger.info(f"Starting email search with query: '{query}', max_results: {max_results}")
+        try:
+            email_data = list(self.iter_emails(query, max_results, batch_size, fetch_mode,
+                                               parse_workers=parse_workers, max_scan_bytes=max_scan_bytes))
+        except HttpError as error:
+            logger.error(f"Gmail API HttpError: {error}")
+            LoggerConfig.log_exception(logger, error, "search_emails")
+            print(f"An error occurred: {error}")
+            return []
+        except RuntimeError:
+            raise
+        except Exception as error:
+            logger.error(f"Unexpected error in search_emails: {error}")
+            LoggerConfig.log_exception(logger, error, "search_emails")
+            return []
+
+        logger.info(f"Successfully retrieved all {len(email_data)} emails")
+        print(f"Successfully retrieved {len(email_data)} emails")
+        return email_data
+
+    def iter_emails(self, query, max_results=100, batch_size=None, fetch_mode='full',
+                    message_ids=None, parse_workers=None, max_scan_bytes=None):
+        """
+        Iterate over emails matching a query, one parsed record at a time
+
+        Follows nextPageToken until max_results message IDs have been listed.
+        The next list page is requested on a background thread, with its own
+        HTTP transport, while the current page is being retrieved and parsed.
+
+        Args:
+            query: Gmail search query
+            max_results: Maximum number of emails to retrieve (None for no limit)
+            batch_size: If set, retrieve messages in batches of this size
+            fetch_mode: 'full' fetches each message with format='full';
+                'metadata' fetches trimmed headers, then only the body parts;
+                'raw' fetches the RFC 822 source and parses it locally
+            message_ids: Message IDs already listed for the query (for example
+                by the pipeline's QueryPlanner); skips messages().list()
+            parse_workers: With fetch_mode 'raw' and batch_size, parse each
+                batch on this many worker processes
+            max_scan_bytes: Decoded bytes of each body searched for the
+                repository URL (defaults to MessageParser.MAX_SCAN_BYTES, 1 MiB;
+                0 scans the whole body)
+
+        Yields:
+            Email data dictionaries
+        """
+        logger.info(f"Starting email search with query: '{query}', max_results: {max_results}, "
+                    f"fetch_mode: {fetch_mode}")
+        self.failed_messages = []
 
         if not self.service:
             logger.error("Gmail service not initialized - authentication required")
             raise RuntimeError("Not authenticated. Call authenticate() first.")
 
-        try:
+        if message_ids is not None:
+            pages = [message_ids[i:i + LIST_PAGE_SIZE] for i in range(0, len(message_ids), LIST_PAGE_SIZE)]
+        else:
+            print(f"Searching for emails with query: '{query}'")
+            pages = self._iter_query_pages(query, max_results)
+        yield from self._iter_records(pages, query, batch_size, fetch_mode, parse_workers, max_scan_bytes)
+
+    def sync_emails(self, query, sync_state, max_results=100, batch_size=None, fetch_mode='full',
+                    parse_workers=None, max_scan_bytes=None):
+        """
+        Iterate over emails added to a query's results since its last sync
+
+        The first sync of a query, and any sync whose stored historyId has
+        expired, runs a full search. Later syncs call users().history().list()
+        and only retrieve messages added since the stored historyId, so the
+        cost is proportional to new mail. Incremental sync is supported for
+        single-label queries ("label:Name"); other queries always run a full
+        search. The new historyId is recorded in sync_state once iteration
+        completes, and only if every listed message was retrieved: when a
+        full search reaches max_results, or messages fail, the checkpoint
+        stays where it was so the next sync lists them again. Call
+        sync_state.save() to persist it.
+
+        Args:
+            query: Gmail search query
+            sync_state: SyncState holding the per-query historyId checkpoints
+            max_results: Maximum number of emails a full search retrieves (None
+                for no limit); an incremental sync retrieves every new message
+            batch_size: If set, retrieve messages in batches of this size
+            fetch_mode: Message fetch mode, see iter_emails()
+            parse_workers: Number of raw parser processes, see iter_emails()
+            max_scan_bytes: Decoded body bytes searched for the repository URL, see iter_emails()
+
+        Yields:
+            Email data dictionaries
+        """
+        if not self.service:
+            logger.error("Gmail service not initialized - authentication required")
+            raise RuntimeError("Not authenticated. Call authenticate() first.")
+
+        # Taken before listing so that mail arriving during the run is picked up next time
+        current_history_id = self.scheduler.execute(
+            self.service.users().getProfile(userId='me')
+        )['historyId']
+        start_history_id = sync_state.get_history_id(query)
+
+        pages = None
+        if start_history_id is None:
+            logger.info(f"No sync checkpoint for '{query}', running full search")
+        else:
+            label_id = self._resolve_label_id(query)
+            if label_id is None:
+                logger.info(f"Incremental sync not supported for query '{query}', running full search")
+            else:
+                try:
+                    msg_ids = self._history_message_ids(start_history_id, label_id)
+                except HttpError as error:
+                    if error.resp.status != 404:
+                        raise
+                    logger.warning(f"History {start_history_id} for '{query}' expired, running full search")
+                else:
+                    logger.info(f"History since {start_history_id} has {len(msg_ids)} new messages for '{query}'")
+                    print(f"Syncing '{query}': {len(msg_ids)} new messages since last run")
+                    pages = [msg_ids[i:i + LIST_PAGE_SIZE] for i in range(0, len(msg_ids), LIST_PAGE_SIZE)]
+
+        listed = 0
+        full_search = pages is None
+        if full_search:
             print(f"Searching for emails with query: '{query}'")
-            logger.debug(f"Calling Gmail API messages().list() with userId='me', query='{query}'")
-            results = self.service.users().messages().list(
+            # Not from the query cache: a cached listing predates
+            # current_history_id, and mail added since would be skipped for good
+            pages = self._iter_message_id_pages(query, max_results)
+
+        def counted(pages):
+            nonlocal listed
+            for msg_ids in pages:
+                listed += len(msg_ids)
+                yield msg_ids
+
+        self.failed_messages = []
+        yield from self._iter_records(counted(pages), query, batch_size, fetch_mode, parse_workers,
+                                      max_scan_bytes)
+
+        # A full search that reached max_results may have left older matches unlisted
+        truncated = full_search and max_results is not None and listed >= max_results
+        if truncated or self.failed_messages:
+            reason = 'max_results reached' if truncated else f"{len(self.failed_messages)} messages failed"
+            logger.warning(f"Not advancing sync checkpoint for '{query}': {reason}")
+            print(f"  Sync checkpoint for '{query}' not advanced ({reason}); the next sync lists these messages again")
+            return
+        sync_state.set_history_id(query, current_history_id)
+
+    def _iter_records(self, pages, query, batch_size, fetch_mode, parse_workers=None, max_scan_bytes=None):
+        """
+        Retrieve and parse messages page by page
+
+        Args:
+            pages: Iterable of message ID lists
+            query: Gmail search query
+            batch_size: If set, retrieve messages in batches of this size
+            fetch_mode: Message fetch mode, see iter_emails()
+            parse_workers: Number of raw parser processes, see iter_emails()
+            max_scan_bytes: Decoded body bytes searched for the repository URL, see iter_emails()
+
+        Yields:
+            Email data dictionaries
+        """
+        parser_pool = None
+        if batch_size:
+            if fetch_mode == 'raw' and parse_workers and parse_workers > 1:
+                logger.info(f"Parsing raw messages on {parse_workers} worker processes")
+                parser_pool = ParserPool(parse_workers)
+            fetcher = BatchFetcher(self.service, batch_size, fetch_mode, self.scheduler, parser_pool,
+                                   max_scan_bytes)
+        else:
+            fetcher = MessageFetcher(self.service, fetch_mode, self.scheduler, max_scan_bytes)
+        self.fetch_stats = fetcher.stats
+
+        retrieved = 0
+
+        try:
+            for msg_ids in pages:
+                logger.info(f"Retrieving details for {len(msg_ids)} messages")
+
+                for parsed_data in self._retrieve_page(msg_ids, query, fetcher):
+                    retrieved += 1
+                    yield parsed_data
+
+                    if retrieved % 10 == 0:
+                        print(f"  Retrieved {retrieved} messages...")
+                        logger.info(f"Progress: Retrieved {retrieved} messages")
+        finally:
+            if parser_pool is not None:
+                parser_pool.close()
+
+        if retrieved == 0 and not self.failed_messages:
+            logger.info("No messages found matching query")
+            print("No messages found.")
+        else:
+            stats = self.fetch_stats.as_dict()
+            logger.info(f"Fetch stats ({fetch_mode}): {stats['bytes']} bytes, "
+                        f"{stats['bytes_per_message']} bytes/message, "
+                        f"{stats['ms_per_message']} ms/message")
+
+    def _resolve_label_id(self, query):
+        """
+        Resolve the label ID of a single-label query
+
+        Args:
+            query: Gmail search query
+
+        Returns:
+            Label ID, or None if the query is not a single existing label
+        """
+        match = LABEL_QUERY_PATTERN.match(query)
+        if not match:
+            return None
+
+        wanted = match.group(1).strip('"').lower()
+        labels = self.scheduler.execute(
+            self.service.users().labels().list(userId='me')
+        ).get('labels', [])
+        for label in labels:
+            name = label['name'].lower()
+            if wanted in (name, name.replace(' ', '-').replace('/', '-')):
+                return label['id']
+
+        return None
+
+    def _history_message_ids(self, start_history_id, label_id):
+        """
+        List messages that gained a label since a historyId
+
+        Args:
+            start_history_id: historyId of the last sync
+            label_id: Label the messages must carry
+
+        Returns:
+            List of message IDs, newest first
+
+        Raises:
+            HttpError: 404 when start_history_id is too old to be listed
+        """
+        msg_ids = []
+        seen = set()
+        page_token = None
+
+        while True:
+            results = self.scheduler.execute(self.service.users().history().list(
+                userId='me',
+                startHistoryId=start_history_id,
+                labelId=label_id,
+                historyTypes=['messageAdded', 'labelAdded'],
+                maxResults=LIST_PAGE_SIZE,
+                pageToken=page_token
+            ))
+
+            for record in results.get('history', []):
+                added = [m['message'] for m in record.get('messagesAdded', [])]
+                added += [m['message'] for m in record.get('labelsAdded', [])
+                          if label_id in m.get('labelIds', [])]
+                for message in added:
+                    if label_id in message.get('labelIds', []) and message['id'] not in seen:
+                        seen.add(message['id'])
+                        msg_ids.append(message['id'])
+
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+
+        msg_ids.reverse()
+        return msg_ids
+
+    def _iter_query_pages(self, query, max_results):
+        """
+        Iterate over pages of message IDs, served from the cache when fresh
+
+        Args:
+            query: Gmail search query
+            max_results: Maximum number of IDs to list (None for no limit)
+
+        Yields:
+            Lists of message IDs
+        """
+        if self.cache is not None:
+            cached_ids = self.cache.get_query_ids(query, max_results)
+            if cached_ids is not None:
+                logger.info(f"Using cached result of {len(cached_ids)} message IDs for '{query}'")
+                for start in range(0, len(cached_ids), LIST_PAGE_SIZE):
+                    yield cached_ids[start:start + LIST_PAGE_SIZE]
+                return
+
+        listed = []
+        for msg_ids in self._iter_message_id_pages(query, max_results):
+            listed.extend(msg_ids)
+            yield msg_ids
+
+        if self.cache is not None:
+            self.cache.put_query_ids(query, max_results, listed)
+
+    def _iter_message_id_pages(self, query, max_results):
+        """
+        Iterate over pages of message IDs returned by messages().list()
+
+        Args:
+            query: Gmail search query
+            max_results: Maximum number of IDs to list (None for no limit)
+
+        Yields:
+            Lists of message IDs, one list per page
+        """
+        remaining = max_results
+
+        def list_page(page_token, http=None):
+            page_size = LIST_PAGE_SIZE if remaining is None else min(remaining, LIST_PAGE_SIZE)
+            logger.debug(f"Calling messages().list() with query='{query}', pageToken={page_token}")
+            request = self.service.users().messages().list(
                 userId='me',
                 q=query,
-                maxResults=max_results
-            ).execute()
+                maxResults=page_size,
+                pageToken=page_token
+            )
+            return self.scheduler.execute(request, http=http)
 
-            messages = results.get('messages', [])
-            logger.info(f"API returned {len(messages)} message IDs")
+        with ThreadPoolExecutor(max_workers=1) as prefetcher:
+            prefetch_http = None
+            results = list_page(None)
 
-            if not messages:
-                logger.info("No messages found matching query")
-                print("No messages found.")
-                return []
+            while True:
+                msg_ids = [m['id'] for m in results.get('messages', [])]
+                if remaining is not None:
+                    msg_ids = msg_ids[:remaining]
+                    remaining -= len(msg_ids)
+                logger.info(f"API returned {len(msg_ids)} message IDs")
 
-            print(f"Found {len(messages)} messages. Retrieving details...")
-            logger.info(f"Starting to retrieve full details for {len(messages)} messages")
+                next_token = results.get('nextPageToken')
+                next_page = None
+                if next_token and msg_ids and (remaining is None or remaining > 0):
+                    if prefetch_http is None:
+                        prefetch_http = self.authenticator.new_http()
+                    next_page = prefetcher.submit(list_page, next_token, prefetch_http)
 
-            email_data = []
-            for i, message in enumerate(messages, 1):
-                msg_id = message['id']
-                logger.debug(f"Processing message {i}/{len(messages)}, ID: {msg_id}")
+                if msg_ids:
+                    yield msg_ids
 
-                msg = self.service.users().messages().get(
-                    userId='me',
-                    id=msg_id,
-                    format='full'
-                ).execute()
+                if next_page is None:
+                    return
+                results = next_page.result()
 
-                parsed_data = MessageParser.parse_message_metadata(msg, query)
-                email_data.append(parsed_data)
+    def _retrieve_page(self, msg_ids, query, fetcher):
+        """
+        Retrieve and parse the messages of one list page
 
-                if parsed_data['repo_url']:
-                    logger.debug(f"Message {i}: Extracted URL: {parsed_data['repo_url']}")
-                else:
-                    logger.debug(f"Message {i}: No URL found in body")
+        Messages are taken from the cache when possible. With a registry,
+        messages already claimed by another search are awaited instead of
+        fetched again.
 
-                if i % 10 == 0:
-                    print(f"  Retrieved {i}/{len(messages)} messages...")
-                    logger.info(f"Progress: Retrieved {i}/{len(messages)} messages")
+        Args:
+            msg_ids: List of Gmail message IDs
+            query: Gmail search query
+            fetcher: BatchFetcher or MessageFetcher used for retrieval
 
-            logger.info(f"Successfully retrieved all {len(email_data)} emails")
-            print(f"Successfully retrieved {len(email_data)} emails")
-            return email_data
+        Yields:
+            Email data dictionaries in the order of msg_ids
+        """
+        cached = self.cache.get_records(msg_ids) if self.cache is not None else {}
+        if cached:
+            logger.debug(f"{len(cached)}/{len(msg_ids)} messages served from cache")
 
-        except HttpError as error:
-            logger.error(f"Gmail API HttpError: {error}")
-            LoggerConfig.log_exception(logger, error, "search_emails")
-            print(f"An error occurred: {error}")
-            return []
-        except Exception as error:
-            logger.error(f"Unexpected error in search_emails: {error}")
-            LoggerConfig.log_exception(logger, error, "search_emails")
-            return []
+        missing = [msg_id for msg_id in msg_ids if msg_id not in cached]
+        if self.registry is not None:
+            owned, waiting = self.registry.claim(missing)
+        else:
+            owned, waiting = missing, {}
+
+        fetched = self._fetch_owned(owned, query, fetcher)
+
+        for msg_id in msg_ids:
+            if msg_id in cached:
+                yield dict(cached[msg_id], search_criteria=query)
+            elif msg_id in fetched:
+                yield fetched[msg_id]
+            elif msg_id in waiting:
+                try:
+                    record = waiting[msg_id].result()
+                except Exception as e:
+                    self.failed_messages.append({'id': msg_id, 'error': str(e)})
+                    continue
+                yield dict(record, search_criteria=query)
+
+    def _fetch_owned(self, msg_ids, query, fetcher):
+        """
+        Fetch and parse messages that are not cached or claimed elsewhere
+
+        Args:
+            msg_ids: List of Gmail message IDs to fetch
+            query: Gmail search query
+            fetcher: BatchFetcher or MessageFetcher used for retrieval
+
+        Returns:
+            Dictionary mapping message ID to parsed email data
+        """
+        fetched = {}
+        if not msg_ids:
+            return fetched
+
+        try:
+            if isinstance(fetcher, BatchFetcher):
+                email_data, errors = fetcher.fetch_and_parse(msg_ids, query)
+                if errors:
+                    logger.warning(f"{len(errors)} messages could not be retrieved")
+                    print(f"  Warning: {len(errors)} messages could not be retrieved")
+                    self.failed_messages.extend(errors)
+                fetched = {parsed_data['id']: parsed_data for parsed_data in email_data}
+            else:
+                for msg_id in msg_ids:
+                    logger.debug(f"Processing message ID: {msg_id}")
+
+                    msg = fetcher.fetch(msg_id)
+
+                    parsed_data = fetcher.parse(msg, query)
+                    fetched[msg_id] = parsed_data
+
+                    if parsed_data['repo_url']:
+                        logger.debug(f"Message {msg_id}: Extracted URL: {parsed_data['repo_url']}")
+                    else:
+                        logger.debug(f"Message {msg_id}: No URL found in body")
+        except Exception as e:
+            if self.registry is not None:
+                for msg_id in msg_ids:
+                    self.registry.fail(msg_id, e)
+            raise
 
-    def export_to_excel(self, email_data, output_file='gmail_export.xlsx'):
+        if self.cache is not None:
+            self.cache.put_records(list(fetched.values()))
+
+        if self.registry is not None:
+            for msg_id in msg_ids:
+                if msg_id in fetched:
+                    self.registry.complete(msg_id, fetched[msg_id])
+                else:
+                    self.registry.fail(msg_id, RuntimeError(f"Message {msg_id} could not be retrieved"))
+
+        return fetched
+
+    def export_to_excel(self, email_data, output_file='gmail_export.xlsx', output_mode='overwrite'):
         """
         Export email data to Excel file
 
         Args:
             email_data: List of email data dictionaries
             output_file: Output Excel file path
+            output_mode: 'overwrite' or 'upsert', see ExcelExporter
+        """
+        ExcelExporter.export_to_excel(email_data, output_file, output_mode)
+
+    def export_stream(self, email_iter, output_file='gmail_export.xlsx', output_mode='overwrite'):
+        """
+        Export emails to Excel as they are produced by iter_emails()
+
+        Args:
+            email_iter: Iterable of email data dictionaries
+            output_file: Output Excel file path
+            output_mode: 'overwrite' or 'upsert', see ExcelExporter
+
+        Returns:
+            Number of emails exported
+        """
+        return ExcelExporter.export_stream(email_iter, output_file, output_mode)
+
+    def export_empty(self, output_file='gmail_export.xlsx'):
+        """
+        Replace an export with a table holding only the headers
+
+        Args:
+            output_file: Output Excel file path
         """
-        ExcelExporter.export_to_excel(email_data, output_file)
+        ExcelExporter.export_empty(output_file)
@@ -1,15 +1,10 @@
 """
 Gmail authentication module
 """
-import os
-import pickle
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+from gmail_api_pkg import GmailServiceFactory, READONLY_SCOPE
 from logger_config import LoggerConfig
 
-SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
+SCOPES = [READONLY_SCOPE]
 logger = LoggerConfig.setup_logger('gmail_agent')
 
 
@@ -26,63 +21,49 @@ class GmailAuthenticator:
         """
         self.credentials_file = credentials_file
         self.token_file = token_file
+        self.factory = GmailServiceFactory.get(credentials_file, token_file, SCOPES)
+
+    @property
+    def creds(self):
+        """Credential shared by every user of the credentials file"""
+        return self.factory.creds
 
     def authenticate(self):
         """
         Authenticate with Gmail API using OAuth 2.0
 
+        The credential and discovery document are shared process-wide, so
+        only the first authentication in a process reads the token.
+
         Returns:
-            Gmail API service instance
+            Gmail API service instance of the calling thread
         """
         logger.info("Starting Gmail API authentication")
-        creds = None
-
-        if os.path.exists(self.token_file):
-            logger.debug(f"Loading existing token from {self.token_file}")
-            with open(self.token_file, 'rb') as token:
-                creds = pickle.load(token)
-            logger.info("Loaded existing authentication token")
+        service = self.factory.service()
+        logger.info("Gmail API service built successfully")
+        print("Successfully authenticated with Gmail API")
 
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                logger.info("Token expired, refreshing access token")
-                print("Refreshing access token...")
-                creds.refresh(Request())
-                logger.info("Access token refreshed successfully")
-            else:
-                if not os.path.exists(self.credentials_file):
-                    logger.error(f"Credentials file not found: {self.credentials_file}")
-                    raise FileNotFoundError(
-                        f"Credentials file '{self.credentials_file}' not found. "
-                        "Please download it from Google Cloud Console."
-                    )
+        return service
 
-                logger.info("Starting OAuth 2.0 authentication flow")
-                print("Starting OAuth 2.0 authentication flow...")
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    self.credentials_file, SCOPES
-                )
+    def new_http(self):
+        """
+        Create a separate authorized HTTP transport
 
-                try:
-                    logger.debug("Attempting browser authentication")
-                    creds = flow.run_local_server(port=0, open_browser=True)
-                    logger.info("Browser authentication successful")
-                except Exception as e:
-                    logger.warning(f"Browser authentication failed: {e}")
-                    logger.info("Falling back to console authentication")
-                    print(f"\nCouldn't open browser automatically: {e}")
-                    print("\nUsing console authentication flow instead...")
-                    print("You'll receive a URL to visit in your browser.\n")
-                    creds = flow.run_console()
-                    logger.info("Console authentication successful")
+        httplib2 connections are not thread-safe, so every thread issuing
+        requests needs its own transport.
 
-            logger.debug(f"Saving credentials to {self.token_file}")
-            with open(self.token_file, 'wb') as token:
-                pickle.dump(creds, token)
-            logger.info("Credentials saved for future use")
+        Returns:
+            AuthorizedHttp instance using the authenticated credentials
+        """
+        if self.creds is None:
+            raise RuntimeError("Not authenticated. Call authenticate() first.")
+        return self.factory.new_http()
 
-        service = build('gmail', 'v1', credentials=creds)
-        logger.info("Gmail API service built successfully")
-        print("Successfully authenticated with Gmail API")
+    def build_service(self):
+        """
+        Build a Gmail API service with its own HTTP transport
 
-        return service
+        Returns:
+            Gmail API service instance
+        """
+        return self.factory.build_service()
@@ -0,0 +1,161 @@
+"""
+Batched Gmail message retrieval
+"""
+import time
+from gmail_api_pkg import QuotaScheduler
+from logger_config import LoggerConfig
+from .message_fetcher import MessageFetcher
+
+logger = LoggerConfig.setup_logger('gmail_agent')
+
+MAX_BATCH_SIZE = 100
+
+
+class BatchFetcher:
+    """Retrieve Gmail messages through the batch endpoint"""
+
+    def __init__(self, service, batch_size=MAX_BATCH_SIZE, fetch_mode='full', scheduler=None,
+                 parser_pool=None, max_scan_bytes=None):
+        """
+        Initialize the batch fetcher
+
+        Args:
+            service: Authenticated Gmail API service instance
+            batch_size: Number of messages per batch HTTP request. Capped so
+                that a batch never holds more than 100 API requests.
+            fetch_mode: Message fetch mode, see MessageFetcher
+            scheduler: QuotaScheduler (defaults to the shared one)
+            parser_pool: Optional ParserPool parsing raw messages in worker
+                processes (fetch_mode 'raw' only)
+            max_scan_bytes: Decoded body bytes searched for the repository
+                URL, see MessageFetcher
+        """
+        self.service = service
+        self.parser_pool = parser_pool if fetch_mode == 'raw' else None
+        self.scheduler = scheduler or QuotaScheduler.shared()
+        self.fetcher = MessageFetcher(service, fetch_mode, self.scheduler, max_scan_bytes)
+        max_messages = MAX_BATCH_SIZE // self.fetcher.requests_per_message
+        self.batch_size = max(1, min(int(batch_size), max_messages))
+
+    @property
+    def stats(self):
+        """Bytes and latency counters of the underlying MessageFetcher"""
+        return self.fetcher.stats
+
+    def fetch_messages(self, msg_ids):
+        """
+        Retrieve messages for a list of IDs, batch_size messages per HTTP request
+
+        Args:
+            msg_ids: List of Gmail message IDs
+
+        Returns:
+            Tuple (messages, errors): messages maps message ID to the Gmail
+            message object, errors is a list of {'id', 'error'} dictionaries
+            for items that failed inside an otherwise successful batch
+        """
+        messages = {}
+        errors = []
+
+        for start in range(0, len(msg_ids), self.batch_size):
+            pending = msg_ids[start:start + self.batch_size]
+            attempt = 0
+
+            while pending:
+                failed = self._execute_batch(pending, messages)
+
+                retry = [msg_id for msg_id, error in failed.items()
+                         if QuotaScheduler.is_retryable(error)]
+                # One retry of the batch request, against the scheduler's budget
+                if retry and self.scheduler.wait_retry(attempt, failed[retry[0]],
+                                                       f"{len(retry)} throttled batch items"):
+                    attempt += 1
+                else:
+                    retry = []
+
+                for msg_id, error in failed.items():
+                    if msg_id not in retry:
+                        logger.warning(f"Batch item {msg_id} failed: {error}")
+                        errors.append({'id': msg_id, 'error': str(error)})
+                pending = retry
+
+        return messages, errors
+
+    def _execute_batch(self, chunk, messages):
+        """
+        Send one batch HTTP request for a chunk of messages
+
+        Args:
+            chunk: List of message IDs, at most batch_size long
+            messages: Dictionary receiving the combined messages by ID
+
+        Returns:
+            Dictionary mapping the IDs of failed items to their exception
+        """
+        n_requests = self.fetcher.requests_per_message
+        responses = {msg_id: [None] * n_requests for msg_id in chunk}
+        failed = {}
+
+        def callback(request_id, response, exception):
+            msg_id, phase = request_id.rsplit('/', 1)
+            if exception is not None:
+                failed.setdefault(msg_id, exception)
+            else:
+                responses[msg_id][int(phase)] = response
+
+        logger.debug(f"Sending batch of {len(chunk)} messages ({len(chunk) * n_requests} requests)")
+        batch = self.service.new_batch_http_request(callback=callback)
+        units = 0
+        requests = {}
+        for msg_id in chunk:
+            requests[msg_id] = self.fetcher.build_requests(msg_id)
+            for phase, request in enumerate(requests[msg_id]):
+                batch.add(request, request_id=f"{msg_id}/{phase}")
+                units += QuotaScheduler.units_for(request)
+
+        batch_start = time.perf_counter()
+        self.scheduler.execute_batch(batch, units)
+        elapsed = time.perf_counter() - batch_start
+
+        body_bytes = 0
+        for msg_id in chunk:
+            if msg_id not in failed:
+                body_bytes += MessageFetcher.body_bytes(requests[msg_id])
+                messages[msg_id] = self.fetcher.combine(responses[msg_id])
+
+        self.fetcher.stats.record(body_bytes, elapsed, messages=len(chunk) - len(failed))
+        return failed
+
+    def fetch_and_parse(self, msg_ids, query):
+        """
+        Retrieve and parse messages, preserving the order of msg_ids
+
+        Args:
+            msg_ids: List of Gmail message IDs
+            query: Search query used
+
+        Returns:
+            Tuple (email_data, errors) with parsed records and per-item errors
+        """
+        messages, errors = self.fetch_messages(msg_ids)
+        retrieved = [messages[msg_id] for msg_id in msg_ids if msg_id in messages]
+
+        if self.parser_pool is not None:
+            results = self.parser_pool.parse(retrieved, query, self.fetcher.max_scan_bytes)
+        else:
+            results = []
+            for msg in retrieved:
+                try:
+                    results.append((self.fetcher.parse(msg, query), None))
+                except Exception as e:
+                    results.append((None, str(e)))
+
+        email_data = []
+        for msg, (parsed_data, error) in zip(retrieved, results):
+            if error is not None:
+                logger.warning(f"Failed to parse message {msg['id']}: {error}")
+                errors.append({'id': msg['id'], 'error': error})
+            else:
+                email_data.append(parsed_data)
+
+        return email_data, errors
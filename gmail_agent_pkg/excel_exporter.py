@@ -1,24 +1,31 @@
 """
 Excel export functionality for Gmail data
 """
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill
+from itertools import chain
+from tabular_io_pkg import open_writer
 from logger_config import LoggerConfig
 
 logger = LoggerConfig.setup_logger('gmail_agent')
 
 
+HEADERS = ['ID', 'TimeStamp', 'Subject', 'Search Criteria', 'github Repo URL']
+COLUMN_WIDTHS = [20, 20, 50, 30, 60]
+SHEET_TITLE = "Gmail Export"
+
+
 class ExcelExporter:
     """Export email data to Excel files"""
 
     @staticmethod
-    def export_to_excel(email_data, output_file='gmail_export.xlsx'):
+    def export_to_excel(email_data, output_file='gmail_export.xlsx', output_mode='overwrite'):
         """
         Export email data to Excel file
 
         Args:
             email_data: List of email data dictionaries
             output_file: Output Excel file path
+            output_mode: 'overwrite' replaces the file, 'upsert' adds new and
+                updates changed rows by ID
         """
         logger.info(f"Starting Excel export to {output_file}")
 
@@ -30,37 +37,67 @@ class ExcelExporter:
         logger.info(f"Exporting {len(email_data)} emails to {output_file}")
         print(f"Exporting {len(email_data)} emails to {output_file}...")
 
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Gmail Export"
-
-        headers = ['ID', 'TimeStamp', 'Subject', 'Search Criteria', 'github Repo URL']
-        ws.append(headers)
-
-        header_fill = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
-        header_font = Font(bold=True, color='FFFFFF')
-
-        for cell in ws[1]:
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-
-        for email in email_data:
-            ws.append([
-                email['id'],
-                email['timestamp'],
-                email['subject'],
-                email['search_criteria'],
-                email.get('repo_url', '')
-            ])
-
-        ws.column_dimensions['A'].width = 20
-        ws.column_dimensions['B'].width = 20
-        ws.column_dimensions['C'].width = 50
-        ws.column_dimensions['D'].width = 30
-        ws.column_dimensions['E'].width = 60
-
-        logger.debug(f"Saving workbook to {output_file}")
-        wb.save(output_file)
+        ExcelExporter._write(email_data, output_file, output_mode)
+
         logger.info(f"Successfully exported {len(email_data)} emails to {output_file}")
         print(f"Successfully exported to {output_file}")
+
+    @staticmethod
+    def export_stream(email_iter, output_file='gmail_export.xlsx', output_mode='overwrite'):
+        """
+        Export email data to Excel one record at a time
+
+        Uses a write-only workbook so memory stays flat regardless of the
+        number of emails. No file is written when the iterable is empty.
+
+        Args:
+            email_iter: Iterable of email data dictionaries
+            output_file: Output Excel file path
+            output_mode: 'overwrite' replaces the file, 'upsert' adds new and
+                updates changed rows by ID
+
+        Returns:
+            Number of emails exported
+        """
+        logger.info(f"Starting streaming Excel export to {output_file}")
+
+        email_iter = iter(email_iter)
+        first = next(email_iter, None)
+        if first is None:
+            logger.warning("No email data to export")
+            print("No data to export.")
+            return 0
+
+        count = ExcelExporter._write(chain([first], email_iter), output_file, output_mode)
+
+        logger.info(f"Successfully exported {count} emails to {output_file}")
+        print(f"Successfully exported {count} emails to {output_file}")
+        return count
+
+    @staticmethod
+    def export_empty(output_file='gmail_export.xlsx'):
+        """
+        Replace an export with a table holding only the headers
+
+        Args:
+            output_file: Output Excel file path
+        """
+        logger.info(f"Writing empty export to {output_file}")
+        ExcelExporter._write((), output_file)
+
+    @staticmethod
+    def _write(emails, output_file, output_mode='overwrite'):
+        """Write email records through a streaming writer and return the row count"""
+        with open_writer(output_file, HEADERS, SHEET_TITLE, COLUMN_WIDTHS, mode=output_mode) as writer:
+            for email in emails:
+                writer.append([
+                    email['id'],
+                    email['timestamp'],
+                    email['subject'],
+                    email['search_criteria'],
+                    email.get('repo_url', '')
+                ])
+            logger.debug(f"Saving workbook to {output_file}")
+        if output_mode == 'upsert':
+            print(f"  Upserted: {writer.added} added, {writer.updated} updated, {writer.unchanged} unchanged")
+        return writer.count
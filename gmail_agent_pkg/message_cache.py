@@ -0,0 +1,197 @@
+"""
+SQLite-backed cache of parsed Gmail messages and query results
+"""
+import json
+import sqlite3
+import threading
+import time
+from logger_config import LoggerConfig
+
+logger = LoggerConfig.setup_logger('gmail_agent')
+
+
+class MessageCache:
+    """Persist parsed message records and per-query message ID lists"""
+
+    def __init__(self, db_path='gmail_cache.db', query_ttl=3600, max_age=30 * 24 * 3600,
+                 max_entries=50000):
+        """
+        Open (and create if needed) the cache database
+
+        Args:
+            db_path: Path to the SQLite database file
+            query_ttl: Seconds a cached query result stays valid
+            max_age: Seconds a parsed message record is kept
+            max_entries: Maximum number of message records kept
+        """
+        self.db_path = db_path
+        self.query_ttl = query_ttl
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.query_hits = 0
+        self.query_misses = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS messages (
+                id TEXT PRIMARY KEY,
+                record TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS messages_fetched_at ON messages (fetched_at);
+            CREATE TABLE IF NOT EXISTS queries (
+                query TEXT NOT NULL,
+                max_results INTEGER NOT NULL,
+                ids TEXT NOT NULL,
+                cached_at REAL NOT NULL,
+                PRIMARY KEY (query, max_results)
+            );
+        """)
+        self._conn.commit()
+        logger.debug(f"Opened message cache {db_path}")
+
+    def get_records(self, msg_ids):
+        """
+        Look up parsed records by message ID
+
+        Args:
+            msg_ids: List of Gmail message IDs
+
+        Returns:
+            Dictionary mapping the cached message IDs to their records.
+            Records do not contain 'search_criteria'.
+        """
+        if not msg_ids:
+            return {}
+
+        found = {}
+        with self._lock:
+            # Stay below SQLite's bound-parameter limit
+            for start in range(0, len(msg_ids), 500):
+                chunk = msg_ids[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT id, record FROM messages WHERE id IN ({placeholders})", chunk
+                ).fetchall()
+                for msg_id, record in rows:
+                    record = json.loads(record)
+                    # Records cached before label_ids was parsed are treated as misses
+                    if 'label_ids' in record:
+                        found[msg_id] = record
+
+            self.hits += len(found)
+            self.misses += len(msg_ids) - len(found)
+
+        return found
+
+    def put_records(self, records):
+        """
+        Store parsed records
+
+        Args:
+            records: List of email data dictionaries
+        """
+        if not records:
+            return
+
+        now = time.time()
+        rows = []
+        for record in records:
+            stored = {k: v for k, v in record.items() if k != 'search_criteria'}
+            rows.append((record['id'], json.dumps(stored), now))
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO messages (id, record, fetched_at) VALUES (?, ?, ?)", rows
+            )
+            self._conn.commit()
+
+    def get_query_ids(self, query, max_results):
+        """
+        Look up the cached message ID list of a query
+
+        Args:
+            query: Gmail search query
+            max_results: max_results the query was listed with
+
+        Returns:
+            List of message IDs, or None if missing or older than query_ttl
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT ids, cached_at FROM queries WHERE query = ? AND max_results = ?",
+                (query, -1 if max_results is None else max_results)
+            ).fetchone()
+
+            if row is None or time.time() - row[1] > self.query_ttl:
+                self.query_misses += 1
+                return None
+
+            self.query_hits += 1
+            return json.loads(row[0])
+
+    def put_query_ids(self, query, max_results, msg_ids):
+        """
+        Cache the message ID list of a query
+
+        Args:
+            query: Gmail search query
+            max_results: max_results the query was listed with
+            msg_ids: List of message IDs returned by the search
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO queries (query, max_results, ids, cached_at) VALUES (?, ?, ?, ?)",
+                (query, -1 if max_results is None else max_results, json.dumps(msg_ids), time.time())
+            )
+            self._conn.commit()
+
+    def evict(self):
+        """
+        Remove expired entries and trim the message table to max_entries
+
+        Returns:
+            Number of message records removed
+        """
+        now = time.time()
+        with self._lock:
+            removed = self._conn.execute(
+                "DELETE FROM messages WHERE fetched_at < ?", (now - self.max_age,)
+            ).rowcount
+            removed += self._conn.execute(
+                """DELETE FROM messages WHERE id IN (
+                       SELECT id FROM messages ORDER BY fetched_at DESC LIMIT -1 OFFSET ?
+                   )""", (self.max_entries,)
+            ).rowcount
+            self._conn.execute("DELETE FROM queries WHERE cached_at < ?", (now - self.query_ttl,))
+            self._conn.commit()
+
+        if removed:
+            logger.info(f"Evicted {removed} cached messages")
+        return removed
+
+    def stats(self):
+        """
+        Report cache usage
+
+        Returns:
+            Dictionary with hit/miss counters and the number of stored messages
+        """
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'query_hits': self.query_hits,
+            'query_misses': self.query_misses,
+            'entries': entries
+        }
+
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,224 @@
+"""
+Gmail message retrieval in full, two-phase (metadata, then body) or raw mode
+"""
+import time
+from gmail_api_pkg import QuotaScheduler
+from logger_config import LoggerConfig
+from .message_parser import MessageParser
+from .raw_parser import RawMessageParser
+
+logger = LoggerConfig.setup_logger('gmail_agent')
+
+FETCH_MODES = ('full', 'metadata', 'raw')
+
+# Headers used by MessageParser.parse_message_metadata
+METADATA_HEADERS = ['Subject', 'Date', 'From']
+
+# Phase 1: only the headers the parser needs
+METADATA_FIELDS = 'id,labelIds,payload/headers'
+
+# Phase 2: MIME type and inline data of the body parts, three levels deep.
+# Attachments carry an attachmentId instead of inline data, so their
+# content is never downloaded, and per-part headers are dropped. A fields
+# mask selects fields by name, not by value, so the data of a text/html
+# part cannot be left out next to its text/plain sibling; the parser falls
+# back to it for HTML-only messages anyway.
+_PART_FIELDS = 'mimeType,body/data'
+BODY_FIELDS = (
+    f'id,payload({_PART_FIELDS},parts({_PART_FIELDS},'
+    f'parts({_PART_FIELDS},parts({_PART_FIELDS}))))'
+)
+
+# Raw mode: the RFC 822 message, parsed locally with the email package
+RAW_FIELDS = 'id,labelIds,raw'
+
+
+class FetchStats:
+    """Accumulate response body bytes and latency of message retrieval"""
+
+    def __init__(self):
+        """Initialize empty counters"""
+        self.messages = 0
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def record(self, body_bytes, seconds, messages=1):
+        """
+        Record retrieved responses
+
+        Args:
+            body_bytes: Length of the HTTP response bodies, see
+                MessageFetcher.body_bytes()
+            seconds: Time spent retrieving them
+            messages: Number of messages the responses belong to
+        """
+        self.messages += messages
+        self.bytes += body_bytes
+        self.seconds += seconds
+
+    def as_dict(self):
+        """
+        Summarize the counters
+
+        Returns:
+            Dictionary with totals and per-message averages
+        """
+        per_message = self.messages or 1
+        return {
+            'messages': self.messages,
+            'bytes': self.bytes,
+            'bytes_per_message': round(self.bytes / per_message),
+            'ms_per_message': round(self.seconds * 1000 / per_message, 2)
+        }
+
+
+class MessageFetcher:
+    """Build and combine the messages().get() requests for a fetch mode"""
+
+    def __init__(self, service, fetch_mode='full', scheduler=None, max_scan_bytes=None):
+        """
+        Initialize the fetcher
+
+        Args:
+            service: Authenticated Gmail API service instance
+            fetch_mode: 'full' fetches the whole message in one request;
+                'metadata' fetches the Subject/Date/From headers and then
+                only the inline body parts, both trimmed with fields masks;
+                'raw' fetches the RFC 822 source and leaves MIME parsing to
+                parse() (or a ParserPool)
+            scheduler: QuotaScheduler (defaults to the shared one)
+            max_scan_bytes: Decoded body bytes parse() searches for the
+                repository URL (defaults to MessageParser.MAX_SCAN_BYTES;
+                0 scans the whole body)
+        """
+        if fetch_mode not in FETCH_MODES:
+            raise ValueError(f"Unknown fetch_mode '{fetch_mode}', expected one of {FETCH_MODES}")
+        self.service = service
+        self.fetch_mode = fetch_mode
+        self.scheduler = scheduler or QuotaScheduler.shared()
+        self.max_scan_bytes = max_scan_bytes
+        self.stats = FetchStats()
+
+    @property
+    def requests_per_message(self):
+        """Number of API requests needed for one message"""
+        return 2 if self.fetch_mode == 'metadata' else 1
+
+    def build_requests(self, msg_id):
+        """
+        Build the API requests for one message
+
+        Args:
+            msg_id: Gmail message ID
+
+        Returns:
+            List of HttpRequest objects, executed in order; see body_bytes()
+            for the size of their responses
+        """
+        messages = self.service.users().messages()
+
+        if self.fetch_mode == 'full':
+            requests = [messages.get(userId='me', id=msg_id, format='full')]
+        elif self.fetch_mode == 'raw':
+            requests = [messages.get(userId='me', id=msg_id, format='raw', fields=RAW_FIELDS)]
+        else:
+            requests = [
+                messages.get(
+                    userId='me',
+                    id=msg_id,
+                    format='metadata',
+                    metadataHeaders=METADATA_HEADERS,
+                    fields=METADATA_FIELDS
+                ),
+                messages.get(userId='me', id=msg_id, format='full', fields=BODY_FIELDS)
+            ]
+
+        for request in requests:
+            MessageFetcher._measure(request)
+        return requests
+
+    @staticmethod
+    def body_bytes(requests):
+        """Total length of the HTTP response bodies received for executed requests"""
+        return sum(getattr(request, 'body_bytes', 0) for request in requests)
+
+    def combine(self, responses):
+        """
+        Combine the responses for one message into a 'full'-shaped message
+
+        Raw messages are returned unchanged, see parse().
+
+        Args:
+            responses: List of decoded responses, in build_requests() order
+
+        Returns:
+            Gmail message dictionary accepted by parse()
+        """
+        if self.fetch_mode in ('full', 'raw'):
+            return responses[0]
+
+        metadata, body = responses
+        payload = body.get('payload', {})
+        MessageFetcher._fill_bodies(payload)
+        payload['headers'] = metadata.get('payload', {}).get('headers', [])
+
+        return {
+            'id': metadata['id'],
+            'labelIds': metadata.get('labelIds', []),
+            'payload': payload
+        }
+
+    def fetch(self, msg_id):
+        """
+        Retrieve one message
+
+        Args:
+            msg_id: Gmail message ID
+
+        Returns:
+            Gmail message dictionary accepted by parse()
+        """
+        start = time.perf_counter()
+        requests = self.build_requests(msg_id)
+        responses = [self.scheduler.execute(request) for request in requests]
+        self.stats.record(MessageFetcher.body_bytes(requests), time.perf_counter() - start)
+        return self.combine(responses)
+
+    def parse(self, msg, query):
+        """
+        Parse a retrieved message into an email data dictionary
+
+        Args:
+            msg: Message returned by fetch() or combine()
+            query: Search query used
+
+        Returns:
+            Dictionary with parsed message data
+        """
+        if self.fetch_mode == 'raw':
+            return RawMessageParser.parse(msg, query, self.max_scan_bytes)
+        return MessageParser.parse_message_metadata(msg, query, self.max_scan_bytes)
+
+    @staticmethod
+    def _measure(request):
+        """
+        Record the length of a request's HTTP response body as request.body_bytes
+
+        The body reaches postproc() undecoded, both for a single request and
+        for each part of a batch response.
+        """
+        postproc = request.postproc
+        request.body_bytes = 0
+
+        def measured(resp, content):
+            request.body_bytes = len(content)
+            return postproc(resp, content)
+
+        request.postproc = measured
+
+    @staticmethod
+    def _fill_bodies(part):
+        """Restore the 'body' keys that the fields mask omits for empty parts"""
+        part.setdefault('body', {})
+        for child in part.get('parts', []):
+            MessageFetcher._fill_bodies(child)
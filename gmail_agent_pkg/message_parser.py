@@ -3,15 +3,45 @@ Email message parsing utilities
 """
 import re
 import base64
+import codecs
+from datetime import datetime
 from dateutil import parser as date_parser
 from logger_config import LoggerConfig
 
 logger = LoggerConfig.setup_logger('gmail_agent')
 
+GITHUB_URL_PATTERN = re.compile(r'https?://github\.com[^\s<>"{}|\\^`\[\]]+')
+TRAILING_PUNCTUATION = re.compile(r'[,;.\)]+$')
+
+# find_first_url() decodes this many base64 characters at a time (a multiple
+# of 4) and carries enough text between chunks to complete a split
+# "https://github.com" prefix
+SCAN_CHUNK_CHARS = 16384
+URL_PREFIX_CARRY = 24
+
+# Canonical RFC 2822 dates ("Mon, 1 Jan 2024 10:00:00 +0000 (UTC)"), the
+# form nearly every Gmail Date header takes. Anything else goes to dateutil.
+RFC2822_DATE_PATTERN = re.compile(
+    r'^\s*(?:(?:Mon|Tue|Wed|Thu|Fri|Sat|Sun),\s*)?'
+    r'(\d{1,2})\s+(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\s+(\d{4})\s+'
+    r'(\d{2}):(\d{2})(?::(\d{2}))?'
+    r'(?:\s+(?:[+-]\d{4}|UT|UTC|GMT))?(?:\s+\((?:UTC|GMT|[A-Z]{3,4})\))?\s*$'
+)
+MONTHS = {name: number for number, name in enumerate(
+    ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'), start=1
+)}
+
+# Headers read by parse_message_metadata
+METADATA_HEADER_NAMES = frozenset(('Subject', 'Date', 'From'))
+
 
 class MessageParser:
     """Parse and extract information from Gmail messages"""
 
+    # Decoded bytes of a body searched for a repository URL unless a search
+    # sets max_scan_bytes; a URL further into the body is not found
+    MAX_SCAN_BYTES = 1024 * 1024
+
     @staticmethod
     def extract_first_url(text):
         """
@@ -26,16 +56,78 @@ class MessageParser:
         if not text:
             return ''
 
-        url_pattern = r'https?://github\.com[^\s<>"{}|\\^`\[\]]+'
-
-        match = re.search(url_pattern, text)
+        match = GITHUB_URL_PATTERN.search(text)
         if match:
-            url = match.group(0)
-            url = re.sub(r'[,;.\)]+$', '', url)
-            return url
+            return TRAILING_PUNCTUATION.sub('', match.group(0))
 
         return ''
 
+    @staticmethod
+    def format_date(date_str):
+        """
+        Format a Date header as 'YYYY-MM-DD HH:MM:SS' in the header's own time zone
+
+        Canonical RFC 2822 dates are converted directly; other formats are
+        left to dateutil.
+
+        Args:
+            date_str: Value of the Date header
+
+        Returns:
+            Formatted timestamp
+
+        Raises:
+            ValueError: If the date cannot be parsed
+        """
+        match = RFC2822_DATE_PATTERN.match(date_str)
+        if match:
+            day, month, year, hour, minute, second = match.groups()
+            try:
+                # datetime() validates the fields the way dateutil would
+                date_obj = datetime(int(year), MONTHS[month], int(day),
+                                    int(hour), int(minute), int(second or 0))
+                return date_obj.strftime('%Y-%m-%d %H:%M:%S')
+            except ValueError:
+                pass
+
+        return date_parser.parse(date_str).strftime('%Y-%m-%d %H:%M:%S')
+
+    @staticmethod
+    def select_body_data(payload):
+        """
+        Pick the part get_message_body() reads, without decoding anything
+
+        Data on the payload itself is returned as is. Otherwise the parts are
+        scanned in order: a text/plain part with data is returned at once,
+        the first text/html part with data is kept as the fallback, and a
+        nested multipart is searched the same way, its result returned if it
+        has one. A nested multipart without body data discards the kept
+        text/html data, as the decoding version of this method always did.
+
+        Args:
+            payload: Gmail message payload
+
+        Returns:
+            Base64url body data of the selected part, or None if there is none
+        """
+        if 'body' in payload and 'data' in payload['body']:
+            return payload['body']['data']
+
+        data = None
+        for part in payload.get('parts', []):
+            if part['mimeType'] == 'text/plain':
+                if 'data' in part['body']:
+                    return part['body']['data']
+            elif part['mimeType'] == 'text/html' and not data:
+                if 'data' in part['body']:
+                    data = part['body']['data']
+            elif 'parts' in part:
+                data = MessageParser.select_body_data(part)
+                if data:
+                    return data
+
+        return data
+
     @staticmethod
     def get_message_body(payload):
         """
@@ -47,52 +139,92 @@ class MessageParser:
         Returns:
             Email body text
         """
-        body = ''
+        data = MessageParser.select_body_data(payload)
+        if data is None:
+            return ''
+        return base64.urlsafe_b64decode(data).decode('utf-8', errors='ignore')
 
-        if 'body' in payload and 'data' in payload['body']:
-            body = base64.urlsafe_b64decode(payload['body']['data']).decode('utf-8', errors='ignore')
-        elif 'parts' in payload:
-            for part in payload['parts']:
-                if part['mimeType'] == 'text/plain':
-                    if 'data' in part['body']:
-                        body = base64.urlsafe_b64decode(part['body']['data']).decode('utf-8', errors='ignore')
-                        break
-                elif part['mimeType'] == 'text/html' and not body:
-                    if 'data' in part['body']:
-                        body = base64.urlsafe_b64decode(part['body']['data']).decode('utf-8', errors='ignore')
-                elif 'parts' in part:
-                    body = MessageParser.get_message_body(part)
-                    if body:
-                        break
-
-        return body
+    @staticmethod
+    def find_first_url(payload, max_bytes=None):
+        """
+        Find the first repository URL in a message body, decoding it incrementally
+
+        The selected part is base64-decoded and UTF-8-decoded in chunks and
+        scanned as it goes, so the search stops at the first complete match
+        instead of decoding the whole body. Gives the same result as
+        extract_first_url(get_message_body(payload)) for bodies shorter than
+        the byte limit.
+
+        Args:
+            payload: Gmail message payload
+            max_bytes: Stop after this many decoded bytes (defaults to
+                MessageParser.MAX_SCAN_BYTES; 0 scans the whole body)
+
+        Returns:
+            First URL found or empty string
+        """
+        data = MessageParser.select_body_data(payload)
+        if not data:
+            return ''
+
+        if max_bytes is None:
+            max_bytes = MessageParser.MAX_SCAN_BYTES
+        # Four base64 characters decode to three bytes
+        limit = len(data) if not max_bytes else min(len(data), -(-max_bytes // 3) * 4)
+
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+        text = ''
+        match = None
+        for start in range(0, limit, SCAN_CHUNK_CHARS):
+            chunk = data[start:min(start + SCAN_CHUNK_CHARS, limit)]
+            final = start + SCAN_CHUNK_CHARS >= limit
+            text += decoder.decode(base64.urlsafe_b64decode(chunk), final=final)
+
+            match = GITHUB_URL_PATTERN.search(text)
+            if match and match.end() < len(text):
+                break
+            if match:
+                # The URL may continue in the next chunk
+                text = text[match.start():]
+            else:
+                # Keep enough to complete a URL prefix split across chunks
+                text = text[-URL_PREFIX_CARRY:]
+
+        if match:
+            return TRAILING_PUNCTUATION.sub('', match.group(0))
+        return ''
 
     @staticmethod
-    def parse_message_metadata(msg, query):
+    def parse_message_metadata(msg, query, max_scan_bytes=None):
         """
         Parse message metadata and extract key information
 
         Args:
             msg: Gmail message object
             query: Search query used
+            max_scan_bytes: Decoded body bytes searched for the repository
+                URL, see find_first_url()
 
         Returns:
             Dictionary with parsed message data
         """
-        headers = msg['payload']['headers']
-        subject = next((h['value'] for h in headers if h['name'] == 'Subject'), 'No Subject')
-        date_str = next((h['value'] for h in headers if h['name'] == 'Date'), '')
-        from_email = next((h['value'] for h in headers if h['name'] == 'From'), '')
+        # One pass over the headers; the first occurrence of each name wins
+        values = {}
+        for header in msg['payload']['headers']:
+            name = header['name']
+            if name in METADATA_HEADER_NAMES and name not in values:
+                values[name] = header['value']
+        subject = values.get('Subject', 'No Subject')
+        date_str = values.get('Date', '')
+        from_email = values.get('From', '')
 
         try:
-            date_obj = date_parser.parse(date_str)
-            timestamp = date_obj.strftime('%Y-%m-%d %H:%M:%S')
+            timestamp = MessageParser.format_date(date_str)
         except Exception as e:
             logger.warning(f"Failed to parse date '{date_str}': {e}")
             timestamp = date_str
 
-        body = MessageParser.get_message_body(msg['payload'])
-        repo_url = MessageParser.extract_first_url(body)
+        repo_url = MessageParser.find_first_url(msg['payload'], max_scan_bytes)
 
         return {
             'id': msg['id'],
@@ -100,5 +232,6 @@ class MessageParser:
             'subject': subject,
             'from': from_email,
             'search_criteria': query,
-            'repo_url': repo_url
+            'repo_url': repo_url,
+            'label_ids': msg.get('labelIds', [])
         }
@@ -0,0 +1,62 @@
+"""
+Cross-search deduplication of message retrieval
+"""
+import threading
+from concurrent.futures import Future
+
+
+class MessageRegistry:
+    """Make sure each message ID is retrieved once across concurrent searches"""
+
+    def __init__(self):
+        """Initialize an empty registry"""
+        self._lock = threading.Lock()
+        self._futures = {}
+
+    def claim(self, msg_ids):
+        """
+        Claim message IDs for retrieval
+
+        Args:
+            msg_ids: List of Gmail message IDs
+
+        Returns:
+            Tuple (owned, waiting): owned is the list of IDs the caller must
+            retrieve and then complete() or fail(); waiting maps the other IDs
+            to Futures resolved by the search that owns them
+        """
+        owned = []
+        waiting = {}
+
+        with self._lock:
+            for msg_id in msg_ids:
+                future = self._futures.get(msg_id)
+                if future is None:
+                    self._futures[msg_id] = Future()
+                    owned.append(msg_id)
+                else:
+                    waiting[msg_id] = future
+
+        return owned, waiting
+
+    def complete(self, msg_id, record):
+        """
+        Publish a retrieved record
+
+        Args:
+            msg_id: Gmail message ID
+            record: Parsed email data dictionary
+        """
+        self._futures[msg_id].set_result(record)
+
+    def fail(self, msg_id, error):
+        """
+        Publish a retrieval failure
+
+        Args:
+            msg_id: Gmail message ID
+            error: Exception raised while retrieving the message
+        """
+        future = self._futures[msg_id]
+        if not future.done():
+            future.set_exception(error)
@@ -0,0 +1,146 @@
+"""
+Parse format='raw' Gmail messages, optionally in worker processes
+"""
+import base64
+import email
+import email.policy
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from .message_parser import MessageParser
+
+
+class RawMessageParser:
+    """Convert raw RFC 822 messages into the shape MessageParser expects"""
+
+    @staticmethod
+    def to_message(msg):
+        """
+        Convert a format='raw' message into a format='full'-shaped message
+
+        Args:
+            msg: Gmail message with 'id', 'labelIds' and base64url 'raw'
+
+        Returns:
+            Gmail message dictionary accepted by MessageParser
+        """
+        raw = base64.urlsafe_b64decode(msg['raw'])
+        parsed = email.message_from_bytes(raw, policy=email.policy.default)
+
+        return {
+            'id': msg['id'],
+            'labelIds': msg.get('labelIds', []),
+            'payload': RawMessageParser.to_payload(parsed)
+        }
+
+    @staticmethod
+    def to_payload(part):
+        """
+        Build a Gmail payload dictionary for one MIME part
+
+        Like the Gmail API, header values are unfolded and decoded, leaf
+        bodies carry their transfer-decoded bytes as base64url 'data', and
+        parts with a filename are treated as attachments without data.
+
+        Args:
+            part: email.message.EmailMessage
+
+        Returns:
+            Payload dictionary with mimeType, headers, body and parts
+        """
+        payload = {
+            'mimeType': part.get_content_type(),
+            'headers': [{'name': name, 'value': str(value)} for name, value in part.items()]
+        }
+
+        if part.is_multipart():
+            payload['body'] = {'size': 0}
+            payload['parts'] = [RawMessageParser.to_payload(child) for child in part.get_payload()]
+            return payload
+
+        content = part.get_payload(decode=True) or b''
+        if part.get_filename():
+            payload['body'] = {'attachmentId': part.get_filename(), 'size': len(content)}
+        elif content:
+            payload['body'] = {'size': len(content), 'data': base64.urlsafe_b64encode(content).decode('ascii')}
+        else:
+            payload['body'] = {'size': 0}
+
+        return payload
+
+    @staticmethod
+    def parse(msg, query, max_scan_bytes=None):
+        """
+        Parse a format='raw' message into an email data dictionary
+
+        Args:
+            msg: Gmail message with 'id', 'labelIds' and base64url 'raw'
+            query: Search query used
+            max_scan_bytes: Decoded body bytes searched for the repository
+                URL, see MessageParser.find_first_url()
+
+        Returns:
+            Dictionary with the same keys and values as parse_message_metadata()
+        """
+        return MessageParser.parse_message_metadata(RawMessageParser.to_message(msg), query, max_scan_bytes)
+
+
+def parse_raw_task(msg, query, max_scan_bytes=None):
+    """
+    Worker-process task: parse one raw message without raising
+
+    Args:
+        msg: Gmail message with 'id', 'labelIds' and base64url 'raw'
+        query: Search query used
+        max_scan_bytes: Decoded body bytes searched for the repository URL
+
+    Returns:
+        Tuple (record, error): the parsed record and None, or None and the
+        error message
+    """
+    try:
+        return RawMessageParser.parse(msg, query, max_scan_bytes), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+class ParserPool:
+    """Parse raw messages on a pool of worker processes"""
+
+    def __init__(self, workers):
+        """
+        Start the worker processes
+
+        The pool is created from search threads (concurrent searches,
+        background list pages), and forking a threaded process can copy
+        locks held by other threads into the children, so the workers are
+        spawned as fresh interpreters instead.
+
+        Args:
+            workers: Number of parser processes
+        """
+        self.workers = workers
+        self.executor = ProcessPoolExecutor(max_workers=workers,
+                                            mp_context=multiprocessing.get_context('spawn'))
+
+    def parse(self, messages, query, max_scan_bytes=None):
+        """
+        Parse raw messages in parallel, preserving their order
+
+        Args:
+            messages: List of format='raw' Gmail messages
+            query: Search query used
+            max_scan_bytes: Decoded body bytes searched for the repository URL
+
+        Returns:
+            List of (record, error) tuples, see parse_raw_task()
+        """
+        if not messages:
+            return []
+        chunksize = max(1, len(messages) // (self.workers * 4))
+        return list(self.executor.map(parse_raw_task, messages, repeat(query), repeat(max_scan_bytes),
+                                      chunksize=chunksize))
+
+    def close(self):
+        """Shut the worker processes down"""
+        self.executor.shutdown()
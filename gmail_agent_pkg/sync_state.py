@@ -0,0 +1,63 @@
+"""
+Persistent historyId checkpoints for incremental Gmail sync
+"""
+import json
+import os
+import threading
+from datetime import datetime
+from logger_config import LoggerConfig
+
+logger = LoggerConfig.setup_logger('gmail_agent')
+
+
+class SyncState:
+    """Store the last synced Gmail historyId for each search query"""
+
+    def __init__(self, state_file='gmail_sync_state.json'):
+        """
+        Initialize sync state, loading existing checkpoints if present
+
+        Args:
+            state_file: Path to the JSON checkpoint file
+        """
+        self.state_file = state_file
+        self.checkpoints = {}
+        self._lock = threading.Lock()
+
+        if os.path.exists(state_file):
+            with open(state_file, 'r') as f:
+                self.checkpoints = json.load(f)
+            logger.debug(f"Loaded {len(self.checkpoints)} sync checkpoints from {state_file}")
+
+    def get_history_id(self, query):
+        """
+        Get the stored historyId for a query
+
+        Args:
+            query: Gmail search query
+
+        Returns:
+            historyId string or None if the query was never synced
+        """
+        checkpoint = self.checkpoints.get(query)
+        return checkpoint['history_id'] if checkpoint else None
+
+    def set_history_id(self, query, history_id):
+        """
+        Record a new historyId for a query (call save() to persist)
+
+        Args:
+            query: Gmail search query
+            history_id: historyId the query is synced up to
+        """
+        with self._lock:
+            self.checkpoints[query] = {
+                'history_id': str(history_id),
+                'updated': datetime.now().isoformat()
+            }
+
+    def save(self):
+        """Write all checkpoints to the state file"""
+        with self._lock, open(self.state_file, 'w') as f:
+            json.dump(self.checkpoints, f, indent=2)
+        logger.debug(f"Saved {len(self.checkpoints)} sync checkpoints to {self.state_file}")
@@ -0,0 +1,7 @@
+"""
+Gmail API Package - shared infrastructure for agents calling the Gmail API
+"""
+from .quota_scheduler import QuotaScheduler
+from .service_factory import GmailServiceFactory, READONLY_SCOPE, COMPOSE_SCOPE
+
+__all__ = ['QuotaScheduler', 'GmailServiceFactory', 'READONLY_SCOPE', 'COMPOSE_SCOPE']
@@ -0,0 +1,280 @@
+"""
+Quota-aware scheduling of Gmail API requests
+"""
+import random
+import socket
+import threading
+import time
+from googleapiclient.errors import HttpError
+from logger_config import LoggerConfig
+
+logger = LoggerConfig.setup_logger('gmail_api')
+
+# Gmail per-user quota units consumed by each API method
+QUOTA_UNITS = {
+    'gmail.users.getProfile': 1,
+    'gmail.users.labels.list': 1,
+    'gmail.users.history.list': 2,
+    'gmail.users.messages.list': 5,
+    'gmail.users.messages.get': 5,
+    'gmail.users.drafts.list': 5,
+    'gmail.users.drafts.get': 5,
+    'gmail.users.drafts.create': 10,
+    'gmail.users.messages.send': 100,
+}
+DEFAULT_UNITS = 5
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded')
+TRANSIENT_ERRORS = (ConnectionError, TimeoutError, socket.timeout)
+
+
+class QuotaScheduler:
+    """Token bucket over Gmail quota units with backoff and a retry budget"""
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, units_per_second=250, burst=None, max_retries=5, base_delay=1.0,
+                 max_delay=32.0, retry_budget=10, retry_ratio=0.1):
+        """
+        Initialize the scheduler
+
+        Args:
+            units_per_second: Sustained quota units per second (Gmail's
+                per-user limit is 250)
+            burst: Bucket capacity in units (defaults to units_per_second)
+            max_retries: Maximum retries of a single request
+            base_delay: First backoff delay in seconds
+            max_delay: Upper bound of a backoff delay in seconds
+            retry_budget: Retries available before successes refill the budget
+            retry_ratio: Retry budget earned by each successful request
+        """
+        self.units_per_second = units_per_second
+        self.capacity = burst or units_per_second
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_budget = retry_budget
+        self.retry_ratio = retry_ratio
+
+        self._tokens = float(self.capacity)
+        self._retry_tokens = float(retry_budget)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+        self.requests = 0
+        self.retries = 0
+        self.throttled_seconds = 0.0
+
+    @classmethod
+    def shared(cls):
+        """
+        Return the process-wide scheduler
+
+        Gmail quota is per user, so every agent in the process shares it.
+
+        Returns:
+            QuotaScheduler instance
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    @classmethod
+    def configure(cls, **options):
+        """
+        Replace the process-wide scheduler with a configured one
+
+        Args:
+            **options: QuotaScheduler constructor arguments
+
+        Returns:
+            The new shared QuotaScheduler
+        """
+        with cls._shared_lock:
+            cls._shared = cls(**options)
+            return cls._shared
+
+    @staticmethod
+    def units_for(request):
+        """
+        Quota units consumed by a request
+
+        Args:
+            request: googleapiclient HttpRequest
+
+        Returns:
+            Number of quota units
+        """
+        return QUOTA_UNITS.get(getattr(request, 'methodId', None), DEFAULT_UNITS)
+
+    def acquire(self, units):
+        """
+        Block until the bucket holds enough units, then consume them
+
+        Requests larger than the bucket (big batches) are paid for in
+        bucket-sized slices.
+
+        Args:
+            units: Quota units to consume
+        """
+        with self._lock:
+            self.requests += 1
+
+        while units > 0:
+            needed = min(units, self.capacity)
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity,
+                                   self._tokens + (now - self._last_refill) * self.units_per_second)
+                self._last_refill = now
+
+                if self._tokens >= needed:
+                    self._tokens -= needed
+                    units -= needed
+                    continue
+                wait = (needed - self._tokens) / self.units_per_second
+                self.throttled_seconds += wait
+
+            time.sleep(wait)
+
+    def execute(self, request, http=None):
+        """
+        Execute a request within quota, retrying throttled and transient failures
+
+        Args:
+            request: googleapiclient HttpRequest
+            http: Optional HTTP transport to execute the request with
+
+        Returns:
+            Decoded API response
+        """
+        return self.call(lambda: request.execute(http=http), self.units_for(request))
+
+    def execute_batch(self, batch, units):
+        """
+        Execute a batch request within quota
+
+        Per-item errors are delivered to the batch callback as usual; only a
+        failure of the batch request itself is retried here.
+
+        Args:
+            batch: googleapiclient BatchHttpRequest
+            units: Total quota units of the requests in the batch
+        """
+        self.call(batch.execute, units)
+
+    def call(self, func, units):
+        """
+        Run an API call within quota with exponential backoff and jitter
+
+        Args:
+            func: Callable performing the API call
+            units: Quota units the call consumes
+
+        Returns:
+            Return value of func
+        """
+        attempt = 0
+        while True:
+            self.acquire(units)
+            try:
+                result = func()
+            except (HttpError, *TRANSIENT_ERRORS) as error:
+                if not self.is_retryable(error) or not self.wait_retry(attempt, error):
+                    raise
+                attempt += 1
+                continue
+
+            with self._lock:
+                self._retry_tokens = min(self.max_retry_budget, self._retry_tokens + self.retry_ratio)
+            return result
+
+    def wait_retry(self, attempt, error=None, what=None):
+        """
+        Take a retry from the budget and sleep for its backoff delay
+
+        Args:
+            attempt: Number of retries already made
+            error: The error being retried, if any
+            what: Description of what is retried, for the log
+
+        Returns:
+            False without sleeping when attempt has reached max_retries or
+            the retry budget is exhausted, otherwise True
+        """
+        if attempt >= self.max_retries or not self._take_retry():
+            return False
+        delay = self.backoff_delay(attempt, error)
+        logger.warning(f"Retrying {what or 'after ' + type(error).__name__} "
+                       f"(attempt {attempt + 1}/{self.max_retries}) in {delay:.1f}s: {error}")
+        time.sleep(delay)
+        return True
+
+    def backoff_delay(self, attempt, error=None):
+        """
+        Delay before a retry: exponential with full jitter, or Retry-After
+
+        Args:
+            attempt: Number of retries already made
+            error: The error being retried, if any
+
+        Returns:
+            Delay in seconds
+        """
+        retry_after = None
+        if isinstance(error, HttpError):
+            retry_after = error.resp.get('retry-after')
+        if retry_after and str(retry_after).isdigit():
+            return min(float(retry_after), self.max_delay)
+
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    @staticmethod
+    def is_retryable(error):
+        """
+        Decide whether an error is a throttling or transient failure
+
+        Args:
+            error: Exception raised by an API call (or delivered to a batch callback)
+
+        Returns:
+            True if the call should be retried
+        """
+        if isinstance(error, TRANSIENT_ERRORS):
+            return True
+        if not isinstance(error, HttpError):
+            return False
+
+        status = error.resp.status
+        if status in RETRYABLE_STATUSES:
+            return True
+        if status == 403:
+            content = error.content.decode('utf-8', errors='ignore') if error.content else ''
+            return any(reason in content for reason in RATE_LIMIT_REASONS)
+        return False
+
+    def _take_retry(self):
+        """Consume one retry from the budget, False when it is exhausted"""
+        with self._lock:
+            if self._retry_tokens < 1:
+                logger.warning("Retry budget exhausted, not retrying")
+                return False
+            self._retry_tokens -= 1
+            self.retries += 1
+            return True
+
+    def stats(self):
+        """
+        Report scheduler activity
+
+        Returns:
+            Dictionary with request, retry and throttling counters
+        """
+        return {
+            'requests': self.requests,
+            'retries': self.retries,
+            'throttled_seconds': round(self.throttled_seconds, 2)
+        }
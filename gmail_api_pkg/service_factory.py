@@ -0,0 +1,245 @@
+"""
+Process-wide Gmail credentials and per-thread API services
+"""
+import os
+import pickle
+import threading
+import httplib2
+from google.auth.transport.requests import Request
+from google_auth_httplib2 import AuthorizedHttp
+from google_auth_oauthlib.flow import InstalledAppFlow
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import V2_DISCOVERY_URI, build_from_document
+from logger_config import LoggerConfig
+
+logger = LoggerConfig.setup_logger('gmail_api')
+
+READONLY_SCOPE = 'https://www.googleapis.com/auth/gmail.readonly'
+COMPOSE_SCOPE = 'https://www.googleapis.com/auth/gmail.compose'
+
+# Discovery documents by (api, version), kept for the life of the process
+_DISCOVERY_DOCUMENTS = {}
+_DISCOVERY_LOCK = threading.Lock()
+
+
+class GmailServiceFactory:
+    """Authenticate once per credentials file and hand out Gmail services"""
+
+    _factories = {}
+    _factories_lock = threading.Lock()
+
+    def __init__(self, credentials_file='credentials.json', token_file='token.pickle', scopes=None):
+        """
+        Initialize the factory
+
+        Args:
+            credentials_file: Path to the OAuth 2.0 credentials JSON file
+            token_file: Path to the pickled token
+            scopes: OAuth scopes the credential must grant
+        """
+        self.credentials_file = credentials_file
+        self.token_file = token_file
+        self.scopes = list(scopes or [READONLY_SCOPE])
+        self.creds = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @classmethod
+    def get(cls, credentials_file='credentials.json', token_file='token.pickle', scopes=None):
+        """
+        Return the process-wide factory of a credentials file
+
+        The first caller chooses the token file. Later callers needing more
+        scopes widen the factory's scopes, see request_scopes().
+
+        Args:
+            credentials_file: Path to the OAuth 2.0 credentials JSON file
+            token_file: Path to the pickled token, used if the factory is new
+            scopes: OAuth scopes the caller needs
+
+        Returns:
+            GmailServiceFactory instance
+        """
+        with cls._factories_lock:
+            factory = cls._factories.get(credentials_file)
+            if factory is None:
+                factory = cls(credentials_file, token_file, scopes)
+                cls._factories[credentials_file] = factory
+                return factory
+
+        factory.request_scopes(scopes or [])
+        return factory
+
+    def request_scopes(self, scopes):
+        """
+        Widen the scopes the credential must grant
+
+        If the current credential lacks a new scope, it is dropped and the
+        next call to credentials() authorizes the union of all scopes.
+
+        Args:
+            scopes: OAuth scopes to add
+        """
+        with self._lock:
+            missing = [scope for scope in scopes if scope not in self.scopes]
+            if not missing:
+                return
+            self.scopes.extend(missing)
+            if self.creds is not None and not self.creds.has_scopes(self.scopes):
+                logger.info(f"Credential lacks scopes {missing}, re-authorization required")
+                self.creds = None
+
+    def credentials(self):
+        """
+        Return a valid credential, loading, refreshing or authorizing it once
+
+        Returns:
+            google.oauth2.credentials.Credentials instance
+
+        Raises:
+            FileNotFoundError: If authorization is needed and the credentials
+                file does not exist
+        """
+        with self._lock:
+            if self.creds is None:
+                self.creds = self._load_credentials()
+            elif not self.creds.valid:
+                # Refreshed in place so services built on this credential stay usable
+                logger.info("Access token expired, refreshing")
+                self.creds.refresh(Request())
+                self._save_credentials(self.creds)
+            return self.creds
+
+    def new_http(self):
+        """
+        Create a separate authorized HTTP transport
+
+        httplib2 connections are not thread-safe, so every thread issuing
+        requests needs its own transport.
+
+        Returns:
+            AuthorizedHttp instance using the shared credential
+        """
+        return AuthorizedHttp(self.credentials(), http=httplib2.Http())
+
+    def build_service(self):
+        """
+        Build a new Gmail API service with its own HTTP transport
+
+        Returns:
+            Gmail API service instance
+        """
+        return build_from_document(self._discovery_document('gmail', 'v1'), http=self.new_http())
+
+    def service(self):
+        """
+        Return the Gmail API service of the calling thread, building it once
+
+        Returns:
+            Gmail API service instance
+        """
+        creds = self.credentials()
+        if getattr(self._local, 'creds', None) is not creds:
+            self._local.service = build_from_document(
+                self._discovery_document('gmail', 'v1'),
+                http=AuthorizedHttp(creds, http=httplib2.Http())
+            )
+            self._local.creds = creds
+        return self._local.service
+
+    def _load_credentials(self):
+        """Load the pickled token, refreshing it or running the OAuth flow as needed"""
+        creds = None
+
+        if os.path.exists(self.token_file):
+            logger.debug(f"Loading existing token from {self.token_file}")
+            with open(self.token_file, 'rb') as token:
+                creds = pickle.load(token)
+            if not creds.has_scopes(self.scopes):
+                logger.info(f"Token in {self.token_file} lacks required scopes, re-authorizing")
+                creds = None
+
+        if creds and creds.valid:
+            logger.info("Loaded existing authentication token")
+            return creds
+
+        if creds and creds.expired and creds.refresh_token:
+            logger.info("Token expired, refreshing access token")
+            print("Refreshing access token...")
+            try:
+                creds.refresh(Request())
+                logger.info("Access token refreshed successfully")
+            except Exception as e:
+                logger.warning(f"Token refresh failed: {e}")
+                print(f"Token refresh failed: {e}")
+                print("Re-authenticating...")
+                creds = None
+        else:
+            creds = None
+
+        if creds is None:
+            creds = self._authorize()
+
+        self._save_credentials(creds)
+        return creds
+
+    def _save_credentials(self, creds):
+        """Pickle the credential to the token file"""
+        logger.debug(f"Saving credentials to {self.token_file}")
+        with open(self.token_file, 'wb') as token:
+            pickle.dump(creds, token)
+        logger.info("Credentials saved for future use")
+
+    def _authorize(self):
+        """Run the OAuth 2.0 installed-app flow for all requested scopes"""
+        if not os.path.exists(self.credentials_file):
+            logger.error(f"Credentials file not found: {self.credentials_file}")
+            raise FileNotFoundError(
+                f"Credentials file '{self.credentials_file}' not found. "
+                "Please download it from Google Cloud Console."
+            )
+
+        logger.info(f"Starting OAuth 2.0 authentication flow for scopes {self.scopes}")
+        print("Starting OAuth 2.0 authentication flow...")
+        flow = InstalledAppFlow.from_client_secrets_file(self.credentials_file, self.scopes)
+
+        try:
+            logger.debug("Attempting browser authentication")
+            creds = flow.run_local_server(port=0, open_browser=True)
+            logger.info("Browser authentication successful")
+        except Exception as e:
+            logger.warning(f"Browser authentication failed: {e}")
+            logger.info("Falling back to console authentication")
+            print(f"\nCouldn't open browser automatically: {e}")
+            print("\nUsing console authentication flow instead...")
+            print("You'll receive a URL to visit in your browser.\n")
+            creds = flow.run_console()
+            logger.info("Console authentication successful")
+
+        return creds
+
+    @staticmethod
+    def _discovery_document(api, version):
+        """
+        Return a discovery document, read once per process
+
+        The document bundled with googleapiclient is used; if it is missing,
+        it is downloaded once.
+
+        Args:
+            api: API name, e.g. 'gmail'
+            version: API version, e.g. 'v1'
+
+        Returns:
+            Discovery document as a JSON string
+        """
+        key = (api, version)
+        with _DISCOVERY_LOCK:
+            if key not in _DISCOVERY_DOCUMENTS:
+                document = discovery_cache.get_static_doc(api, version)
+                if document is None:
+                    logger.info(f"No bundled discovery document for {api} {version}, fetching it")
+                    _, content = httplib2.Http().request(V2_DISCOVERY_URI.format(api=api, apiVersion=version))
+                    document = content.decode('utf-8')
+                _DISCOVERY_DOCUMENTS[key] = document
+            return _DISCOVERY_DOCUMENTS[key]
@@ -2,12 +2,14 @@
 Excel file operations for message writing
 """
 import os
-from openpyxl import load_workbook, Workbook
-from openpyxl.styles import Font, Alignment, PatternFill
+from tabular_io_pkg import open_reader, open_writer
 from logger_config import LoggerConfig
 
 logger = LoggerConfig.setup_logger('message_writer')
 
+COLUMN_WIDTHS = [20, 20, 50, 30, 60, 15, 25, 15, 100]
+MESSAGE_COLUMN = 8
+
 
 class ExcelHandler:
     """Handle Excel file operations for message writer"""
@@ -30,71 +32,108 @@ class ExcelHandler:
         logger.info(f"Reading data from {input_file}")
         print(f"Reading data from {input_file}...")
 
-        logger.debug(f"Loading workbook: {input_file}")
-        wb = load_workbook(input_file)
-        ws = wb.active
-        logger.debug(f"Workbook loaded, reading headers")
-
-        headers = [cell.value for cell in ws[1]]
-
-        try:
-            id_col = headers.index('ID')
-            timestamp_col = headers.index('TimeStamp')
-            subject_col = headers.index('Subject')
-            search_col = headers.index('Search Criteria')
-            url_col = headers.index('github Repo URL')
-            total_lines_col = headers.index('Total Lines')
-            small_files_col = next(i for i, h in enumerate(headers) if 'Lines in Small Files' in str(h))
-            grade_col = next(i for i, h in enumerate(headers) if 'Grade' in str(h))
-        except (ValueError, StopIteration) as e:
-            logger.error(f"Column parsing error: {e}")
-            raise ValueError(f"Required column not found in Excel file: {e}")
-
-        data = []
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            if row[id_col]:
-                grade_val = row[grade_col]
-                if isinstance(grade_val, str):
-                    grade_val = grade_val.replace('%', '').strip()
-                try:
-                    grade = float(grade_val) if grade_val not in ['N/A', None, ''] else 0.0
-                except (ValueError, TypeError):
-                    grade = 0.0
-
-                data.append({
-                    'id': str(row[id_col]),
-                    'timestamp': row[timestamp_col],
-                    'subject': row[subject_col],
-                    'search_criteria': row[search_col],
-                    'github_url': row[url_col],
-                    'total_lines': row[total_lines_col],
-                    'small_files_lines': row[small_files_col],
-                    'grade': grade,
-                    'message': ''
-                })
+        logger.debug(f"Opening workbook: {input_file}")
+        with open_reader(input_file) as reader:
+            logger.debug(f"Workbook opened, resolving columns")
+
+            try:
+                id_col = reader.index('ID')
+                timestamp_col = reader.index('TimeStamp')
+                subject_col = reader.index('Subject')
+                search_col = reader.index('Search Criteria')
+                url_col = reader.index('github Repo URL')
+                total_lines_col = reader.index('Total Lines')
+                small_files_col = reader.find(lambda h: 'Lines in Small Files' in str(h))
+                grade_col = reader.find(lambda h: 'Grade' in str(h))
+                if small_files_col is None or grade_col is None:
+                    raise ValueError("'Lines in Small Files' or 'Grade' is not in list")
+            except ValueError as e:
+                logger.error(f"Column parsing error: {e}")
+                raise ValueError(f"Required column not found in Excel file: {e}")
+
+            data = []
+            for row in reader.iter_rows():
+                if row[id_col]:
+                    grade_val = row[grade_col]
+                    if isinstance(grade_val, str):
+                        grade_val = grade_val.replace('%', '').strip()
+                    try:
+                        grade = float(grade_val) if grade_val not in ['N/A', None, ''] else 0.0
+                    except (ValueError, TypeError):
+                        grade = 0.0
+
+                    data.append({
+                        'id': str(row[id_col]),
+                        'timestamp': row[timestamp_col],
+                        'subject': row[subject_col],
+                        'search_criteria': row[search_col],
+                        'github_url': row[url_col],
+                        'total_lines': row[total_lines_col],
+                        'small_files_lines': row[small_files_col],
+                        'grade': grade,
+                        'message': ''
+                    })
 
         print(f"Found {len(data)} repositories to process")
         return data
 
     @staticmethod
-    def export_results(data, output_file):
+    def from_analysis_records(repos_data):
+        """
+        Build message writer input from analysis results handed over in memory
+
+        Produces the dictionaries read_input_file() returns for the file the
+        analyzer would have written: repositories that were not analyzed
+        get 'N/A' line counts and a grade of 0.
+
+        Args:
+            repos_data: List of repository data dictionaries from RepoAnalyzer
+
+        Returns:
+            List of dictionaries with repo data and grades
+        """
+        data = [ExcelHandler.from_analysis_record(repo) for repo in repos_data if repo['id']]
+
+        print(f"Found {len(data)} repositories to process")
+        return data
+
+    @staticmethod
+    def from_analysis_record(repo):
+        """
+        Build the message writer input of one analyzed repository
+
+        Args:
+            repo: Repository data dictionary with a non-empty 'id'
+
+        Returns:
+            Dictionary with repo data, grade and an empty message
+        """
+        analyzed = repo['status'] == 'analyzed'
+        return {
+            'id': str(repo['id']),
+            'timestamp': repo['timestamp'],
+            'subject': repo['subject'],
+            'search_criteria': repo['search_criteria'],
+            'github_url': repo['github_url'],
+            'total_lines': repo['total_lines'] if analyzed else 'N/A',
+            'small_files_lines': repo['small_files_lines'] if analyzed else 'N/A',
+            'grade': float(repo['grade']) if analyzed else 0.0,
+            'message': ''
+        }
+
+    @staticmethod
+    def export_results(data, output_file, output_mode='overwrite'):
         """
         Export data with messages to Excel file
 
         Args:
             data: List of repository data with messages
             output_file: Path to output Excel file
+            output_mode: 'overwrite' replaces the file, 'upsert' adds new and
+                updates changed rows by ID
         """
-        if not data:
-            print("No data to export.")
-            return
-
         print(f"\nExporting results to {output_file}...")
 
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Repo Analysis with Feedback"
-
         headers = [
             'ID',
             'TimeStamp',
@@ -106,43 +145,23 @@ class ExcelHandler:
             'Grade (%)',
             'Feedback Message'
         ]
-        ws.append(headers)
-
-        header_fill = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
-        header_font = Font(bold=True, color='FFFFFF')
-
-        for cell in ws[1]:
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-
-        for repo in data:
-            ws.append([
-                repo['id'],
-                repo['timestamp'],
-                repo['subject'],
-                repo['search_criteria'],
-                repo['github_url'],
-                repo['total_lines'],
-                repo['small_files_lines'],
-                repo['grade'],
-                repo['message']
-            ])
-
-        ws.column_dimensions['A'].width = 20
-        ws.column_dimensions['B'].width = 20
-        ws.column_dimensions['C'].width = 50
-        ws.column_dimensions['D'].width = 30
-        ws.column_dimensions['E'].width = 60
-        ws.column_dimensions['F'].width = 15
-        ws.column_dimensions['G'].width = 25
-        ws.column_dimensions['H'].width = 15
-        ws.column_dimensions['I'].width = 100
-
-        for row in ws.iter_rows(min_row=2, max_row=ws.max_row, min_col=9, max_col=9):
-            for cell in row:
-                cell.alignment = Alignment(wrap_text=True, vertical='top')
-
-        wb.save(output_file)
+
+        with open_writer(output_file, headers, "Repo Analysis with Feedback", COLUMN_WIDTHS,
+                         wrap_columns=[MESSAGE_COLUMN], mode=output_mode) as writer:
+            for repo in data:
+                writer.append([
+                    repo['id'],
+                    repo['timestamp'],
+                    repo['subject'],
+                    repo['search_criteria'],
+                    repo['github_url'],
+                    repo['total_lines'],
+                    repo['small_files_lines'],
+                    repo['grade'],
+                    repo['message']
+                ])
+
+        if output_mode == 'upsert':
+            print(f"  Upserted: {writer.added} added, {writer.updated} updated, {writer.unchanged} unchanged")
         logger.info(f"Successfully exported to {output_file}")
         print(f"✓ Successfully exported to {output_file}")
@@ -12,31 +12,44 @@ logger = LoggerConfig.setup_logger('message_writer')
 class MessageWriter:
     """Agent to generate personalized feedback messages based on grades"""
 
-    def __init__(self, input_file='Output_23.xlsx', output_file='Output_34.xlsx'):
+    def __init__(self, input_file='Output_23.xlsx', output_file='Output_34.xlsx', output_mode='overwrite',
+                 journal=None):
         """
         Initialize the Message Writer
 
         Args:
             input_file: Path to input Excel file with grades
             output_file: Path to output Excel file with messages
+            output_mode: 'overwrite' replaces the output file, 'upsert' adds new
+                and updates changed rows by ID
+            journal: Optional stage journal (see pipeline_pkg.RunJournal); a
+                resumed run reuses the journaled messages, so drafts already
+                created match the output file
         """
         self.input_file = input_file
         self.output_file = output_file
-        self.data = []
+        self.output_mode = output_mode
+        self.journal = journal
+        self.data = None
 
     def read_excel_data(self):
         """Read data from input Excel file"""
         self.data = ExcelHandler.read_input_file(self.input_file)
         return self.data
 
-    def process_all(self):
+    def process_all(self, data=None):
         """
         Process all repositories and generate messages
 
+        Args:
+            data: Repository data handed over in memory, see
+                ExcelHandler.from_analysis_records(); read from the input
+                file if None
+
         Returns:
             List of processed data with messages
         """
-        self.data = self.read_excel_data()
+        self.data = data if data is not None else self.read_excel_data()
 
         print(f"\n{'='*70}")
         print(f"Generating Personalized Messages")
@@ -44,8 +57,7 @@ class MessageWriter:
 
         for i, repo in enumerate(self.data, 1):
             grade = repo['grade']
-            message = MessageGenerators.generate_message(repo)
-            repo['message'] = message
+            repo['message'] = self.message_for(repo)
 
             if grade >= 90:
                 style = "Trump (Congratulations)"
@@ -61,24 +73,52 @@ class MessageWriter:
         print(f"\n✓ Generated {len(self.data)} personalized messages")
         return self.data
 
+    def message_for(self, repo):
+        """
+        Generate the message of a repository, or reuse the journaled one
+
+        A journaled message is only reused for the grade it was written for.
+
+        Args:
+            repo: Repository data dictionary
+
+        Returns:
+            Message string
+        """
+        if self.journal is not None:
+            saved = self.journal.get(repo['id'])
+            if saved is not None and saved['grade'] == repo['grade']:
+                return saved['message']
+
+        message = MessageGenerators.generate_message(repo)
+        if self.journal is not None:
+            self.journal.record(repo['id'], {'grade': repo['grade'], 'message': message})
+        return message
+
     def export_to_excel(self):
         """Export data with messages to Excel file"""
-        if not self.data:
+        if self.data is None:
             print("No data to export. Run process_all() first.")
             return
 
-        ExcelHandler.export_results(self.data, self.output_file)
+        ExcelHandler.export_results(self.data, self.output_file, self.output_mode)
 
-    def run(self):
+    def run(self, data=None, write_output=True):
         """
         Run the complete message writing pipeline
 
+        Args:
+            data: Repository data handed over in memory (default: read the
+                input file)
+            write_output: Whether to export the messages to the output file
+
         Returns:
             List of processed data with messages
         """
         try:
-            self.process_all()
-            self.export_to_excel()
+            self.process_all(data)
+            if write_output:
+                self.export_to_excel()
             self.print_summary()
 
             return self.data
@@ -5,33 +5,45 @@ Gmail Agent Pipeline - Execute multiple searches from JSON configuration
 import sys
 import asyncio
 import argparse
-from pipeline_pkg import GmailPipeline
+from pipeline_pkg import GmailPipeline, ConfigLoader
+from pipeline_pkg.stage_cache import CACHEABLE_STAGES
 from results_tracker import ResultsTracker
 
 
 async def async_main(args):
     """Async main function to support repository analysis"""
     try:
-        pipeline = GmailPipeline(config_file=args.config)
-        pipeline.run(skip_on_error=args.skip_on_error)
+        pipeline = GmailPipeline(config_file=args.config, resume=args.resume,
+                                 force_stages=args.force, invalidate_stages=args.invalidate)
+        config = pipeline.load_config()
 
-        if args.report:
-            pipeline.generate_report(output_file=args.report)
+        if config.get('executor') in ('dag', 'stream'):
+            await pipeline.run_dag(skip_on_error=args.skip_on_error)
 
-        if pipeline.config and 'analyze_repos' in pipeline.config:
-            await pipeline.analyze_repositories(pipeline.config['analyze_repos'])
+            if args.report:
+                pipeline.generate_report(output_file=args.report)
+        else:
+            pipeline.run(skip_on_error=args.skip_on_error)
 
-        if pipeline.config and 'generate_messages' in pipeline.config:
-            pipeline.generate_messages(pipeline.config['generate_messages'])
+            if args.report:
+                pipeline.generate_report(output_file=args.report)
 
-        if pipeline.config and 'draft_emails' in pipeline.config:
-            pipeline.draft_emails(pipeline.config['draft_emails'])
+            for i, analyze_config in enumerate(ConfigLoader.stage_configs(config, 'analyze_repos'), 1):
+                await pipeline.analyze_repositories(analyze_config, i)
+
+            for i, message_config in enumerate(ConfigLoader.stage_configs(config, 'generate_messages'), 1):
+                pipeline.generate_messages(message_config, i)
+
+            for i, draft_config in enumerate(ConfigLoader.stage_configs(config, 'draft_emails'), 1):
+                pipeline.draft_emails(draft_config, i)
+
+        pipeline.close()
 
         # Finalize and display Results.md
         ResultsTracker.finalize_results()
         ResultsTracker.display_results()
 
-        failed = sum(1 for r in pipeline.results if r['status'] == 'error')
+        failed = sum(1 for r in pipeline.results + pipeline.stage_results if r['status'] == 'error')
         sys.exit(1 if failed > 0 else 0)
 
     except FileNotFoundError as e:
@@ -79,6 +91,8 @@ Usage:
   python pipeline.py --config config.json
   python pipeline.py --config config.json --skip-on-error
   python pipeline.py --config config.json --report results.json
+  python pipeline.py --config config.json --resume
+  python pipeline.py --config config.json --force analyze_repos
         """
     )
 
@@ -101,6 +115,26 @@ Usage:
         help='Generate a JSON report of the pipeline execution'
     )
 
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Continue an interrupted run from the run journal, skipping completed work'
+    )
+
+    parser.add_argument(
+        '--force',
+        action='append',
+        choices=CACHEABLE_STAGES + ('all',),
+        help='Recompute a stage even if the stage cache holds its result (repeatable)'
+    )
+
+    parser.add_argument(
+        '--invalidate',
+        action='append',
+        choices=CACHEABLE_STAGES + ('all',),
+        help='Remove the cached results of a stage before running (repeatable)'
+    )
+
     args = parser.parse_args()
 
     asyncio.run(async_main(args))
@@ -4,5 +4,16 @@ Pipeline Package
 from .pipeline import GmailPipeline
 from .config_loader import ConfigLoader
 from .agent_runners import AgentRunners
+from .search_runner import SearchRunner
+from .query_planner import QueryPlanner
+from .query_coalescer import QueryCoalescer
+from .stage_graph import StageGraph, StageNode
+from .dag_executor import DagExecutor
+from .stream_executor import StreamExecutor
+from .run_journal import RunJournal, StageJournal
+from .stage_cache import StageCache
 
-__all__ = ['GmailPipeline', 'ConfigLoader', 'AgentRunners']
+__all__ = ['GmailPipeline', 'ConfigLoader', 'AgentRunners', 'SearchRunner', 'QueryPlanner',
+           'QueryCoalescer', 'StageGraph', 'StageNode', 'DagExecutor',
+           'StreamExecutor', 'RunJournal', 'StageJournal',
+           'StageCache']
@@ -3,9 +3,10 @@ Agent runner functions for pipeline
 """
 import os
 import asyncio
-from repo_analyzer import RepoAnalyzer
-from message_writer_pkg import MessageWriter
+from repo_analyzer import RepoAnalyzer, MirrorCache, ExcelHandler as AnalysisHandler
+from message_writer_pkg import MessageWriter, ExcelHandler as MessageHandler
 from email_drafter_pkg import EmailDrafter
+from email_drafter_pkg.excel_reader import ExcelReader
 from results_tracker import ResultsTracker
 
 
@@ -13,12 +14,20 @@ class AgentRunners:
     """Run different agents in the pipeline"""
 
     @staticmethod
-    async def analyze_repositories(analyze_config):
+    async def analyze_repositories(analyze_config, records=None, write_output=True, track=True, journal=None,
+                                   stage_cache=None):
         """
         Run repository analysis on output files
 
         Args:
             analyze_config: Configuration for repository analysis
+            records: Search records handed over in memory instead of reading
+                input_file
+            write_output: Whether to write output_file
+            track: Whether to add the results to Results.md
+            journal: StageJournal of a resumable run, or None
+            stage_cache: StageCache whose result is reused if the input and
+                configuration are unchanged, or None
 
         Returns:
             Analysis results
@@ -32,27 +41,53 @@ class AgentRunners:
         temp_dir = analyze_config.get('temp_dir', 'TempFiles')
         cleanup = analyze_config.get('cleanup', True)
         small_file_threshold = analyze_config.get('small_file_threshold', 150)
+        output_mode = analyze_config.get('output_mode', 'overwrite')
+        workers = analyze_config.get('analysis_workers')
+        large_repo_files = analyze_config.get('large_repo_files', 5000)
+        scan_threads = analyze_config.get('scan_threads', 8)
+        clone_mode = analyze_config.get('clone_mode', 'checkout')
 
-        if not input_file:
+        if not input_file and records is None:
             print("Error: 'input_file' not specified in analyze_repos configuration")
             return None
 
-        if not os.path.exists(input_file):
+        if records is None and not os.path.exists(input_file):
             print(f"Warning: Input file '{input_file}' not found. Skipping repository analysis.")
             return None
 
         try:
-            analyzer = RepoAnalyzer(
-                input_file=input_file,
-                output_file=output_file,
-                temp_dir=temp_dir,
-                small_file_threshold=small_file_threshold
-            )
-
-            results = await analyzer.run(cleanup=cleanup)
+            key, results = AgentRunners._cached_result(stage_cache, 'analyze_repos', analyze_config,
+                                                       records, input_file)
+            if results is None:
+                analyzer = RepoAnalyzer(
+                    input_file=input_file,
+                    output_file=output_file,
+                    temp_dir=temp_dir,
+                    small_file_threshold=small_file_threshold,
+                    output_mode=output_mode,
+                    journal=journal,
+                    workers=workers,
+                    large_repo_files=large_repo_files,
+                    scan_threads=scan_threads,
+                    clone_mode=clone_mode,
+                    mirror_cache=MirrorCache.from_config(analyze_config.get('mirror_cache'))
+                )
+
+                repos_data = AnalysisHandler.from_email_records(records) if records is not None else None
+                try:
+                    results = await analyzer.run(cleanup=cleanup, repos_data=repos_data, write_output=write_output)
+                finally:
+                    analyzer.close()
+
+                # Failed clones and analyses are retried next time instead of being cached
+                if key is not None and results and all(r['status'] not in ('clone_failed', 'analysis_failed')
+                                                       for r in results):
+                    stage_cache.store(key, 'analyze_repos', results, output_file if write_output else None)
+            elif write_output and not stage_cache.output_current(key, output_file):
+                AnalysisHandler.export_results(results, output_file, small_file_threshold, output_mode)
 
             # Add results to Results.md
-            if results:
+            if results and track:
                 ResultsTracker.add_repo_analysis_results(results)
 
             return results
@@ -64,12 +99,20 @@ class AgentRunners:
             return None
 
     @staticmethod
-    def generate_messages(message_config):
+    def generate_messages(message_config, records=None, write_output=True, track=True, journal=None,
+                          stage_cache=None):
         """
         Run message generation on analyzed repositories
 
         Args:
             message_config: Configuration for message generation
+            records: Analysis results handed over in memory instead of
+                reading input_file
+            write_output: Whether to write output_file
+            track: Whether to add the results to Results.md
+            journal: StageJournal of a resumable run, or None
+            stage_cache: StageCache whose result is reused if the input and
+                configuration are unchanged, or None
 
         Returns:
             Message generation results
@@ -80,25 +123,37 @@ class AgentRunners:
 
         input_file = message_config.get('input_file')
         output_file = message_config.get('output_file', 'Output_34.xlsx')
+        output_mode = message_config.get('output_mode', 'overwrite')
 
-        if not input_file:
+        if not input_file and records is None:
             print("Error: 'input_file' not specified in generate_messages configuration")
             return None
 
-        if not os.path.exists(input_file):
+        if records is None and not os.path.exists(input_file):
             print(f"Warning: Input file '{input_file}' not found. Skipping message generation.")
             return None
 
         try:
-            writer = MessageWriter(
-                input_file=input_file,
-                output_file=output_file
-            )
-
-            results = writer.run()
+            key, results = AgentRunners._cached_result(stage_cache, 'generate_messages', message_config,
+                                                       records, input_file)
+            if results is None:
+                writer = MessageWriter(
+                    input_file=input_file,
+                    output_file=output_file,
+                    output_mode=output_mode,
+                    journal=journal
+                )
+
+                data = MessageHandler.from_analysis_records(records) if records is not None else None
+                results = writer.run(data=data, write_output=write_output)
+
+                if key is not None and results:
+                    stage_cache.store(key, 'generate_messages', results, output_file if write_output else None)
+            elif write_output and not stage_cache.output_current(key, output_file):
+                MessageHandler.export_results(results, output_file, output_mode)
 
             # Add results to Results.md
-            if results:
+            if results and track:
                 ResultsTracker.add_message_writer_results(results)
 
             return results
@@ -110,12 +165,16 @@ class AgentRunners:
             return None
 
     @staticmethod
-    def draft_emails(draft_config):
+    def draft_emails(draft_config, records=None, track=True, journal=None):
         """
         Create Gmail draft messages from feedback
 
         Args:
             draft_config: Configuration for email drafting
+            records: Generated messages handed over in memory instead of
+                reading input_file
+            track: Whether to add the results to Results.md
+            journal: StageJournal of a resumable run, or None
 
         Returns:
             Draft creation results
@@ -127,24 +186,26 @@ class AgentRunners:
         input_file = draft_config.get('input_file')
         credentials_file = draft_config.get('credentials_file', 'credentials.json')
 
-        if not input_file:
+        if not input_file and records is None:
             print("Error: 'input_file' not specified in draft_emails configuration")
             return None
 
-        if not os.path.exists(input_file):
+        if records is None and not os.path.exists(input_file):
             print(f"Warning: Input file '{input_file}' not found. Skipping email drafting.")
             return None
 
         try:
             drafter = EmailDrafter(
                 input_file=input_file,
-                credentials_file=credentials_file
+                credentials_file=credentials_file,
+                journal=journal
             )
 
-            results = drafter.run()
+            data = ExcelReader.from_message_records(records) if records is not None else None
+            results = drafter.run(data=data)
 
             # Add results to Results.md
-            if results:
+            if results and track:
                 ResultsTracker.add_email_drafter_results(results)
 
             return results
@@ -154,3 +215,16 @@ class AgentRunners:
             import traceback
             traceback.print_exc()
             return None
+
+    @staticmethod
+    def _cached_result(stage_cache, stage, stage_config, records, input_file):
+        """
+        Look up a stage's cached result
+
+        Returns:
+            Tuple (cache key, cached records); both None when the stage is
+            not cached, e.g. because its configuration sets "cache": false
+        """
+        if stage_cache is None or not stage_config.get('cache', True):
+            return None, None
+        return stage_cache.lookup(stage, stage_config, records, input_file)
@@ -38,9 +38,36 @@ class ConfigLoader:
             if 'query' not in search:
                 raise ValueError(f"Search #{i+1} is missing required 'query' field")
 
+        if config.get('executor', 'sequential') not in ('sequential', 'dag', 'stream'):
+            raise ValueError("'executor' must be 'sequential', 'dag' or 'stream'")
+
         print(f"Loaded configuration with {len(config['searches'])} search(es)")
         return config
 
+    @staticmethod
+    def stage_configs(config, stage):
+        """
+        Return the configurations of a post-search stage as a list
+
+        A stage section may hold one configuration object or a list of them,
+        e.g. to analyze the outputs of two searches.
+
+        Args:
+            config: Loaded configuration dictionary
+            stage: 'analyze_repos', 'generate_messages' or 'draft_emails'
+
+        Returns:
+            List of stage configuration dictionaries (empty if not configured)
+        """
+        section = config.get(stage)
+        if not section:
+            return []
+        if isinstance(section, dict):
+            return [section]
+        if isinstance(section, list) and all(isinstance(item, dict) for item in section):
+            return section
+        raise ValueError(f"'{stage}' must be an object or an array of objects")
+
     @staticmethod
     def validate_search(search, index):
         """
@@ -57,11 +84,45 @@ class ConfigLoader:
             'name': search.get('name', f'Search {index + 1}'),
             'query': search['query'],
             'output': search.get('output', f'search_{index + 1}.xlsx'),
-            'max_results': search.get('max_results', 100)
+            'output_mode': search.get('output_mode', 'overwrite'),
+            'max_results': search.get('max_results', 100),
+            'batch_size': search.get('batch_size'),
+            'fetch_mode': search.get('fetch_mode', 'full'),
+            'parse_workers': search.get('parse_workers'),
+            'max_scan_bytes': search.get('max_scan_bytes'),
+            'incremental': bool(search.get('incremental', False)),
+            'planner': search.get('planner')
         }
 
         if not isinstance(validated['max_results'], int) or validated['max_results'] < 1:
             print(f"Warning: Invalid max_results for '{validated['name']}', using default 100")
             validated['max_results'] = 100
 
+        batch_size = validated['batch_size']
+        if batch_size is not None and (not isinstance(batch_size, int) or not 1 <= batch_size <= 100):
+            print(f"Warning: Invalid batch_size for '{validated['name']}', using default 100")
+            validated['batch_size'] = 100
+
+        if validated['output_mode'] not in ('overwrite', 'upsert'):
+            print(f"Warning: Invalid output_mode for '{validated['name']}', using default 'overwrite'")
+            validated['output_mode'] = 'overwrite'
+
+        if validated['fetch_mode'] not in ('full', 'metadata', 'raw'):
+            print(f"Warning: Invalid fetch_mode for '{validated['name']}', using default 'full'")
+            validated['fetch_mode'] = 'full'
+
+        parse_workers = validated['parse_workers']
+        if parse_workers is not None and (not isinstance(parse_workers, int) or parse_workers < 1):
+            print(f"Warning: Invalid parse_workers for '{validated['name']}', parsing in-process")
+            validated['parse_workers'] = None
+
+        max_scan_bytes = validated['max_scan_bytes']
+        if max_scan_bytes is not None and (not isinstance(max_scan_bytes, int) or max_scan_bytes < 0):
+            print(f"Warning: Invalid max_scan_bytes for '{validated['name']}', using default 1 MiB")
+            validated['max_scan_bytes'] = None
+
+        if validated['planner'] is not None and not isinstance(validated['planner'], dict):
+            print(f"Warning: Invalid planner for '{validated['name']}', listing without planner")
+            validated['planner'] = None
+
         return validated
@@ -0,0 +1,204 @@
+"""
+Concurrent execution of the pipeline graph
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from gmail_agent_pkg import MessageRegistry
+from logger_config import LoggerConfig
+from .agent_runners import AgentRunners
+
+logger = LoggerConfig.setup_logger('pipeline')
+
+
+class DagExecutor:
+    """Run every node of a StageGraph as soon as the node it depends on is done"""
+
+    def __init__(self, agent, runner, max_searches=1, skip_on_error=False, write_intermediate=False,
+                 journal=None, stage_cache=None):
+        """
+        Initialize the executor
+
+        Args:
+            agent: Authenticated GmailAgent
+            runner: SearchRunner executing the searches
+            max_searches: Maximum number of searches running at once; each
+                search worker thread gets its own GmailAgent
+            skip_on_error: If False, searches that have not started yet are
+                cancelled after the first failed search
+            write_intermediate: Write every output file, including those
+                only handed to the next stage in memory
+            journal: RunJournal recording each stage's finished items, or None
+            stage_cache: StageCache reusing the results of unchanged stages,
+                or None
+        """
+        self.agent = agent
+        self.runner = runner
+        self.max_searches = max_searches if isinstance(max_searches, int) and max_searches > 1 else 1
+        self.skip_on_error = skip_on_error
+        self.write_intermediate = write_intermediate
+        self.journal = journal
+        self.stage_cache = stage_cache
+        self.stopped = False
+        self.total_searches = 0
+        self._search_pool = None
+        self._local = threading.local()
+
+    async def run(self, nodes):
+        """
+        Run the graph
+
+        Searches run on a pool of max_searches threads; a stage starts when
+        its upstream node finishes, so independent branches, such as the
+        analyses of two searches, overlap.
+
+        Args:
+            nodes: List of StageNode from StageGraph.build()
+
+        Returns:
+            The nodes, with result (None if cancelled) and records set
+        """
+        self.total_searches = sum(1 for node in nodes if node.kind == 'search')
+        shared_temp_dirs = DagExecutor._separate_temp_dirs(nodes)
+
+        if self.max_searches > 1:
+            self.agent.registry = MessageRegistry()
+
+        tasks = {}
+        with ThreadPoolExecutor(max_workers=self.max_searches) as search_pool:
+            self._search_pool = search_pool
+            for node in nodes:
+                upstream = tasks.get(node.upstream.key) if node.upstream else None
+                tasks[node.key] = asyncio.create_task(self._run_node(node, upstream))
+            await asyncio.gather(*tasks.values())
+
+        self.agent.registry = None
+
+        for temp_dir in shared_temp_dirs:
+            # Each analysis removed its own subdirectory
+            if os.path.isdir(temp_dir) and not os.listdir(temp_dir):
+                os.rmdir(temp_dir)
+        return nodes
+
+    async def _run_node(self, node, upstream):
+        """Wait for the upstream node, then run this one; never raises"""
+        if upstream is not None:
+            await upstream
+
+        start = time.perf_counter()
+        try:
+            if node.kind == 'search':
+                loop = asyncio.get_running_loop()
+                node.result = await loop.run_in_executor(self._search_pool, self._run_search, node)
+                return
+
+            reason = DagExecutor._skip_reason(node)
+            if reason:
+                print(f"\nSkipping {node.key}: {reason}")
+                node.result = self._stage_result(node, 'skipped', start, error=reason)
+                return
+
+            records = node.upstream.records if node.in_memory else None
+            write_output = node.writes_output(self.write_intermediate)
+            journal = self.stage_journal(node)
+
+            if node.kind == 'analyze_repos':
+                output = await AgentRunners.analyze_repositories(node.config, records, write_output, track=False,
+                                                                 journal=journal, stage_cache=self.stage_cache)
+            elif node.kind == 'generate_messages':
+                output = await asyncio.to_thread(AgentRunners.generate_messages, node.config, records,
+                                                 write_output, False, journal, self.stage_cache)
+            else:
+                output = await asyncio.to_thread(AgentRunners.draft_emails, node.config, records, False, journal)
+
+            node.records = output
+            node.result = self._stage_result(node, 'success' if output else 'error', start,
+                                             written=write_output)
+
+        except Exception as e:
+            logger.error(f"{node.key} failed: {e}")
+            print(f"✗ {node.key} failed: {e}")
+            node.result = self._stage_result(node, 'error', start, error=str(e))
+
+    def _run_search(self, node):
+        """Run a search node on a search worker thread"""
+        if self.stopped:
+            return None
+
+        if self.max_searches > 1:
+            if not hasattr(self._local, 'agent'):
+                self._local.agent = self.agent.for_worker()
+            agent = self._local.agent
+        else:
+            agent = self.agent
+
+        node.records = [] if node.keeps_records() else None
+        result = self.runner.run_search(agent, node.config, node.index, self.total_searches,
+                                        records=node.records,
+                                        write_output=node.writes_output(self.write_intermediate))
+
+        if result['status'] == 'error' and not self.skip_on_error and not self.stopped:
+            print(f"\nStopping pipeline due to error.")
+            self.stopped = True
+        return result
+
+    def stage_journal(self, node):
+        """Journal of a node, or None when the run keeps no journal"""
+        return self.journal.stage(node.key) if self.journal is not None else None
+
+    @staticmethod
+    def _skip_reason(node):
+        """Why a stage cannot run because of its upstream node, or None"""
+        upstream = node.upstream
+        if upstream is None:
+            return None
+        if upstream.result is None:
+            return f"{upstream.key} was cancelled"
+        if upstream.result['status'] in ('error', 'skipped'):
+            return f"{upstream.key} did not complete"
+        if node.in_memory and not upstream.records:
+            return f"{upstream.key} produced no records"
+        return None
+
+    def _stage_result(self, node, status, start, written=False, error=None):
+        """Result dictionary of a post-search stage"""
+        if node.kind == 'draft_emails':
+            count = node.records['success'] if node.records else 0
+        else:
+            count = len(node.records) if node.records else 0
+
+        result = {
+            'name': node.key,
+            'stage': node.kind,
+            'input': 'memory' if node.in_memory else node.input,
+            'output': node.output if written else None,
+            'count': count,
+            'duration': round(time.perf_counter() - start, 2),
+            'status': status
+        }
+        if error:
+            result['error'] = error
+        return result
+
+    @staticmethod
+    def _separate_temp_dirs(nodes):
+        """
+        Give concurrent analyses that share a clone directory a subdirectory each
+
+        Otherwise one analysis would delete the other's clones when cleaning up.
+
+        Returns:
+            List of the shared directories
+        """
+        analyses = [node for node in nodes if node.kind == 'analyze_repos']
+        counts = Counter(node.config.get('temp_dir', 'TempFiles') for node in analyses)
+        shared = [temp_dir for temp_dir, count in counts.items() if count > 1]
+
+        for node in analyses:
+            temp_dir = node.config.get('temp_dir', 'TempFiles')
+            if temp_dir in shared:
+                node.config = dict(node.config, temp_dir=os.path.join(temp_dir, f'analyze_{node.index}'))
+        return shared
@@ -2,12 +2,23 @@
 Gmail Agent Pipeline - Execute multiple searches from JSON configuration
 """
 import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from gmail_agent_pkg import GmailAgent
+from gmail_agent_pkg import GmailAgent, SyncState, MessageCache, MessageRegistry
+from gmail_api_pkg import QuotaScheduler, GmailServiceFactory, READONLY_SCOPE, COMPOSE_SCOPE
 from logger_config import LoggerConfig
 from results_tracker import ResultsTracker
 from .config_loader import ConfigLoader
 from .agent_runners import AgentRunners
+from .search_runner import SearchRunner
+from .stage_graph import StageGraph
+from .dag_executor import DagExecutor
+from .stream_executor import StreamExecutor
+from .run_journal import RunJournal
+from .stage_cache import StageCache
 
 logger = LoggerConfig.setup_logger('pipeline')
 
@@ -15,17 +26,34 @@ logger = LoggerConfig.setup_logger('pipeline')
 class GmailPipeline:
     """Pipeline to execute multiple Gmail searches from configuration"""
 
-    def __init__(self, config_file):
+    def __init__(self, config_file, resume=False, force_stages=None, invalidate_stages=None):
         """
         Initialize the pipeline
 
         Args:
             config_file: Path to JSON configuration file
+            resume: Continue the run recorded in the run journal, skipping
+                the searches and items it already completed
+            force_stages: Stages recomputed even if the stage cache holds
+                their result ('analyze_repos', 'generate_messages' or 'all')
+            invalidate_stages: Stages whose cached results are removed
+                before the run
         """
         self.config_file = config_file
+        self.resume = resume
+        self.force_stages = force_stages or []
+        self.invalidate_stages = invalidate_stages or []
         self.config = None
+        self.journal = None
+        self.stage_cache = None
         self.agent = None
+        self.sync_state = None
+        self.cache = None
+        self.cache_stats = None
+        self.scheduler = None
         self.results = []
+        self.stage_results = []
+        self.wall_time = None
 
     def load_config(self):
         """Load and validate JSON configuration"""
@@ -43,6 +71,79 @@ class GmailPipeline:
         Returns:
             List of result dictionaries
         """
+        self._start()
+
+        total_searches = len(self.config['searches'])
+        max_workers = self.config.get('max_concurrent_searches', 1)
+        runner = SearchRunner(self.sync_state, self.journal)
+
+        if self.config.get('coalesce_searches'):
+            runner.coalesce(self.agent, self.config['searches'])
+
+        if isinstance(max_workers, int) and max_workers > 1 and total_searches > 1:
+            self._run_concurrent(runner, max_workers, skip_on_error)
+        else:
+            self._run_sequential(runner, skip_on_error)
+
+        self._finish(total_searches)
+        return self.results
+
+    async def run_dag(self, skip_on_error=False):
+        """
+        Execute the searches and all configured stages as a dependency graph
+
+        Each stage starts as soon as the search or stage producing its
+        input_file has finished and receives its records in memory.
+        Intermediate files are only written when requested, and independent
+        branches run concurrently. With executor 'stream', records flow on
+        one at a time instead, so drafting starts while the search is still
+        fetching.
+
+        Args:
+            skip_on_error: If True, a failed search does not cancel the
+                searches that have not started yet
+
+        Returns:
+            List of search result dictionaries
+        """
+        if self.config is None:
+            self.load_config()
+        nodes = StageGraph.build(self.config)
+
+        self._start()
+
+        runner = SearchRunner(self.sync_state, self.journal)
+        if self.config.get('coalesce_searches'):
+            runner.coalesce(self.agent, self.config['searches'])
+
+        options = {
+            'max_searches': self.config.get('max_concurrent_searches', 1),
+            'skip_on_error': skip_on_error,
+            'write_intermediate': self.config.get('write_intermediate_files', False),
+            'journal': self.journal,
+            'stage_cache': self.stage_cache
+        }
+        if self.config.get('executor') == 'stream':
+            executor = StreamExecutor(self.agent, runner, queue_size=self.config.get('stream_queue_size', 16),
+                                      **options)
+            print(f"Streaming records through {len(nodes)} searches and stages")
+        else:
+            executor = DagExecutor(self.agent, runner, **options)
+            print(f"Running {len(nodes)} searches and stages as a dependency graph")
+        logger.info(f"Running pipeline graph of {len(nodes)} nodes")
+        started = time.perf_counter()
+        await executor.run(nodes)
+        self.wall_time = round(time.perf_counter() - started, 2)
+
+        self.results = [n.result for n in nodes if n.kind == 'search' and n.result is not None]
+        self.stage_results = [n.result for n in nodes if n.kind != 'search']
+
+        self._finish(len(self.config['searches']))
+        GmailPipeline._track_stages(nodes)
+        return self.results
+
+    def _start(self):
+        """Load the configuration and set up the agent, cache and quota shared by all searches"""
         session_id = LoggerConfig.get_session_id()
         logger.info(f"{"="*70}")
         logger.info(f"Pipeline execution started - Session ID: {session_id}")
@@ -51,96 +152,247 @@ class GmailPipeline:
         # Initialize Results.md
         ResultsTracker.initialize_results_file()
 
-        self.load_config()
+        if self.config is None:
+            self.load_config()
 
         credentials_file = self.config.get('credentials_file', 'credentials.json')
 
+        self._share_credentials(credentials_file)
+        self.journal = self._open_journal()
+        self.stage_cache = self._open_stage_cache(self.config.get('stage_cache'))
+
         print(f"\nInitializing Gmail Agent...")
-        self.agent = GmailAgent(credentials_file=credentials_file)
+        self.cache = self._open_cache(self.config.get('cache'))
+        self.scheduler = self._configure_quota(self.config.get('quota'))
+        self.agent = GmailAgent(credentials_file=credentials_file, cache=self.cache,
+                                scheduler=self.scheduler)
         self.agent.authenticate()
 
+        if any(search.get('incremental') for search in self.config['searches']):
+            self.sync_state = SyncState(self.config.get('sync_state_file', 'gmail_sync_state.json'))
+
         print(f"\n{'='*70}")
         print(f"Starting pipeline execution")
         print(f"{'='*70}\n")
 
-        total_searches = len(self.config['searches'])
-        successful = 0
-        failed = 0
-
-        for i, search_config in enumerate(self.config['searches'], 1):
-            try:
-                search = ConfigLoader.validate_search(search_config, i - 1)
-
-                print(f"\n[{i}/{total_searches}] {search['name']}")
-                print(f"{'─'*70}")
-                print(f"Query: {search['query']}")
-                print(f"Output: {search['output']}")
-                print(f"Max Results: {search['max_results']}")
-
-                start_time = datetime.now()
-                emails = self.agent.search_emails(
-                    query=search['query'],
-                    max_results=search['max_results']
-                )
-
-                if emails:
-                    self.agent.export_to_excel(emails, output_file=search['output'])
-                    end_time = datetime.now()
-                    duration = (end_time - start_time).total_seconds()
-
-                    result = {
-                        'name': search['name'],
-                        'query': search['query'],
-                        'output': search['output'],
-                        'count': len(emails),
-                        'duration': duration,
-                        'status': 'success'
-                    }
-
-                    print(f"✓ Success: {len(emails)} emails exported to {search['output']}")
-                    print(f"  Duration: {duration:.2f}s")
-                    successful += 1
-                else:
-                    result = {
-                        'name': search['name'],
-                        'query': search['query'],
-                        'output': search['output'],
-                        'count': 0,
-                        'duration': 0,
-                        'status': 'no_results'
-                    }
-                    print(f"ℹ No emails found")
-                    successful += 1
-
-                self.results.append(result)
-
-            except Exception as e:
-                result = {
-                    'name': search.get('name', f'Search {i}'),
-                    'query': search.get('query', 'N/A'),
-                    'output': search.get('output', 'N/A'),
-                    'count': 0,
-                    'duration': 0,
-                    'status': 'error',
-                    'error': str(e)
-                }
-                self.results.append(result)
-
-                print(f"✗ Error: {e}")
-                failed += 1
+    def _finish(self, total_searches):
+        """Close the cache, print the summary and record the searches in Results.md"""
+        successful = sum(1 for r in self.results if r['status'] != 'error')
+        failed = sum(1 for r in self.results if r['status'] == 'error')
 
+        if self.cache is not None:
+            self.cache.evict()
+            self.cache_stats = self.cache.stats()
+            self.cache.close()
+
+        self._print_summary(total_searches, successful, failed)
+
+        # Add Gmail search results to Results.md
+        ResultsTracker.add_gmail_search_results(self.results)
+
+    @staticmethod
+    def _track_stages(nodes):
+        """Add the stage results to Results.md in pipeline order"""
+        for node in nodes:
+            if not node.records or node.kind == 'search':
+                continue
+            if node.kind == 'analyze_repos':
+                ResultsTracker.add_repo_analysis_results(node.records)
+            elif node.kind == 'generate_messages':
+                ResultsTracker.add_message_writer_results(node.records)
+            else:
+                ResultsTracker.add_email_drafter_results(node.records)
+
+    def _run_sequential(self, runner, skip_on_error):
+        """
+        Run the configured searches one after another
+
+        Args:
+            runner: SearchRunner executing each search
+            skip_on_error: If True, continue to next search on error
+        """
+        searches = self.config['searches']
+
+        for i, search_config in enumerate(searches, 1):
+            result = runner.run_search(self.agent, search_config, i, len(searches))
+            self.results.append(result)
+
+            if result['status'] == 'error':
                 if not skip_on_error:
                     print(f"\nStopping pipeline due to error.")
                     break
                 else:
                     print(f"Continuing to next search...")
 
-        self._print_summary(total_searches, successful, failed)
+    def _run_concurrent(self, runner, max_workers, skip_on_error):
+        """
+        Run the configured searches on a bounded pool of worker threads
 
-        # Add Gmail search results to Results.md
-        ResultsTracker.add_gmail_search_results(self.results)
+        Each worker thread gets its own GmailAgent and HTTP transport. A shared
+        MessageRegistry makes sure a message that matches several searches is
+        retrieved only once. Results keep the configuration order.
 
-        return self.results
+        Args:
+            runner: SearchRunner executing each search
+            max_workers: Maximum number of searches running at once
+            skip_on_error: If False, searches that have not started yet are
+                cancelled after the first error
+        """
+        searches = self.config['searches']
+        self.agent.registry = MessageRegistry()
+        local = threading.local()
+
+        def run_in_worker(index, search_config):
+            if not hasattr(local, 'agent'):
+                local.agent = self.agent.for_worker()
+            return runner.run_search(local.agent, search_config, index, len(searches))
+
+        print(f"Running {len(searches)} searches with up to {max_workers} in parallel")
+        logger.info(f"Running searches concurrently with max_workers={max_workers}")
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(run_in_worker, i, search_config)
+                for i, search_config in enumerate(searches, 1)
+            ]
+
+            for future in as_completed(futures):
+                if future.result()['status'] == 'error' and not skip_on_error:
+                    print(f"\nStopping pipeline due to error.")
+                    for pending in futures:
+                        pending.cancel()
+                    break
+
+        self.agent.registry = None
+        self.results.extend(f.result() for f in futures if not f.cancelled())
+
+    def _open_journal(self):
+        """
+        Open the run journal named by 'journal_file'
+
+        Returns:
+            RunJournal, or None if journal_file is set to null
+        """
+        journal_file = self.config.get('journal_file', 'pipeline_journal.db')
+        if not journal_file:
+            if self.resume:
+                print("Warning: 'journal_file' is disabled, nothing to resume from")
+            return None
+
+        if self.resume and not os.path.exists(journal_file):
+            print(f"No run journal at {journal_file}, starting a new run")
+        journal = RunJournal(journal_file, resume=self.resume)
+        try:
+            nodes = StageGraph.build(self.config)
+        except ValueError as e:
+            # The sequential executor accepts outputs the graph rejects
+            logger.warning(f"Cannot check the journal against the configuration: {e}")
+            nodes = []
+        journal.begin(nodes)
+        return journal
+
+    def _stage_journal(self, stage, index):
+        """Journal of the index-th configuration of a stage, or None"""
+        return self.journal.stage(f'{stage} {index}') if self.journal is not None else None
+
+    def _open_stage_cache(self, stage_cache_config):
+        """
+        Open the stage result cache described by the 'stage_cache' configuration
+
+        Args:
+            stage_cache_config: Stage cache configuration dictionary or None
+
+        Returns:
+            StageCache instance, or None if stage caching is disabled
+        """
+        if not stage_cache_config or not stage_cache_config.get('enabled', True):
+            if self.force_stages or self.invalidate_stages:
+                print("Warning: 'stage_cache' is not enabled, ignoring --force/--invalidate")
+            return None
+
+        stage_cache = StageCache(
+            db_path=stage_cache_config.get('path', 'stage_cache.db'),
+            max_entries=stage_cache_config.get('max_entries', 100),
+            force=self.force_stages
+        )
+        if self.invalidate_stages:
+            stage_cache.invalidate(self.invalidate_stages)
+        return stage_cache
+
+    def close(self):
+        """Close the run journal and the stage cache"""
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+
+        if self.stage_cache is not None:
+            stats = self.stage_cache.stats()
+            if stats['hits'] or stats['misses']:
+                print(f"\nStage Cache: {stats['hits']} stages reused, {stats['misses']} computed")
+            self.stage_cache.close()
+            self.stage_cache = None
+
+    @staticmethod
+    def _open_cache(cache_config):
+        """
+        Open the message cache described by the 'cache' configuration
+
+        Args:
+            cache_config: Cache configuration dictionary or None
+
+        Returns:
+            MessageCache instance, or None if caching is disabled
+        """
+        if not cache_config or not cache_config.get('enabled', True):
+            return None
+
+        return MessageCache(
+            db_path=cache_config.get('path', 'gmail_cache.db'),
+            query_ttl=cache_config.get('query_ttl_seconds', 3600),
+            max_age=cache_config.get('max_age_days', 30) * 24 * 3600,
+            max_entries=cache_config.get('max_entries', 50000)
+        )
+
+    def _share_credentials(self, credentials_file):
+        """
+        Authorize one credential for every Gmail stage of the pipeline
+
+        When the drafter uses the same credentials file, the search agent
+        requests the compose scope as well, so the drafter reuses the
+        credential and discovery document instead of authenticating again.
+
+        Args:
+            credentials_file: Path to the OAuth credentials of the searches
+        """
+        scopes = [READONLY_SCOPE]
+        for draft_config in ConfigLoader.stage_configs(self.config, 'draft_emails'):
+            if draft_config.get('credentials_file', 'credentials.json') == credentials_file:
+                scopes.append(COMPOSE_SCOPE)
+                break
+        GmailServiceFactory.get(credentials_file, scopes=scopes)
+
+    @staticmethod
+    def _configure_quota(quota_config):
+        """
+        Configure the shared Gmail quota scheduler from the 'quota' configuration
+
+        Args:
+            quota_config: Quota configuration dictionary or None
+
+        Returns:
+            The shared QuotaScheduler instance
+        """
+        if not quota_config:
+            return QuotaScheduler.shared()
+
+        return QuotaScheduler.configure(
+            units_per_second=quota_config.get('units_per_second', 250),
+            burst=quota_config.get('burst'),
+            max_retries=quota_config.get('max_retries', 5),
+            base_delay=quota_config.get('base_delay_seconds', 1.0),
+            max_delay=quota_config.get('max_delay_seconds', 32.0),
+            retry_budget=quota_config.get('retry_budget', 10)
+        )
 
     def _print_summary(self, total_searches, successful, failed):
         """Print pipeline execution summary"""
@@ -161,6 +413,30 @@ class GmailPipeline:
         total_emails = sum(r['count'] for r in self.results)
         print(f"\nTotal Emails Retrieved: {total_emails}")
 
+        if self.stage_results:
+            print(f"\nStages:")
+            for result in self.stage_results:
+                status_symbol = '✓' if result['status'] == 'success' else 'ℹ' if result['status'] == 'skipped' else '✗'
+                target = result['output'] or ('Gmail drafts' if result['stage'] == 'draft_emails' else 'kept in memory')
+                print(f"  {status_symbol} {result['name']}: {result['count']} records from {result['input']} "
+                      f"-> {target} ({result['duration']}s)")
+                if result.get('error'):
+                    print(f"    {result['error']}")
+                if result.get('first_draft_seconds') is not None:
+                    print(f"    First draft after {result['first_draft_seconds']}s")
+
+        if self.wall_time is not None:
+            print(f"\nWall Time: {self.wall_time}s")
+
+        if self.cache_stats:
+            print(f"Message Cache: {self.cache_stats['hits']} hits, {self.cache_stats['misses']} misses, "
+                  f"{self.cache_stats['query_hits']} cached queries")
+
+        if self.scheduler is not None:
+            quota = self.scheduler.stats()
+            print(f"Gmail API: {quota['requests']} requests, {quota['retries']} retries, "
+                  f"{quota['throttled_seconds']}s throttled")
+
     def generate_report(self, output_file='pipeline_report.json'):
         """
         Generate a JSON report of pipeline execution
@@ -183,19 +459,36 @@ class GmailPipeline:
             'searches': self.results
         }
 
+        if self.stage_results:
+            report['stages'] = self.stage_results
+
+        if self.wall_time is not None:
+            report['wall_time'] = self.wall_time
+
+        if self.cache_stats:
+            report['cache'] = self.cache_stats
+
+        if self.stage_cache is not None:
+            report['stage_cache'] = self.stage_cache.stats()
+
+        if self.scheduler is not None:
+            report['quota'] = self.scheduler.stats()
+
         with open(output_file, 'w') as f:
             json.dump(report, f, indent=2)
 
         print(f"\nReport saved to {output_file}")
 
-    async def analyze_repositories(self, analyze_config):
-        """Run repository analysis"""
-        return await AgentRunners.analyze_repositories(analyze_config)
+    async def analyze_repositories(self, analyze_config, index=1):
+        """Run repository analysis for the index-th analyze_repos configuration"""
+        return await AgentRunners.analyze_repositories(
+            analyze_config, journal=self._stage_journal('analyze_repos', index), stage_cache=self.stage_cache)
 
-    def generate_messages(self, message_config):
-        """Run message generation"""
-        return AgentRunners.generate_messages(message_config)
+    def generate_messages(self, message_config, index=1):
+        """Run message generation for the index-th generate_messages configuration"""
+        return AgentRunners.generate_messages(
+            message_config, journal=self._stage_journal('generate_messages', index), stage_cache=self.stage_cache)
 
-    def draft_emails(self, draft_config):
-        """Create email drafts"""
-        return AgentRunners.draft_emails(draft_config)
+    def draft_emails(self, draft_config, index=1):
+        """Create email drafts for the index-th draft_emails configuration"""
+        return AgentRunners.draft_emails(draft_config, journal=self._stage_journal('draft_emails', index))
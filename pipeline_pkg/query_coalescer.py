@@ -0,0 +1,212 @@
+"""
+Coalesce compatible searches into one Gmail query, demultiplexed client-side
+"""
+import re
+from email.utils import parseaddr
+from logger_config import LoggerConfig
+
+logger = LoggerConfig.setup_logger('pipeline')
+
+# Query terms that can be evaluated locally against a parsed message
+TERM_PATTERN = re.compile(r'^(label|from):("[^"]+"|\S+)$', re.IGNORECASE)
+
+
+class QueryCoalescer:
+    """Run several simple searches as one OR query and split the results"""
+
+    @staticmethod
+    def parse_query(query):
+        """
+        Parse a query made only of label: and from: terms
+
+        from: terms must be a full address (user@example.com) or a domain
+        (@example.com) so that local matching is exact.
+
+        Args:
+            query: Gmail search query
+
+        Returns:
+            List of (field, value) predicates, all of which must match, or
+            None if the query cannot be evaluated locally
+        """
+        predicates = []
+        for term in query.split():
+            match = TERM_PATTERN.match(term)
+            if not match:
+                return None
+
+            field = match.group(1).lower()
+            value = match.group(2).strip('"').lower()
+            if field == 'from' and '@' not in value:
+                return None
+            predicates.append((field, value))
+
+        return predicates or None
+
+    @staticmethod
+    def group_searches(searches):
+        """
+        Group searches that can share one combined query
+
+        Searches are compatible when their queries parse into local
+        predicates, they use the same batch_size, fetch_mode, parse_workers
+        and max_scan_bytes, and they are neither incremental nor planned.
+
+        Args:
+            searches: List of (index, validated search) tuples
+
+        Returns:
+            List of groups, each a list of (index, search, predicates) with
+            at least two members
+        """
+        groups = {}
+        for index, search in searches:
+            if search['incremental'] or search['planner']:
+                continue
+            predicates = QueryCoalescer.parse_query(search['query'])
+            if predicates is None:
+                continue
+            key = (search['batch_size'], search['fetch_mode'], search['parse_workers'], search['max_scan_bytes'])
+            groups.setdefault(key, []).append((index, search, predicates))
+
+        return [group for group in groups.values() if len(group) > 1]
+
+    @staticmethod
+    def combined_query(group):
+        """
+        Build the OR query for a group
+
+        Args:
+            group: List of (index, search, predicates)
+
+        Returns:
+            Gmail search query matching the union of the group's searches
+        """
+        return ' OR '.join(f"({search['query']})" for _, search, _ in group)
+
+    @staticmethod
+    def run_group(agent, group):
+        """
+        Retrieve a group's messages once and assign them to their searches
+
+        The combined query is read newest first until every search has
+        max_results messages, the results are exhausted, or the sum of the
+        searches' max_results has been read. A search still short of
+        max_results at that bound is left out, so that it runs its own query;
+        every returned search receives exactly the messages its own query
+        would have returned.
+
+        A message that failed to be retrieved may have matched any search
+        that was still open at that point, so it is reported for each of
+        them. Fetch stats are those of the combined read, scaled to each
+        search's number of messages.
+
+        Args:
+            agent: Authenticated GmailAgent
+            group: List of (index, search, predicates)
+
+        Returns:
+            Dictionary mapping search index to a dictionary with its
+            'records', 'failed_messages' and 'fetch_stats'
+        """
+        query = QueryCoalescer.combined_query(group)
+        _, first, _ = group[0]
+        label_names = QueryCoalescer._label_names(agent)
+        limit = sum(search['max_results'] for _, search, _ in group)
+
+        logger.info(f"Coalescing {len(group)} searches into '{query}' (at most {limit} messages)")
+        print(f"Coalescing {len(group)} searches into one query: {query}")
+
+        records = {index: [] for index, _, _ in group}
+        failed = {index: [] for index, _, _ in group}
+        open_searches = list(group)
+        read = 0
+        seen_failures = 0
+
+        def assign_failures():
+            nonlocal seen_failures
+            for failure in agent.failed_messages[seen_failures:]:
+                for index, _, _ in open_searches:
+                    failed[index].append(failure)
+            seen_failures = len(agent.failed_messages)
+
+        for record in agent.iter_emails(query, max_results=limit, batch_size=first['batch_size'],
+                                        fetch_mode=first['fetch_mode'],
+                                        parse_workers=first['parse_workers'],
+                                        max_scan_bytes=first['max_scan_bytes']):
+            # Failures of a page are recorded before its messages are yielded
+            assign_failures()
+            read += 1
+            for index, search, predicates in open_searches:
+                if QueryCoalescer.matches(record, predicates, label_names):
+                    records[index].append(dict(record, search_criteria=search['query']))
+
+            open_searches = [entry for entry in open_searches
+                             if len(records[entry[0]]) < entry[1]['max_results']]
+            if not open_searches:
+                break
+        else:
+            assign_failures()
+
+        if open_searches and read + seen_failures >= limit:
+            names = ', '.join(search['name'] for _, search, _ in open_searches)
+            logger.info(f"Combined query reached {limit} messages before filling {names}")
+            for index, _, _ in open_searches:
+                del records[index]
+
+        stats = agent.fetch_stats.as_dict()
+        return {
+            index: {
+                'records': records[index],
+                'failed_messages': failed[index],
+                'fetch_stats': {
+                    'messages': len(records[index]),
+                    'bytes': stats['bytes_per_message'] * len(records[index]),
+                    'bytes_per_message': stats['bytes_per_message'],
+                    'ms_per_message': stats['ms_per_message']
+                }
+            }
+            for index in records
+        }
+
+    @staticmethod
+    def matches(record, predicates, label_names):
+        """
+        Evaluate a search's predicates against a parsed message
+
+        Args:
+            record: Email data dictionary with 'from' and 'label_ids'
+            predicates: List of (field, value) from parse_query()
+            label_names: Dictionary mapping label ID to normalized label names
+
+        Returns:
+            True if every predicate matches
+        """
+        for field, value in predicates:
+            if field == 'label':
+                names = set()
+                for label_id in record.get('label_ids', []):
+                    names.update(label_names.get(label_id, ()))
+                if value not in names:
+                    return False
+            else:
+                address = parseaddr(record.get('from', ''))[1].lower()
+                if value.startswith('@'):
+                    if not address.endswith(value):
+                        return False
+                elif address != value:
+                    return False
+
+        return True
+
+    @staticmethod
+    def _label_names(agent):
+        """Map label IDs to the spellings Gmail accepts in label: terms"""
+        labels = agent.scheduler.execute(
+            agent.service.users().labels().list(userId='me')
+        ).get('labels', [])
+        names = {}
+        for label in labels:
+            name = label['name'].lower()
+            names[label['id']] = {name, name.replace(' ', '-').replace('/', '-')}
+        return names
@@ -0,0 +1,179 @@
+"""
+Split large Gmail searches into date windows listed in parallel
+"""
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+from gmail_api_pkg import QuotaScheduler
+from logger_config import LoggerConfig
+
+logger = LoggerConfig.setup_logger('pipeline')
+
+LIST_PAGE_SIZE = 500
+
+# Windows overlap by this many seconds so boundary messages are never lost;
+# duplicates are removed when the windows are merged
+WINDOW_OVERLAP = 1
+
+# Windows shorter than this are never split further
+MIN_WINDOW_SECONDS = 3600
+
+
+class QueryPlanner:
+    """Plan and run the listing of one query as concurrent after:/before: windows"""
+
+    def __init__(self, service_factory, start=None, end=None, target_per_window=2000,
+                 max_workers=8, max_windows=64, scheduler=None):
+        """
+        Initialize the planner
+
+        Args:
+            service_factory: Callable returning a Gmail service for the calling
+                thread (each thread needs its own HTTP transport)
+            start: Earliest date to split from, 'YYYY/MM/DD' (defaults to five
+                years ago). Older messages are still listed by the first window.
+            end: Latest date to split to, 'YYYY/MM/DD' (defaults to now). Newer
+                messages are still listed by the last window.
+            target_per_window: Estimated number of messages one window should hold
+            max_workers: Number of windows listed at the same time
+            max_windows: Upper bound on the number of windows
+            scheduler: QuotaScheduler pacing the list calls (defaults to the shared one)
+        """
+        now = int(time.time())
+        self.service_factory = service_factory
+        self.start = self._to_epoch(start) if start else now - 5 * 365 * 24 * 3600
+        self.end = self._to_epoch(end) if end else now
+        self.target_per_window = max(1, target_per_window)
+        self.max_workers = max_workers
+        self.max_windows = max_windows
+        self.scheduler = scheduler or QuotaScheduler.shared()
+        self._local = threading.local()
+        self._window_count = 0
+        self._lock = threading.Lock()
+
+    def plan(self, query, max_results=None):
+        """
+        List all message IDs of a query using concurrent date windows
+
+        The number of windows is chosen from the query's resultSizeEstimate,
+        and any window whose own estimate exceeds twice the target is split
+        in half before it is listed.
+
+        Args:
+            query: Gmail search query
+            max_results: Maximum number of IDs to return (None for no limit)
+
+        Returns:
+            List of message IDs, newest first, without duplicates
+        """
+        estimate = self._estimate(query)
+        n_windows = max(1, min(self.max_windows, math.ceil(estimate / self.target_per_window)))
+        logger.info(f"Planning '{query}': ~{estimate} messages, {n_windows} initial windows")
+        print(f"Query planner: ~{estimate} messages, listing in {n_windows} date windows")
+
+        bounds = [self.start + (self.end - self.start) * i // n_windows for i in range(n_windows + 1)]
+        # The outer windows are open-ended so nothing outside [start, end) is missed
+        windows = [(None if i == 0 else bounds[i], None if i == n_windows - 1 else bounds[i + 1])
+                   for i in range(n_windows)]
+        self._window_count = len(windows)
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = {executor.submit(self._list_window, query, w): w for w in windows}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    window = pending.pop(future)
+                    msg_ids, halves = future.result()
+                    if halves:
+                        for half in halves:
+                            pending[executor.submit(self._list_window, query, half)] = half
+                    else:
+                        results[window] = msg_ids
+
+        # Gmail lists newest first, so merge windows from the latest one back
+        ordered = sorted(results, key=lambda w: w[0] if w[0] is not None else -1, reverse=True)
+        msg_ids = []
+        seen = set()
+        for window in ordered:
+            for msg_id in results[window]:
+                if msg_id not in seen:
+                    seen.add(msg_id)
+                    msg_ids.append(msg_id)
+
+        logger.info(f"Planner listed {len(msg_ids)} unique messages in {len(results)} windows")
+        return msg_ids if max_results is None else msg_ids[:max_results]
+
+    def _list_window(self, query, window):
+        """
+        List one window, or split it if it is estimated to be too large
+
+        Args:
+            query: Gmail search query
+            window: (after, before) epoch seconds, None for open-ended
+
+        Returns:
+            Tuple (msg_ids, halves): halves is a pair of sub-windows when the
+            window was split instead of listed, otherwise None
+        """
+        window_query = self._window_query(query, window)
+        after, before = window
+        lower = self.start if after is None else after
+        upper = self.end if before is None else before
+
+        if upper - lower > MIN_WINDOW_SECONDS and self._estimate(window_query) > 2 * self.target_per_window:
+            with self._lock:
+                if self._window_count < self.max_windows:
+                    self._window_count += 1
+                    middle = (lower + upper) // 2
+                    logger.debug(f"Splitting window {window} at {middle}")
+                    return None, [(after, middle), (middle, before)]
+
+        service = self._service()
+        msg_ids = []
+        page_token = None
+        while True:
+            results = self.scheduler.execute(service.users().messages().list(
+                userId='me',
+                q=window_query,
+                maxResults=LIST_PAGE_SIZE,
+                pageToken=page_token
+            ))
+            msg_ids.extend(m['id'] for m in results.get('messages', []))
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+
+        logger.debug(f"Window {window} listed {len(msg_ids)} messages")
+        return msg_ids, None
+
+    def _estimate(self, query):
+        """Return Gmail's resultSizeEstimate for a query"""
+        results = self.scheduler.execute(self._service().users().messages().list(
+            userId='me', q=query, maxResults=1
+        ))
+        return results.get('resultSizeEstimate', 0)
+
+    def _service(self):
+        """Return the Gmail service of the calling thread"""
+        if not hasattr(self._local, 'service'):
+            self._local.service = self.service_factory()
+        return self._local.service
+
+    @staticmethod
+    def _window_query(query, window):
+        """Restrict a query to a date window"""
+        after, before = window
+        terms = [f"({query})"]
+        if after is not None:
+            terms.append(f"after:{after - WINDOW_OVERLAP}")
+        if before is not None:
+            terms.append(f"before:{before + WINDOW_OVERLAP}")
+        return ' '.join(terms)
+
+    @staticmethod
+    def _to_epoch(date_str):
+        """Convert 'YYYY/MM/DD' to epoch seconds"""
+        return int(datetime.strptime(date_str, '%Y/%m/%d').timestamp())
@@ -0,0 +1,222 @@
+"""
+SQLite journal of the items each pipeline stage has completed
+"""
+import json
+import sqlite3
+import threading
+import time
+from logger_config import LoggerConfig
+from .stage_graph import STAGES, StageGraph
+
+logger = LoggerConfig.setup_logger('pipeline')
+
+KIND_ORDER = ('search',) + STAGES
+
+
+class RunJournal:
+    """Record per-item progress of a run so an interrupted run can resume"""
+
+    def __init__(self, db_path='pipeline_journal.db', resume=False):
+        """
+        Open (and create if needed) the journal database
+
+        Args:
+            db_path: Path to the SQLite database file
+            resume: Keep the progress of the previous run; otherwise the
+                journal is cleared and the run starts from scratch
+        """
+        self.db_path = db_path
+        self.resume = resume
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.executescript("""
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS stages (
+                stage TEXT PRIMARY KEY,
+                config TEXT NOT NULL,
+                completed_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS items (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                stage TEXT NOT NULL,
+                item_id TEXT NOT NULL,
+                status TEXT NOT NULL,
+                record TEXT,
+                updated_at REAL NOT NULL,
+                UNIQUE (stage, item_id)
+            );
+        """)
+        if not resume:
+            self._conn.execute("DELETE FROM items")
+            self._conn.execute("DELETE FROM stages")
+        self._conn.commit()
+        logger.debug(f"Opened run journal {db_path} (resume={resume})")
+
+    def begin(self, nodes):
+        """
+        Register the run's nodes, dropping progress their configuration invalidates
+
+        When a node's configuration changed since the journaled run, its
+        items and those of every later kind of node are discarded: a new
+        grading threshold, for example, also changes the messages. Drafts
+        are kept, since they exist in Gmail whatever the configuration.
+
+        Args:
+            nodes: List of StageNode from StageGraph.build()
+
+        Returns:
+            Number of items kept from the previous run
+        """
+        configs = {node.key: StageGraph.config_key(node.config) for node in nodes}
+
+        with self._lock:
+            stored = dict(self._conn.execute("SELECT stage, config FROM stages").fetchall())
+            changed = [node for node in nodes if node.key in stored and stored[node.key] != configs[node.key]]
+            if changed:
+                first = min(KIND_ORDER.index(node.kind) for node in changed)
+                stale = [node.key for node in nodes
+                         if KIND_ORDER.index(node.kind) >= first and node.kind != 'draft_emails']
+                logger.info(f"Configuration changed for {', '.join(n.key for n in changed)}, "
+                            f"discarding progress of {len(stale)} nodes")
+                print(f"Configuration changed since the journaled run, redoing {', '.join(stale)}")
+                for key in stale:
+                    self._conn.execute("DELETE FROM items WHERE stage = ?", (key,))
+                    self._conn.execute("DELETE FROM stages WHERE stage = ?", (key,))
+
+            for key, config in configs.items():
+                self._conn.execute(
+                    "INSERT INTO stages (stage, config) VALUES (?, ?) "
+                    "ON CONFLICT (stage) DO UPDATE SET config = excluded.config", (key, config)
+                )
+            self._conn.commit()
+
+            kept = self._conn.execute("SELECT COUNT(*) FROM items WHERE status = 'done'").fetchone()[0]
+
+        if self.resume:
+            print(f"Resuming from {self.db_path}: {kept} completed items")
+        return kept
+
+    def stage(self, key):
+        """
+        Get the journal of one node
+
+        Args:
+            key: Node key, e.g. 'search 1' or 'analyze_repos 2'
+
+        Returns:
+            StageJournal bound to the node
+        """
+        return StageJournal(self, key)
+
+    def get(self, stage, item_id):
+        """Look up an item; returns (status, record) or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, record FROM items WHERE stage = ? AND item_id = ?", (stage, str(item_id))
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1]) if row[1] is not None else None
+
+    def put(self, stage, item_id, status, record=None, commit=True):
+        """
+        Store the state of an item
+
+        Args:
+            stage: Node key
+            item_id: ID of the record
+            status: 'done', or 'pending' for work started but not confirmed
+            record: JSON-serializable result of the item
+            commit: Commit right away; pass False for items only needed
+                once the whole stage has completed
+        """
+        data = json.dumps(record, default=str) if record is not None else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO items (stage, item_id, status, record, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (stage, str(item_id), status, data, time.time())
+            )
+            if commit:
+                self._conn.commit()
+
+    def records(self, stage):
+        """Return the records of a stage's completed items in the order they were stored"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT record FROM items WHERE stage = ? AND status = 'done' ORDER BY seq", (stage,)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def completed(self, stage):
+        """Whether a stage was marked complete"""
+        with self._lock:
+            row = self._conn.execute("SELECT completed_at FROM stages WHERE stage = ?", (stage,)).fetchone()
+        return row is not None and row[0] is not None
+
+    def complete(self, stage):
+        """Mark a stage complete and commit its items"""
+        with self._lock:
+            self._conn.execute("UPDATE stages SET completed_at = ? WHERE stage = ?", (time.time(), stage))
+            self._conn.commit()
+
+    def reset(self, stage):
+        """Discard the items of a stage and its completion mark"""
+        with self._lock:
+            self._conn.execute("DELETE FROM items WHERE stage = ?", (stage,))
+            self._conn.execute("UPDATE stages SET completed_at = NULL WHERE stage = ?", (stage,))
+            self._conn.commit()
+
+    def close(self):
+        """Commit and close the database connection"""
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+
+class StageJournal:
+    """Journal of one node, keyed by record ID"""
+
+    def __init__(self, journal, key):
+        """
+        Args:
+            journal: RunJournal holding the items
+            key: Node key
+        """
+        self.journal = journal
+        self.key = key
+
+    def get(self, item_id):
+        """Return the record of a completed item, or None"""
+        entry = self.journal.get(self.key, item_id)
+        return entry[1] if entry and entry[0] == 'done' else None
+
+    def is_pending(self, item_id):
+        """Whether work on an item started without being confirmed"""
+        entry = self.journal.get(self.key, item_id)
+        return entry is not None and entry[0] == 'pending'
+
+    def mark_pending(self, item_id):
+        """Record that work with side effects on an item is about to start"""
+        self.journal.put(self.key, item_id, 'pending')
+
+    def record(self, item_id, record, commit=True):
+        """Record a completed item and its result"""
+        self.journal.put(self.key, item_id, 'done', record, commit)
+
+    def records(self):
+        """Return the records of the completed items"""
+        return self.journal.records(self.key)
+
+    def completed(self):
+        """Whether the node was marked complete"""
+        return self.journal.completed(self.key)
+
+    def complete(self):
+        """Mark the node complete"""
+        self.journal.complete(self.key)
+
+    def reset(self):
+        """Discard the node's progress"""
+        self.journal.reset(self.key)
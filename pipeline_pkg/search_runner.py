@@ -0,0 +1,237 @@
+"""
+Execution of a single configured Gmail search
+"""
+from datetime import datetime
+from logger_config import LoggerConfig
+from .config_loader import ConfigLoader
+from .query_planner import QueryPlanner
+from .query_coalescer import QueryCoalescer
+
+logger = LoggerConfig.setup_logger('pipeline')
+
+
+class SearchRunner:
+    """Run one search from the configuration and export its results"""
+
+    def __init__(self, sync_state=None, journal=None):
+        """
+        Initialize the search runner
+
+        Args:
+            sync_state: SyncState used by incremental searches
+            journal: RunJournal; searches it marks complete are replayed
+                from it instead of querying Gmail again
+        """
+        self.sync_state = sync_state
+        self.journal = journal
+        self.prefetched = {}
+
+    def run_search(self, agent, search_config, index, total_searches, records=None, write_output=True):
+        """
+        Run a search and export the matching emails to its output file
+
+        Args:
+            agent: Authenticated GmailAgent used for this search
+            search_config: Search configuration dictionary
+            index: 1-based position of the search in the configuration
+            total_searches: Number of configured searches
+            records: Optional list receiving the email records, for stages
+                that take them in memory
+            write_output: If False, the output file is not written (the
+                records are only collected)
+
+        Returns:
+            Result dictionary; 'status' is 'success', 'no_results' or 'error'
+        """
+        try:
+            search = ConfigLoader.validate_search(search_config, index - 1)
+
+            print(f"\n[{index}/{total_searches}] {search['name']}")
+            print(f"{'─'*70}")
+            print(f"Query: {search['query']}")
+            print(f"Output: {search['output']}")
+            print(f"Max Results: {search['max_results']}")
+            if search['batch_size']:
+                print(f"Batch Size: {search['batch_size']}")
+            if search['output_mode'] != 'overwrite':
+                print(f"Output Mode: {search['output_mode']} (keyed on ID)")
+            if search['fetch_mode'] != 'full':
+                print(f"Fetch Mode: {search['fetch_mode']}")
+            if search['incremental']:
+                print(f"Incremental: only messages added since the last run")
+            elif search['planner']:
+                print(f"Planner: listing in parallel date windows")
+
+            start_time = datetime.now()
+            prefetched = None
+            journal = self.journal.stage(f'search {index}') if self.journal is not None else None
+            if journal is not None and journal.completed():
+                email_iter = iter(journal.records())
+                print(f"Resumed: replaying the emails of the journaled run")
+                journal = None
+            elif index in self.prefetched:
+                prefetched = self.prefetched.pop(index)
+                email_iter = iter(prefetched['records'])
+            else:
+                email_iter = self.iter_search(agent, search)
+            if journal is not None:
+                journal.reset()
+                email_iter = SearchRunner._journal(email_iter, journal)
+            if records is not None:
+                email_iter = SearchRunner._collect(email_iter, records)
+            if write_output:
+                email_count = agent.export_stream(email_iter, output_file=search['output'],
+                                                  output_mode=search['output_mode'])
+            else:
+                email_count = sum(1 for _ in email_iter)
+
+            if journal is not None:
+                journal.complete()
+
+            if search['incremental']:
+                self.sync_state.save()
+                if not email_count and search['output_mode'] == 'overwrite' and write_output:
+                    # Empty the previous run's output so later stages find
+                    # no records instead of reprocessing it or a missing file
+                    logger.info(f"No new emails, emptying output {search['output']}")
+                    agent.export_empty(search['output'])
+
+            if prefetched is not None:
+                failed_messages = len(prefetched['failed_messages'])
+                fetch_stats = prefetched['fetch_stats']
+            else:
+                failed_messages = len(agent.failed_messages)
+                fetch_stats = agent.fetch_stats.as_dict()
+
+            if email_count:
+                end_time = datetime.now()
+                duration = (end_time - start_time).total_seconds()
+
+                result = {
+                    'name': search['name'],
+                    'query': search['query'],
+                    'output': search['output'],
+                    'count': email_count,
+                    'duration': duration,
+                    'status': 'success',
+                    'failed_messages': failed_messages,
+                    'fetch_mode': search['fetch_mode'],
+                    'fetch_stats': fetch_stats
+                }
+
+                if write_output:
+                    print(f"✓ Success: {email_count} emails exported to {search['output']}")
+                else:
+                    print(f"✓ Success: {email_count} emails handed to the next stage in memory")
+                print(f"  Duration: {duration:.2f}s")
+                print(f"  Transferred: {fetch_stats['bytes_per_message']} bytes/message, "
+                      f"{fetch_stats['ms_per_message']} ms/message ({search['fetch_mode']})")
+                if failed_messages:
+                    print(f"  Failed to retrieve: {failed_messages} messages")
+            else:
+                result = {
+                    'name': search['name'],
+                    'query': search['query'],
+                    'output': search['output'],
+                    'count': 0,
+                    'duration': 0,
+                    'status': 'no_results',
+                    'failed_messages': failed_messages
+                }
+                print(f"ℹ No emails found")
+
+            return result
+
+        except Exception as e:
+            logger.error(f"Search {index} failed: {e}")
+            print(f"✗ Error: {e}")
+            return {
+                'name': search_config.get('name', f'Search {index}'),
+                'query': search_config.get('query', 'N/A'),
+                'output': search_config.get('output', 'N/A'),
+                'count': 0,
+                'duration': 0,
+                'status': 'error',
+                'error': str(e)
+            }
+
+    @staticmethod
+    def _collect(email_iter, records):
+        """Yield the emails of an iterator while appending them to records"""
+        for email in email_iter:
+            records.append(email)
+            yield email
+
+    @staticmethod
+    def _journal(email_iter, journal):
+        """Yield the emails of an iterator while adding them to a search's journal"""
+        for email in email_iter:
+            # Committed with the search, which is only replayed once complete
+            journal.record(email['id'], email, commit=False)
+            yield email
+
+    def coalesce(self, agent, searches_config):
+        """
+        Retrieve compatible searches through combined queries ahead of time
+
+        The records, failed messages and fetch stats of coalesced searches
+        are stored in self.prefetched and reported by run_search() instead of
+        running their own query.
+
+        Args:
+            agent: Authenticated GmailAgent
+            searches_config: List of search configuration dictionaries
+        """
+        searches = []
+        for i, search_config in enumerate(searches_config, 1):
+            if self.journal is not None and self.journal.completed(f'search {i}'):
+                continue
+            try:
+                searches.append((i, ConfigLoader.validate_search(search_config, i - 1)))
+            except Exception:
+                # Invalid searches report their error when they run
+                continue
+
+        for group in QueryCoalescer.group_searches(searches):
+            try:
+                self.prefetched.update(QueryCoalescer.run_group(agent, group))
+            except Exception as e:
+                logger.warning(f"Coalesced query failed, running searches separately: {e}")
+                print(f"Warning: Coalesced query failed ({e}), running searches separately")
+
+    def iter_search(self, agent, search):
+        """
+        Create the email iterator for a validated search configuration
+
+        Args:
+            agent: Authenticated GmailAgent
+            search: Validated search configuration
+
+        Returns:
+            Iterator of email data dictionaries
+        """
+        options = {
+            'max_results': search['max_results'],
+            'batch_size': search['batch_size'],
+            'fetch_mode': search['fetch_mode'],
+            'parse_workers': search['parse_workers'],
+            'max_scan_bytes': search['max_scan_bytes']
+        }
+
+        if search['incremental']:
+            return agent.sync_emails(search['query'], self.sync_state, **options)
+
+        if search['planner']:
+            planner_config = search['planner']
+            planner = QueryPlanner(
+                agent.authenticator.build_service,
+                start=planner_config.get('start'),
+                end=planner_config.get('end'),
+                target_per_window=planner_config.get('target_per_window', 2000),
+                max_workers=planner_config.get('max_workers', 8),
+                max_windows=planner_config.get('max_windows', 64)
+            )
+            message_ids = planner.plan(search['query'], search['max_results'])
+            return agent.iter_emails(search['query'], message_ids=message_ids, **options)
+
+        return agent.iter_emails(search['query'], **options)
@@ -0,0 +1,211 @@
+"""
+Content-addressed cache of post-search stage results
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from tabular_io_pkg import open_reader
+from logger_config import LoggerConfig
+from .stage_graph import StageGraph
+
+logger = LoggerConfig.setup_logger('pipeline')
+
+# Stages whose results depend only on their input and configuration
+CACHEABLE_STAGES = ('analyze_repos', 'generate_messages')
+
+
+class StageCache:
+    """Reuse a stage's results when its input and relevant configuration are unchanged"""
+
+    def __init__(self, db_path='stage_cache.db', max_entries=100, force=()):
+        """
+        Open (and create if needed) the cache database
+
+        Args:
+            db_path: Path to the SQLite database file
+            max_entries: Maximum number of stage results kept
+            force: Stages ('analyze_repos', 'generate_messages' or 'all')
+                recomputed in this run even if a result is cached
+        """
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.force = set(force or ())
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS artifacts (
+                key TEXT PRIMARY KEY,
+                stage TEXT NOT NULL,
+                records TEXT NOT NULL,
+                output_file TEXT,
+                output_digest TEXT,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS artifacts_stage ON artifacts (stage);
+        """)
+        self._conn.commit()
+        logger.debug(f"Opened stage cache {db_path}")
+
+    def lookup(self, stage, config, records=None, input_file=None):
+        """
+        Look up the cached result of a stage run
+
+        The key hashes the stage, its configuration without LAYOUT_KEYS and
+        the content of its input: the records handed over in memory, or the
+        headers and rows of input_file. Rows rather than bytes are hashed
+        because a rewritten workbook differs in its timestamps even when its
+        cells are the same.
+
+        Args:
+            stage: 'analyze_repos' or 'generate_messages'
+            config: Stage configuration dictionary
+            records: Input records handed over in memory, or None
+            input_file: Input file read when records is None
+
+        Returns:
+            Tuple (key, cached records or None); key is None when the input
+            cannot be hashed
+        """
+        if records is not None:
+            input_digest = StageCache.records_digest(records)
+        elif input_file and os.path.exists(input_file):
+            input_digest = StageCache.table_digest(input_file)
+        else:
+            return None, None
+
+        key = hashlib.sha256(
+            f"{stage}\n{StageGraph.config_key(config)}\n{input_digest}".encode('utf-8')
+        ).hexdigest()
+
+        if stage in self.force or 'all' in self.force:
+            self.misses += 1
+            print(f"Recomputing {stage} (forced)")
+            return key, None
+
+        with self._lock:
+            row = self._conn.execute("SELECT records FROM artifacts WHERE key = ?", (key,)).fetchone()
+
+        if row is None:
+            self.misses += 1
+            return key, None
+
+        self.hits += 1
+        logger.info(f"Stage cache hit for {stage} ({key[:12]})")
+        print(f"✓ {stage} is up to date: input and configuration unchanged, reusing cached results")
+        return key, json.loads(row[0])
+
+    def store(self, key, stage, records, output_file=None):
+        """
+        Store the result of a stage run
+
+        Args:
+            key: Key returned by lookup()
+            stage: Stage name
+            records: JSON-serializable output records
+            output_file: Output file written by the run, if any
+        """
+        if key is None:
+            return
+
+        output_digest = None
+        if output_file and os.path.exists(output_file):
+            output_digest = StageCache.table_digest(output_file)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO artifacts (key, stage, records, output_file, output_digest, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, stage, json.dumps(records, default=str), output_file, output_digest, time.time())
+            )
+            self._conn.execute(
+                "DELETE FROM artifacts WHERE key IN ("
+                "SELECT key FROM artifacts ORDER BY created_at DESC LIMIT -1 OFFSET ?)", (self.max_entries,)
+            )
+            self._conn.commit()
+
+    def output_current(self, key, output_file):
+        """
+        Whether output_file still holds what the cached run wrote
+
+        Args:
+            key: Key returned by lookup()
+            output_file: Output file of the stage
+
+        Returns:
+            True if the file exists with the rows the cached run wrote, so it
+            need not be written again
+        """
+        if not os.path.exists(output_file):
+            return False
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT output_file, output_digest FROM artifacts WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] is None or os.path.normpath(row[0]) != os.path.normpath(output_file):
+            return False
+        return StageCache.table_digest(output_file) == row[1]
+
+    def invalidate(self, stages):
+        """
+        Remove the cached results of stages
+
+        Args:
+            stages: Stage names, or ['all']
+
+        Returns:
+            Number of results removed
+        """
+        with self._lock:
+            if 'all' in stages:
+                removed = self._conn.execute("DELETE FROM artifacts").rowcount
+            else:
+                removed = sum(
+                    self._conn.execute("DELETE FROM artifacts WHERE stage = ?", (stage,)).rowcount
+                    for stage in stages
+                )
+            self._conn.commit()
+
+        print(f"Invalidated {removed} cached stage results ({', '.join(stages)})")
+        return removed
+
+    def stats(self):
+        """
+        Report cache usage
+
+        Returns:
+            Dictionary with hit/miss counters and the number of stored results
+        """
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM artifacts").fetchone()[0]
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries}
+
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def table_digest(path):
+        """SHA-256 of the headers and rows of a tabular file"""
+        digest = hashlib.sha256()
+        with open_reader(path) as reader:
+            digest.update(json.dumps(list(reader.headers), default=str).encode('utf-8'))
+            for row in reader.iter_rows():
+                digest.update(b'\n')
+                digest.update(json.dumps(list(row), default=str).encode('utf-8'))
+        return digest.hexdigest()
+
+    @staticmethod
+    def records_digest(records):
+        """SHA-256 of a list of records in canonical JSON form"""
+        digest = hashlib.sha256()
+        for record in records:
+            digest.update(json.dumps(record, sort_keys=True, default=str).encode('utf-8'))
+            digest.update(b'\n')
+        return digest.hexdigest()
@@ -0,0 +1,156 @@
+"""
+Pipeline stages as a dependency graph
+"""
+import json
+import os
+from .config_loader import ConfigLoader
+
+# Post-search stages, in pipeline order
+STAGES = ('analyze_repos', 'generate_messages', 'draft_emails')
+
+# Kind of node whose records each stage takes as input
+PRODUCER = {
+    'analyze_repos': 'search',
+    'generate_messages': 'analyze_repos',
+    'draft_emails': 'generate_messages'
+}
+
+# Configuration keys that do not change the records a node produces from its input
+LAYOUT_KEYS = ('name', 'input_file', 'output', 'output_file', 'output_mode', 'write_output', 'temp_dir',
+               'cleanup', 'analysis_workers', 'large_repo_files', 'scan_threads', 'mirror_cache',
+               'credentials_file', 'cache')
+
+DEFAULT_OUTPUTS = {
+    'analyze_repos': 'Output_23.xlsx',
+    'generate_messages': 'Output_34.xlsx'
+}
+
+
+class StageNode:
+    """One search or stage of the pipeline and its place in the graph"""
+
+    def __init__(self, key, kind, config, index, output=None, output_mode='overwrite'):
+        """
+        Initialize the node
+
+        Args:
+            key: Unique name, e.g. 'search 2' or 'analyze_repos 1'
+            kind: 'search' or one of STAGES
+            config: Configuration dictionary of the search or stage
+            index: 1-based position among the nodes of the same kind
+            output: Output file, or None for stages without one
+            output_mode: 'overwrite' or 'upsert'
+        """
+        self.key = key
+        self.kind = kind
+        self.config = config
+        self.index = index
+        self.input = None if kind == 'search' else config.get('input_file')
+        self.output = output
+        self.output_mode = output_mode
+        self.upstream = None
+        self.consumers = []
+        self.records = None
+        self.result = None
+
+    @property
+    def in_memory(self):
+        """
+        Whether the node takes its input records from its upstream node
+
+        Upserted files hold more than one run's records, so a consumer of an
+        upserting node reads the file once the node has finished.
+        """
+        return self.upstream is not None and self.upstream.output_mode == 'overwrite'
+
+    def keeps_records(self):
+        """Whether a consumer takes this node's records in memory"""
+        return any(consumer.in_memory for consumer in self.consumers)
+
+    def writes_output(self, write_intermediate=False):
+        """
+        Whether the node writes its output file
+
+        Files nothing reads in memory are always written; files handed to a
+        consumer in memory only when asked for.
+
+        Args:
+            write_intermediate: Global switch writing every output file
+
+        Returns:
+            True if the output file is written
+        """
+        if self.output is None:
+            return False
+        if write_intermediate or self.config.get('write_output') or self.output_mode != 'overwrite':
+            return True
+        return not self.keeps_records()
+
+
+class StageGraph:
+    """Build the pipeline graph from the configuration"""
+
+    @staticmethod
+    def build(config):
+        """
+        Create the nodes and connect each stage to the node producing its input
+
+        A stage depends on the node of the preceding kind (see PRODUCER) whose
+        output file is the stage's input_file. Stages whose input is not
+        produced in this run read the file from disk, as before.
+
+        Args:
+            config: Loaded configuration dictionary
+
+        Returns:
+            List of StageNode in topological order
+
+        Raises:
+            ValueError: If two nodes of the same kind write the same file
+        """
+        nodes = []
+        for i, search_config in enumerate(config['searches'], 1):
+            output = search_config.get('output', f'search_{i}.xlsx')
+            mode = search_config.get('output_mode', 'overwrite')
+            nodes.append(StageNode(f'search {i}', 'search', search_config, i, output, mode))
+
+        for stage in STAGES:
+            for i, stage_config in enumerate(ConfigLoader.stage_configs(config, stage), 1):
+                output = None
+                if stage in DEFAULT_OUTPUTS:
+                    output = stage_config.get('output_file', DEFAULT_OUTPUTS[stage])
+                mode = stage_config.get('output_mode', 'overwrite')
+                nodes.append(StageNode(f'{stage} {i}', stage, stage_config, i, output, mode))
+
+        producers = {}
+        for node in nodes:
+            if node.output is None:
+                continue
+            path = (node.kind, os.path.normpath(node.output))
+            if path in producers:
+                raise ValueError(f"'{node.output}' is written by both {producers[path].key} and {node.key}")
+            producers[path] = node
+
+        for node in nodes:
+            if node.kind == 'search' or not node.input:
+                continue
+            upstream = producers.get((PRODUCER[node.kind], os.path.normpath(node.input)))
+            if upstream is not None:
+                node.upstream = upstream
+                upstream.consumers.append(node)
+
+        return nodes
+
+    @staticmethod
+    def config_key(config):
+        """
+        Canonical form of the configuration keys that affect a node's records
+
+        Args:
+            config: Configuration dictionary of a search or stage
+
+        Returns:
+            JSON string of the configuration without LAYOUT_KEYS
+        """
+        relevant = {k: v for k, v in config.items() if k not in LAYOUT_KEYS}
+        return json.dumps(relevant, sort_keys=True, default=str)
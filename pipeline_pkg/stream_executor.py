@@ -0,0 +1,410 @@
+"""
+Record-level streaming execution of the pipeline graph
+"""
+import asyncio
+import os
+import shutil
+import time
+from concurrent.futures.process import BrokenProcessPool
+from email_drafter_pkg import EmailDrafter
+from email_drafter_pkg.excel_reader import ExcelReader
+from message_writer_pkg import MessageWriter, ExcelHandler as MessageHandler
+from repo_analyzer import RepoAnalyzer, MirrorCache, ExcelHandler as AnalysisHandler
+from repo_analyzer.analyzer import AnalysisPool, analyze_repo_task
+from logger_config import LoggerConfig
+from .dag_executor import DagExecutor
+
+logger = LoggerConfig.setup_logger('pipeline')
+
+# End-of-stream marker passed through the stage queues
+_END = object()
+
+# Records processed at once by each stage; clones are network-bound
+STAGE_WORKERS = {
+    'analyze_repos': 5,
+    'generate_messages': 1,
+    'draft_emails': 1
+}
+
+
+class QueueFeeder:
+    """List-like sink that hands each record a search produces to the stage queues"""
+
+    def __init__(self, loop, queues):
+        """
+        Args:
+            loop: Event loop owning the queues
+            queues: Input queues of the consumer stages
+        """
+        self.loop = loop
+        self.queues = queues
+        self.count = 0
+
+    def append(self, record):
+        """
+        Put a record into every consumer queue
+
+        Called from a search worker thread; blocks while a queue is full,
+        which holds the Gmail fetch back until the consumers catch up.
+
+        Args:
+            record: Email data dictionary
+        """
+        for queue in self.queues:
+            asyncio.run_coroutine_threadsafe(queue.put(record), self.loop).result()
+        self.count += 1
+
+    def __len__(self):
+        return self.count
+
+
+class StreamExecutor(DagExecutor):
+    """Run the graph with each record flowing through the stages as soon as it is ready"""
+
+    def __init__(self, agent, runner, max_searches=1, skip_on_error=False, write_intermediate=False,
+                 journal=None, stage_cache=None, queue_size=16):
+        """
+        Initialize the executor
+
+        Args:
+            agent: Authenticated GmailAgent
+            runner: SearchRunner executing the searches
+            max_searches: Maximum number of searches running at once
+            skip_on_error: If False, searches that have not started yet are
+                cancelled after the first failed search
+            write_intermediate: Write every output file, including those
+                only handed to the next stage in memory
+            journal: RunJournal recording each stage's finished items, or None
+            stage_cache: Not used: records reach a stage one at a time, so
+                there is no whole input to compare with a cached one
+            queue_size: Capacity of each stage's input queue; a full queue
+                pauses the stage feeding it
+        """
+        super().__init__(agent, runner, max_searches, skip_on_error, write_intermediate, journal)
+        self.queue_size = max(1, int(queue_size))
+        self.queues = {}
+        self.started = None
+        self.first_draft_seconds = None
+        self._readers = []
+
+    async def run(self, nodes):
+        """
+        Run the graph
+
+        Args:
+            nodes: List of StageNode from StageGraph.build()
+
+        Returns:
+            The nodes, with result (None if cancelled) and records set
+        """
+        self.started = time.perf_counter()
+        self.queues = {node.key: asyncio.Queue(maxsize=self.queue_size)
+                       for node in nodes if node.in_memory}
+        return await super().run(nodes)
+
+    async def _run_node(self, node, upstream):
+        """Run a search or stream records through a stage; never raises"""
+        start = time.perf_counter()
+        if node.kind == 'search':
+            await self._run_search_node(node)
+            return
+
+        if node.in_memory:
+            queue = self.queues[node.key]
+        else:
+            # Files are only complete once the node writing them is done
+            if upstream is not None:
+                await upstream
+            reason = DagExecutor._skip_reason(node)
+            if reason:
+                print(f"\nSkipping {node.key}: {reason}")
+                node.result = self._stage_result(node, 'skipped', start, error=reason)
+                return
+            queue = asyncio.Queue(maxsize=self.queue_size)
+            self._readers.append(asyncio.create_task(self._feed_file(node, queue)))
+
+        try:
+            await self._run_stage(node, queue, start)
+        except Exception as e:
+            logger.error(f"{node.key} failed: {e}")
+            print(f"✗ {node.key} failed: {e}")
+            node.result = self._stage_result(node, 'error', start, error=str(e))
+            # Keep the producer from blocking on a queue nobody reads
+            await StreamExecutor._drain(queue)
+
+    async def _run_search_node(self, node):
+        """Run a search on a search worker thread, feeding its consumers as it goes"""
+        consumers = [self.queues[c.key] for c in node.consumers if c.in_memory]
+        feeder = QueueFeeder(asyncio.get_running_loop(), consumers) if consumers else None
+
+        loop = asyncio.get_running_loop()
+        try:
+            node.result = await loop.run_in_executor(self._search_pool, self._run_search, node, feeder)
+        finally:
+            for queue in consumers:
+                await queue.put(_END)
+
+    def _run_search(self, node, feeder=None):
+        """Run a search node, handing its records to feeder instead of a list"""
+        if feeder is None:
+            return super()._run_search(node)
+        if self.stopped:
+            return None
+
+        agent = self.agent
+        if self.max_searches > 1:
+            if not hasattr(self._local, 'agent'):
+                self._local.agent = self.agent.for_worker()
+            agent = self._local.agent
+
+        node.records = feeder
+        result = self.runner.run_search(agent, node.config, node.index, self.total_searches,
+                                        records=feeder,
+                                        write_output=node.writes_output(self.write_intermediate))
+        if result['status'] == 'error' and not self.skip_on_error and not self.stopped:
+            print(f"\nStopping pipeline due to error.")
+            self.stopped = True
+        return result
+
+    async def _feed_file(self, node, queue):
+        """Read a stage's input file and put its records into the stage queue"""
+        try:
+            if node.input and os.path.exists(node.input):
+                if node.kind == 'analyze_repos':
+                    records = await asyncio.to_thread(AnalysisHandler.read_input_file, node.input)
+                elif node.kind == 'generate_messages':
+                    records = await asyncio.to_thread(MessageHandler.read_input_file, node.input)
+                else:
+                    records = await asyncio.to_thread(ExcelReader.read_feedback_data, node.input)
+                for record in records:
+                    await queue.put(record)
+            else:
+                print(f"Warning: Input file '{node.input}' not found. Skipping {node.key}.")
+        except Exception as e:
+            logger.error(f"Reading {node.input} failed: {e}")
+            print(f"✗ Reading {node.input} failed: {e}")
+        finally:
+            await queue.put(_END)
+
+    async def _run_stage(self, node, queue, start):
+        """Process the records of a stage queue with a few concurrent workers"""
+        downstream = [self.queues[c.key] for c in node.consumers if c.in_memory]
+        outputs = []
+
+        async def worker(stage):
+            while True:
+                record = await queue.get()
+                if record is _END:
+                    # Pass the marker on to the stage's other workers
+                    await queue.put(_END)
+                    return
+                if node.in_memory:
+                    record = stage.convert(record)
+                    if record is None:
+                        continue
+                output = await stage.process(record)
+                outputs.append(output)
+                for target in downstream:
+                    await target.put(output)
+
+        stage = None
+        workers = []
+        try:
+            stage = StreamStage.create(node, self)
+            workers = [asyncio.create_task(worker(stage)) for _ in range(STAGE_WORKERS[node.kind])]
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+            if stage is not None:
+                stage.close()
+            for target in downstream:
+                await target.put(_END)
+
+        write_output = node.writes_output(self.write_intermediate) and bool(outputs)
+        node.records = await asyncio.to_thread(stage.finish, outputs, write_output)
+        if outputs:
+            node.result = self._stage_result(node, 'success', start, written=write_output)
+        else:
+            node.result = self._stage_result(node, 'skipped', start, error='no records reached this stage')
+        if node.kind == 'draft_emails':
+            node.result['first_draft_seconds'] = self.first_draft_seconds
+
+    @staticmethod
+    async def _drain(queue):
+        """Discard the records of a queue up to its end marker"""
+        while await queue.get() is not _END:
+            pass
+
+
+class StreamStage:
+    """Per-record processing of one post-search stage"""
+
+    @staticmethod
+    def create(node, executor):
+        """Create the stage processor for a node"""
+        stages = {
+            'analyze_repos': AnalyzeStage,
+            'generate_messages': MessageStage,
+            'draft_emails': DraftStage
+        }
+        return stages[node.kind](node, executor)
+
+    def __init__(self, node, executor):
+        """
+        Args:
+            node: StageNode being run
+            executor: StreamExecutor running it
+        """
+        self.node = node
+        self.config = node.config
+        self.executor = executor
+
+    def convert(self, record):
+        """Turn an upstream record into this stage's input, or None to drop it"""
+        return record
+
+    async def process(self, record):
+        """Process one record and return the record handed to the next stage"""
+        raise NotImplementedError
+
+    def finish(self, outputs, write_output):
+        """Write the output file if requested and return the stage's records"""
+        return outputs
+
+    def close(self):
+        """Release the stage's resources once its last record is processed"""
+
+
+class AnalyzeStage(StreamStage):
+    """Clone and grade one repository at a time"""
+
+    def __init__(self, node, executor):
+        super().__init__(node, executor)
+        self.cleanup = self.config.get('cleanup', True)
+        self.analyzer = RepoAnalyzer(
+            input_file=self.config.get('input_file'),
+            output_file=node.output,
+            temp_dir=self.config.get('temp_dir', 'TempFiles'),
+            small_file_threshold=self.config.get('small_file_threshold', 150),
+            output_mode=node.output_mode,
+            journal=executor.stage_journal(node),
+            workers=self.config.get('analysis_workers'),
+            large_repo_files=self.config.get('large_repo_files', 5000),
+            scan_threads=self.config.get('scan_threads', 8),
+            clone_mode=self.config.get('clone_mode', 'checkout'),
+            mirror_cache=MirrorCache.from_config(self.config.get('mirror_cache'))
+        )
+        # Line counting is CPU-bound and runs on the shared AnalysisPool;
+        # clones keep running on the event loop
+        self.slots = asyncio.Semaphore(min(self.analyzer.workers, STAGE_WORKERS['analyze_repos']))
+
+    def convert(self, record):
+        return AnalysisHandler.repo_from_email(record) if record['id'] else None
+
+    async def process(self, record):
+        journal = self.analyzer.journal
+        saved = journal.get(record['id']) if journal is not None else None
+        if saved is not None:
+            return saved
+
+        repo = await self.analyzer.clone_repo(record)
+        if repo['status'] == 'cloned':
+            loop = asyncio.get_running_loop()
+            async with self.slots:
+                pool = AnalysisPool.shared()
+                try:
+                    repo.update(await loop.run_in_executor(pool, analyze_repo_task, repo,
+                                                           self.analyzer.small_file_threshold,
+                                                           self.analyzer.large_repo_files, self.analyzer.scan_threads,
+                                                           self.analyzer.clone_mode))
+                except Exception as e:
+                    if isinstance(e, BrokenProcessPool):
+                        AnalysisPool.discard(pool)
+                    self.analyzer.fail_analysis(repo, e)
+        self.analyzer.record_result(repo)
+        if self.cleanup and repo.get('repo_folder'):
+            # Free the clone right away instead of after the whole batch
+            await asyncio.to_thread(shutil.rmtree, repo['repo_folder'], True)
+        return repo
+
+    def finish(self, outputs, write_output):
+        if write_output:
+            AnalysisHandler.export_results(outputs, self.analyzer.output_file,
+                                           self.analyzer.small_file_threshold, self.analyzer.output_mode)
+        if self.cleanup and os.path.isdir(self.analyzer.temp_dir) and not os.listdir(self.analyzer.temp_dir):
+            os.rmdir(self.analyzer.temp_dir)
+        if self.analyzer.mirror_cache is not None:
+            self.analyzer.print_mirror_stats()
+        return outputs
+
+    def close(self):
+        self.analyzer.close()
+
+
+class MessageStage(StreamStage):
+    """Generate the feedback message of one repository at a time"""
+
+    def __init__(self, node, executor):
+        super().__init__(node, executor)
+        self.writer = MessageWriter(
+            input_file=self.config.get('input_file'),
+            output_file=node.output,
+            output_mode=node.output_mode,
+            journal=executor.stage_journal(node)
+        )
+
+    def convert(self, record):
+        return MessageHandler.from_analysis_record(record) if record['id'] else None
+
+    async def process(self, record):
+        record['message'] = self.writer.message_for(record)
+        print(f"[{record['id']}] Message generated - Grade: {record['grade']:.2f}%")
+        return record
+
+    def finish(self, outputs, write_output):
+        if write_output:
+            MessageHandler.export_results(outputs, self.writer.output_file, self.writer.output_mode)
+        return outputs
+
+
+class DraftStage(StreamStage):
+    """Create the Gmail draft of one message at a time"""
+
+    def __init__(self, node, executor):
+        super().__init__(node, executor)
+        self.drafter = EmailDrafter(
+            input_file=self.config.get('input_file'),
+            credentials_file=self.config.get('credentials_file', 'credentials.json'),
+            journal=executor.stage_journal(node)
+        )
+        self._authenticated = None
+
+    def convert(self, record):
+        return ExcelReader.feedback_from_message(record)
+
+    async def process(self, record):
+        if self._authenticated is None:
+            self._authenticated = asyncio.ensure_future(asyncio.to_thread(self.drafter.authenticate))
+        await self._authenticated
+
+        draft_id, existed = await asyncio.to_thread(self.drafter.create_draft_once, record['id'],
+                                                    record['feedback'], record.get('subject'))
+        if draft_id and not existed and self.executor.first_draft_seconds is None:
+            self.executor.first_draft_seconds = round(time.perf_counter() - self.executor.started, 2)
+
+        status = 'success' if draft_id else 'failed'
+        if existed:
+            print(f"[{record['id']}] ✓ Draft already created")
+        else:
+            print(f"[{record['id']}] {'✓ Draft created' if draft_id else '✗ Draft failed'}")
+        return {'id': record['id'], 'draft_id': draft_id, 'status': status}
+
+    def finish(self, outputs, write_output):
+        success = sum(1 for r in outputs if r['status'] == 'success')
+        return {
+            'total': len(outputs),
+            'success': success,
+            'failed': len(outputs) - success,
+            'results': outputs
+        }
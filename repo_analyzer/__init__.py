@@ -3,12 +3,15 @@ Repository Analysis Package
 """
 from .analyzer import RepoAnalyzer
 from .excel_handler import ExcelHandler
+from .line_counter import LineCounter
+from .blob_counter import BlobCounter
+from .mirror_cache import MirrorCache
 from .runner import AnalysisRunner
 
 # Add run method to RepoAnalyzer
-async def _run(self, cleanup=True):
-    return await AnalysisRunner.run_analysis(self, cleanup)
+async def _run(self, cleanup=True, repos_data=None, write_output=True):
+    return await AnalysisRunner.run_analysis(self, cleanup, repos_data, write_output)
 
 RepoAnalyzer.run = _run
 
-__all__ = ['RepoAnalyzer', 'ExcelHandler', 'AnalysisRunner']
+__all__ = ['RepoAnalyzer', 'ExcelHandler', 'LineCounter', 'BlobCounter', 'MirrorCache', 'AnalysisRunner']
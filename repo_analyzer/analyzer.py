@@ -4,17 +4,86 @@ Repository cloning and analysis module
 import os
 import sys
 import asyncio
+import multiprocessing
 import shutil
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 from logger_config import LoggerConfig
 from .excel_handler import ExcelHandler
+from .line_counter import LineCounter
+from .blob_counter import BlobCounter
 
 logger = LoggerConfig.setup_logger('analyze_repos')
 
+CLONE_MODES = ('checkout', 'bare')
+
+
+class AnalysisPool:
+    """Process pool shared by every repository analysis in the process"""
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls):
+        """
+        Return the process-wide analysis pool, starting it on first use
+
+        Concurrent analyses (several analyze_repos stages, streamed records)
+        share its one process per CPU instead of each starting their own.
+        Analyses run from worker threads and event loops, and forking a
+        threaded process can copy locks held by other threads into the
+        children, so the workers are spawned as fresh interpreters.
+
+        Returns:
+            ProcessPoolExecutor
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = ProcessPoolExecutor(max_workers=os.cpu_count() or 1,
+                                                  mp_context=multiprocessing.get_context('spawn'))
+            return cls._shared
+
+    @classmethod
+    def discard(cls, pool):
+        """
+        Drop a broken pool so that the next shared() call starts a new one
+
+        A worker killed mid-task (out of memory, for instance) breaks the
+        whole pool; every later submission to it would fail.
+
+        Args:
+            pool: The ProcessPoolExecutor that failed
+        """
+        with cls._shared_lock:
+            if cls._shared is pool:
+                cls._shared = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    @classmethod
+    def submit(cls, fn, *args):
+        """
+        Submit a task to the shared pool, replacing the pool if it is broken
+
+        Returns:
+            Tuple (future, pool the task was submitted to)
+        """
+        pool = cls.shared()
+        try:
+            return pool.submit(fn, *args), pool
+        except BrokenProcessPool:
+            cls.discard(pool)
+            pool = cls.shared()
+            return pool.submit(fn, *args), pool
+
 
 class RepoAnalyzer:
     """Agent to clone and analyze GitHub repositories"""
 
-    def __init__(self, input_file, output_file='Output_23.xlsx', temp_dir='TempFiles', small_file_threshold=150):
+    def __init__(self, input_file, output_file='Output_23.xlsx', temp_dir='TempFiles', small_file_threshold=150,
+                 output_mode='overwrite', journal=None, workers=None, large_repo_files=5000, scan_threads=8,
+                 clone_mode='checkout', mirror_cache=None):
         """
         Initialize the Repo Analyzer
 
@@ -23,11 +92,38 @@ class RepoAnalyzer:
             output_file: Path to output Excel file
             temp_dir: Directory to store cloned repositories
             small_file_threshold: Maximum line count for a file to be considered "small" (default: 150)
+            output_mode: 'overwrite' replaces the output file, 'upsert' adds new
+                and updates changed rows by ID
+            journal: Optional stage journal (see pipeline_pkg.RunJournal)
+                recording each finished repository, so a resumed run skips it
+            workers: Number of repositories analyzed in parallel on the
+                shared AnalysisPool, which runs at most one process per CPU
+                (default: one per CPU; 1 analyzes them in-process)
+            large_repo_files: Number of files from which a repository's files
+                are counted on a thread pool (0 disables it)
+            scan_threads: Number of threads counting the files of a large
+                repository
+            clone_mode: 'checkout' clones a working tree and reads its files;
+                'bare' makes a bare clone and streams the files of HEAD
+                through `git cat-file --batch`, never writing a working tree
+                (symbolic links are not counted)
+            mirror_cache: Optional MirrorCache; repositories are then fetched
+                into its persistent mirrors and cloned locally from them
         """
+        if clone_mode not in CLONE_MODES:
+            raise ValueError(f"clone_mode must be one of {', '.join(CLONE_MODES)}, got '{clone_mode}'")
+
         self.input_file = input_file
         self.output_file = output_file
         self.temp_dir = temp_dir
         self.small_file_threshold = small_file_threshold
+        self.output_mode = output_mode
+        self.journal = journal
+        self.workers = workers or os.cpu_count() or 1
+        self.large_repo_files = large_repo_files
+        self.scan_threads = scan_threads
+        self.clone_mode = clone_mode
+        self.mirror_cache = mirror_cache
         self.repos_data = []
         self.semaphore = asyncio.Semaphore(5)
 
@@ -61,23 +157,30 @@ class RepoAnalyzer:
                 return repo_data
 
             os.makedirs(self.temp_dir, exist_ok=True)
-            repo_folder = os.path.join(self.temp_dir, repo_id)
+            repo_folder = os.path.join(self.temp_dir, f"{repo_id}.git" if self.clone_mode == 'bare' else repo_id)
 
             if os.path.exists(repo_folder):
                 shutil.rmtree(repo_folder)
 
-            print(f"[{repo_id}] Cloning {github_url}...")
-
-            process = await asyncio.create_subprocess_exec(
-                'git', 'clone', '--depth', '1', github_url, repo_folder,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-
-            stdout, stderr = await process.communicate()
-
-            if process.returncode != 0:
+            if self.mirror_cache is not None:
+                print(f"[{repo_id}] Fetching {github_url} into the mirror cache...")
+                cloned, error_msg = await self.mirror_cache.checkout(github_url, repo_folder,
+                                                                     bare=self.clone_mode == 'bare')
+            else:
+                print(f"[{repo_id}] Cloning {github_url}...")
+
+                bare = ['--bare'] if self.clone_mode == 'bare' else []
+                process = await asyncio.create_subprocess_exec(
+                    'git', 'clone', *bare, '--depth', '1', github_url, repo_folder,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE
+                )
+
+                stdout, stderr = await process.communicate()
+                cloned = process.returncode == 0
                 error_msg = stderr.decode('utf-8', errors='ignore')
+
+            if not cloned:
                 print(f"[{repo_id}] ✗ Clone failed: {error_msg.strip()}")
                 repo_data['status'] = 'clone_failed'
                 return repo_data
@@ -93,17 +196,16 @@ class RepoAnalyzer:
         """
         Count lines in a single file
 
+        Binary files (a NUL byte near the start) count 0 lines, see
+        LineCounter.count_lines().
+
         Args:
             file_path: Path to file
 
         Returns:
             Number of lines in file
         """
-        try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                return sum(1 for _ in f)
-        except Exception:
-            return 0
+        return LineCounter.count_lines(file_path)
 
     def analyze_repo(self, repo_data):
         """
@@ -124,22 +226,23 @@ class RepoAnalyzer:
         logger.info(f"[{repo_id}] Starting code analysis")
         print(f"[{repo_id}] Analyzing code...")
 
-        total_lines = 0
-        small_files_lines = 0
-
-        for root, dirs, files in os.walk(repo_folder):
-            if '.git' in dirs:
-                dirs.remove('.git')
-
-            for file in files:
-                file_path = os.path.join(root, file)
-                line_count = self.count_lines_in_file(file_path)
-
-                if line_count > 0:
-                    total_lines += line_count
-
-                    if line_count < self.small_file_threshold:
-                        small_files_lines += line_count
+        if self.clone_mode == 'bare':
+            files = BlobCounter.list_blobs(repo_folder)
+        else:
+            files = list(LineCounter.iter_files(repo_folder))
+
+        threads = 1
+        if self.large_repo_files and len(files) >= self.large_repo_files and self.scan_threads > 1:
+            threads = self.scan_threads
+            logger.info(f"[{repo_id}] Counting {len(files)} files on {threads} threads")
+            print(f"[{repo_id}] Large repository: counting {len(files)} files on {threads} threads")
+
+        if self.clone_mode == 'bare':
+            total_lines, small_files_lines = BlobCounter.tally(repo_folder, files, self.small_file_threshold, threads)
+        elif threads > 1:
+            total_lines, small_files_lines = LineCounter.tally_parallel(files, self.small_file_threshold, threads)
+        else:
+            total_lines, small_files_lines = LineCounter.tally(files, self.small_file_threshold)
 
         if total_lines > 0:
             grade = (small_files_lines / total_lines) * 100
@@ -174,12 +277,33 @@ class RepoAnalyzer:
         tasks = [self.clone_repo(repo) for repo in repos_data]
         results = await asyncio.gather(*tasks)
 
+        if self.mirror_cache is not None:
+            self.print_mirror_stats()
+
         return results
 
+    def print_mirror_stats(self):
+        """Print the mirror cache counters"""
+        stats = self.mirror_cache.stats()
+        print(f"\nMirror cache: {stats['fetched']} fetched, {stats['cloned']} cloned, "
+              f"{stats['evicted']} evicted; {stats['entries']} mirrors, {stats['size_mb']} MB")
+
+    def close(self):
+        """Close the mirror cache, if any"""
+        if self.mirror_cache is not None:
+            self.mirror_cache.close()
+            self.mirror_cache = None
+
     def analyze_all_repos(self, repos_data):
         """
         Analyze all cloned repositories
 
+        With more than one worker and more than one cloned repository, each
+        repository is analyzed by a task on the shared AnalysisPool, at most
+        workers at a time; the results are copied back into the dictionaries
+        of repos_data. A task that fails marks its repository
+        'analysis_failed' (see fail_analysis()) and the others carry on.
+
         Args:
             repos_data: List of repository data dictionaries
 
@@ -190,7 +314,124 @@ class RepoAnalyzer:
         print(f"Starting repository analysis")
         print(f"{'='*70}\n")
 
+        cloned = [repo_data for repo_data in repos_data if repo_data['status'] == 'cloned']
         for repo_data in repos_data:
-            self.analyze_repo(repo_data)
+            if repo_data['status'] != 'cloned':
+                self.record_result(repo_data)
+        workers = min(self.workers, len(cloned))
+
+        if workers <= 1:
+            for repo_data in cloned:
+                self.analyze_repo(repo_data)
+                self.record_result(repo_data)
+            return repos_data
+
+        logger.info(f"Analyzing {len(cloned)} repositories on {workers} processes")
+        pending = iter(cloned)
+        futures = {}
+        try:
+            while True:
+                for repo_data in pending:
+                    try:
+                        future, pool = AnalysisPool.submit(analyze_repo_task, repo_data, self.small_file_threshold,
+                                                           self.large_repo_files, self.scan_threads,
+                                                           self.clone_mode)
+                    except Exception as e:
+                        self.fail_analysis(repo_data, e)
+                        continue
+                    futures[future] = (repo_data, pool)
+                    if len(futures) >= workers:
+                        break
+                if not futures:
+                    break
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    repo_data, pool = futures.pop(future)
+                    try:
+                        repo_data.update(future.result())
+                    except Exception as e:
+                        if isinstance(e, BrokenProcessPool):
+                            AnalysisPool.discard(pool)
+                        self.fail_analysis(repo_data, e)
+                    self.record_result(repo_data)
+        finally:
+            for future in futures:
+                future.cancel()
 
         return repos_data
+
+    def fail_analysis(self, repo_data, error):
+        """
+        Mark a cloned repository whose analysis task failed
+
+        The repository is not journaled, so a resumed run analyzes it again.
+
+        Args:
+            repo_data: Repository data dictionary with status 'cloned'
+            error: Exception raised by the task
+        """
+        logger.error(f"[{repo_data['id']}] Analysis failed: {error}")
+        print(f"[{repo_data['id']}] ✗ Analysis failed: {error}")
+        repo_data['status'] = 'analysis_failed'
+        repo_data['error'] = str(error)
+
+    def record_result(self, repo_data):
+        """
+        Add a finished repository to the journal, if any
+
+        Failed clones are not recorded so that a resumed run retries them.
+
+        Args:
+            repo_data: Repository data dictionary after analyze_repo()
+        """
+        if self.journal is not None and repo_data['status'] in ('analyzed', 'no_url'):
+            self.journal.record(repo_data['id'], repo_data)
+
+    def split_journaled(self, repos_data):
+        """
+        Separate repositories finished in a journaled run from outstanding ones
+
+        Args:
+            repos_data: List of repository data dictionaries
+
+        Returns:
+            Tuple (finished, outstanding); finished maps repository IDs to
+            the journaled results
+        """
+        if self.journal is None:
+            return {}, repos_data
+
+        finished = {}
+        outstanding = []
+        for repo_data in repos_data:
+            saved = self.journal.get(repo_data['id'])
+            if saved is not None:
+                finished[repo_data['id']] = saved
+            else:
+                outstanding.append(repo_data)
+
+        if finished:
+            print(f"Resumed: {len(finished)} repositories already analyzed, {len(outstanding)} outstanding")
+        return finished, outstanding
+
+
+def analyze_repo_task(repo_data, small_file_threshold, large_repo_files=5000, scan_threads=8,
+                      clone_mode='checkout'):
+    """
+    Worker-process task: analyze one cloned repository
+
+    Args:
+        repo_data: Repository data dictionary with status 'cloned'
+        small_file_threshold: Maximum line count for a file to be considered "small"
+        large_repo_files: Number of files from which the files are counted
+            on a thread pool, see RepoAnalyzer
+        scan_threads: Number of threads counting the files of a large repository
+        clone_mode: How the repository was cloned, 'checkout' or 'bare'
+
+    Returns:
+        The updated repository data dictionary, with the same fields
+        RepoAnalyzer.analyze_repo() sets
+    """
+    analyzer = RepoAnalyzer(input_file=None, small_file_threshold=small_file_threshold, workers=1,
+                            large_repo_files=large_repo_files, scan_threads=scan_threads, clone_mode=clone_mode)
+    return analyzer.analyze_repo(repo_data)
@@ -0,0 +1,207 @@
+"""
+Line counting of a bare clone's files through git cat-file --batch
+"""
+import io
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .line_counter import CHUNK_SIZE, LineCounter
+
+# Tree entry modes that are not regular files: symbolic links and submodules
+SKIPPED_MODES = (b'120000', b'160000')
+
+
+class BlobCounter:
+    """Count the lines of the files at HEAD of a bare clone without checking them out"""
+
+    @staticmethod
+    def list_blobs(git_dir, rev='HEAD'):
+        """
+        List the files of a commit with `git ls-tree -r -l`
+
+        Symbolic links and submodules are left out.
+
+        Args:
+            git_dir: Path to the bare repository
+            rev: Commit whose tree is listed
+
+        Returns:
+            List of (blob ID, size in bytes) tuples, one per file; empty if
+            the repository has no commit
+        """
+        result = subprocess.run(
+            ['git', '--git-dir', git_dir, 'ls-tree', '-r', '-l', '-z', rev],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        if result.returncode != 0:
+            # An empty repository has no HEAD commit and no files
+            return []
+
+        blobs = []
+        for entry in result.stdout.split(b'\0'):
+            if not entry:
+                continue
+            meta, _, _path = entry.partition(b'\t')
+            mode, kind, blob_id, size = meta.split()
+            if kind == b'blob' and mode not in SKIPPED_MODES:
+                blobs.append((blob_id.decode('ascii'), int(size)))
+        return blobs
+
+    @staticmethod
+    def count_blobs(git_dir, blob_ids):
+        """
+        Count the lines of blobs streamed through one `git cat-file --batch` process
+
+        The IDs are written to the process from a separate thread while the
+        contents are read back, so git never waits for a round trip. Each
+        blob is read in CHUNK_SIZE pieces, see read_blob(), so a large blob
+        is never held in memory whole.
+
+        Args:
+            git_dir: Path to the bare repository
+            blob_ids: List of blob IDs
+
+        Returns:
+            Dictionary mapping blob IDs to line counts (0 for binary content
+            and missing blobs), see LineCounter.count_bytes()
+        """
+        process = subprocess.Popen(
+            ['git', '--git-dir', git_dir, 'cat-file', '--batch'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+
+        def feed():
+            try:
+                for blob_id in blob_ids:
+                    process.stdin.write(f"{blob_id}\n".encode('ascii'))
+                process.stdin.close()
+            except OSError:
+                # git exited early; the reader sees the truncated output
+                pass
+
+        writer = threading.Thread(target=feed, daemon=True)
+        writer.start()
+
+        counts = {}
+        text_blobs = []
+        try:
+            for blob_id in blob_ids:
+                header = process.stdout.readline().split()
+                if len(header) != 3:
+                    # '<id> missing', or git exited
+                    counts[blob_id] = 0
+                    if not header:
+                        break
+                    continue
+                counts[blob_id] = BlobCounter.read_blob(process.stdout, int(header[2]))
+                process.stdout.read(1)
+                if counts[blob_id] is None:
+                    text_blobs.append(blob_id)
+        finally:
+            process.stdout.close()
+            process.kill()
+            process.wait()
+            writer.join()
+
+        for blob_id in text_blobs:
+            counts[blob_id] = BlobCounter.count_text_blob(git_dir, blob_id)
+        return counts
+
+    @staticmethod
+    def read_blob(stream, size):
+        """
+        Count the lines of one blob of a `git cat-file --batch` stream
+
+        The blob is read in CHUNK_SIZE pieces and counted with
+        LineCounter.count_chunks(), which stops at a binary prefix; whatever
+        is left of the blob is then skipped.
+
+        Args:
+            stream: Output of the cat-file process, positioned at the blob
+            size: Blob size in bytes, from its header line
+
+        Returns:
+            Number of lines, or None for a blob that must be counted in text
+            mode, see count_text_blob()
+        """
+        remaining = size
+
+        def read_chunks():
+            nonlocal remaining
+            while remaining > 0:
+                chunk = stream.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    remaining = 0
+                    return
+                remaining -= len(chunk)
+                yield chunk
+
+        lines = LineCounter.count_chunks(read_chunks())
+        for _ in read_chunks():
+            pass
+        return lines
+
+    @staticmethod
+    def count_text_blob(git_dir, blob_id):
+        """
+        Count the lines of a blob by iterating it in text mode
+
+        Used for the rare content LineCounter.count_chunks() cannot count;
+        the blob is streamed from its own `git cat-file blob` process.
+
+        Args:
+            git_dir: Path to the bare repository
+            blob_id: Blob ID
+
+        Returns:
+            Number of lines, 0 if the blob cannot be read
+        """
+        process = subprocess.Popen(['git', '--git-dir', git_dir, 'cat-file', 'blob', blob_id],
+                                   stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        with io.TextIOWrapper(process.stdout, encoding='utf-8', errors='ignore') as f:
+            lines = sum(1 for _ in f)
+        return lines if process.wait() == 0 else 0
+
+    @staticmethod
+    def tally(git_dir, blobs, small_file_threshold, threads=1):
+        """
+        Count the lines of a bare clone's files
+
+        A blob shared by several files is read once and counted for each of
+        them. With more than one thread, the blobs are split into groups of
+        similar total size, each streamed through its own cat-file process.
+
+        Args:
+            git_dir: Path to the bare repository
+            blobs: List of (blob ID, size) tuples from list_blobs()
+            small_file_threshold: Maximum line count for a file to be considered "small"
+            threads: Number of cat-file processes reading in parallel
+
+        Returns:
+            Tuple (total lines, lines in files with fewer than
+            small_file_threshold lines), like LineCounter.tally()
+        """
+        sizes = dict(blobs)
+        if threads > 1 and len(sizes) > 1:
+            groups = [[] for _ in range(min(threads, len(sizes)))]
+            loads = [0] * len(groups)
+            for blob_id in sorted(sizes, key=sizes.get, reverse=True):
+                lightest = loads.index(min(loads))
+                groups[lightest].append(blob_id)
+                loads[lightest] += sizes[blob_id]
+            counts = {}
+            with ThreadPoolExecutor(max_workers=len(groups)) as executor:
+                for group_counts in executor.map(BlobCounter.count_blobs, [git_dir] * len(groups), groups):
+                    counts.update(group_counts)
+        else:
+            counts = BlobCounter.count_blobs(git_dir, list(sizes))
+
+        total_lines = 0
+        small_files_lines = 0
+        for blob_id, _size in blobs:
+            line_count = counts.get(blob_id, 0)
+            if line_count > 0:
+                total_lines += line_count
+                if line_count < small_file_threshold:
+                    small_files_lines += line_count
+        return total_lines, small_files_lines
@@ -2,8 +2,9 @@
 Excel file operations for repository analysis
 """
 import os
-from openpyxl import load_workbook, Workbook
-from openpyxl.styles import Font, Alignment, PatternFill
+from tabular_io_pkg import open_reader, open_writer
+
+COLUMN_WIDTHS = [20, 20, 50, 30, 60, 15, 25, 15]
 
 
 class ExcelHandler:
@@ -25,43 +26,80 @@ class ExcelHandler:
 
         print(f"Reading data from {input_file}...")
 
-        wb = load_workbook(input_file)
-        ws = wb.active
-
-        # Get headers from first row
-        headers = [cell.value for cell in ws[1]]
-
-        # Find column indices
-        try:
-            id_col = headers.index('ID')
-            timestamp_col = headers.index('TimeStamp')
-            subject_col = headers.index('Subject')
-            search_col = headers.index('Search Criteria')
-            url_col = headers.index('github Repo URL')
-        except ValueError as e:
-            raise ValueError(f"Required column not found in Excel file: {e}")
-
-        # Read data rows
-        data = []
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            if row[id_col]:  # Skip empty rows
-                data.append({
-                    'id': str(row[id_col]),
-                    'timestamp': row[timestamp_col],
-                    'subject': row[subject_col],
-                    'search_criteria': row[search_col],
-                    'github_url': row[url_col] if row[url_col] else '',
-                    'total_lines': 0,
-                    'small_files_lines': 0,
-                    'grade': 0.0,
-                    'status': 'pending'
-                })
+        with open_reader(input_file) as reader:
+            # Find column indices
+            try:
+                id_col = reader.index('ID')
+                timestamp_col = reader.index('TimeStamp')
+                subject_col = reader.index('Subject')
+                search_col = reader.index('Search Criteria')
+                url_col = reader.index('github Repo URL')
+            except ValueError as e:
+                raise ValueError(f"Required column not found in Excel file: {e}")
+
+            # Read data rows
+            data = []
+            for row in reader.iter_rows():
+                if row[id_col]:  # Skip empty rows
+                    data.append({
+                        'id': str(row[id_col]),
+                        'timestamp': row[timestamp_col],
+                        'subject': row[subject_col],
+                        'search_criteria': row[search_col],
+                        'github_url': row[url_col] if row[url_col] else '',
+                        'total_lines': 0,
+                        'small_files_lines': 0,
+                        'grade': 0.0,
+                        'status': 'pending'
+                    })
+
+        print(f"Found {len(data)} repositories to analyze")
+        return data
+
+    @staticmethod
+    def from_email_records(email_data):
+        """
+        Build repository data from search records handed over in memory
+
+        Produces the dictionaries read_input_file() returns for the file the
+        search would have written.
+
+        Args:
+            email_data: List of email data dictionaries from a search
+
+        Returns:
+            List of dictionaries with repo data
+        """
+        data = [ExcelHandler.repo_from_email(email) for email in email_data if email['id']]
 
         print(f"Found {len(data)} repositories to analyze")
         return data
 
     @staticmethod
-    def export_results(repos_data, output_file, small_file_threshold):
+    def repo_from_email(email):
+        """
+        Build the repository data of one search record
+
+        Args:
+            email: Email data dictionary with a non-empty 'id'
+
+        Returns:
+            Dictionary with repo data, status 'pending'
+        """
+        return {
+            'id': str(email['id']),
+            'timestamp': email['timestamp'],
+            'subject': email['subject'],
+            'search_criteria': email['search_criteria'],
+            'github_url': email.get('repo_url') or '',
+            'total_lines': 0,
+            'small_files_lines': 0,
+            'grade': 0.0,
+            'status': 'pending'
+        }
+
+    @staticmethod
+    def export_results(repos_data, output_file, small_file_threshold, output_mode='overwrite'):
         """
         Export analyzed data to Excel file
 
@@ -69,14 +107,11 @@ class ExcelHandler:
             repos_data: List of repository data dictionaries
             output_file: Path to output Excel file
             small_file_threshold: Threshold used for small files
+            output_mode: 'overwrite' replaces the file, 'upsert' adds new and
+                updates changed rows by ID
         """
         print(f"\nExporting results to {output_file}...")
 
-        # Create workbook and select active sheet
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Repo Analysis"
-
         # Define headers
         headers = [
             'ID',
@@ -88,40 +123,22 @@ class ExcelHandler:
             f'Lines in Small Files (<{small_file_threshold})',
             'Grade (%)'
         ]
-        ws.append(headers)
-
-        # Style the header row
-        header_fill = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
-        header_font = Font(bold=True, color='FFFFFF')
-
-        for cell in ws[1]:
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-
-        # Add data rows
-        for repo in repos_data:
-            ws.append([
-                repo['id'],
-                repo['timestamp'],
-                repo['subject'],
-                repo['search_criteria'],
-                repo['github_url'],
-                repo['total_lines'] if repo['status'] == 'analyzed' else 'N/A',
-                repo['small_files_lines'] if repo['status'] == 'analyzed' else 'N/A',
-                repo['grade'] if repo['status'] == 'analyzed' else 'N/A'
-            ])
-
-        # Adjust column widths
-        ws.column_dimensions['A'].width = 20
-        ws.column_dimensions['B'].width = 20
-        ws.column_dimensions['C'].width = 50
-        ws.column_dimensions['D'].width = 30
-        ws.column_dimensions['E'].width = 60
-        ws.column_dimensions['F'].width = 15
-        ws.column_dimensions['G'].width = 25
-        ws.column_dimensions['H'].width = 15
-
-        # Save the workbook
-        wb.save(output_file)
+
+        # Stream the rows into a styled sheet, saved when the block ends
+        with open_writer(output_file, headers, "Repo Analysis", COLUMN_WIDTHS, mode=output_mode) as writer:
+            for repo in repos_data:
+                analyzed = repo['status'] == 'analyzed'
+                writer.append([
+                    repo['id'],
+                    repo['timestamp'],
+                    repo['subject'],
+                    repo['search_criteria'],
+                    repo['github_url'],
+                    repo['total_lines'] if analyzed else 'N/A',
+                    repo['small_files_lines'] if analyzed else 'N/A',
+                    repo['grade'] if analyzed else 'N/A'
+                ])
+
+        if output_mode == 'upsert':
+            print(f"  Upserted: {writer.added} added, {writer.updated} updated, {writer.unchanged} unchanged")
         print(f"✓ Successfully exported to {output_file}")
@@ -0,0 +1,222 @@
+"""
+Byte-level line counting for repository analysis
+"""
+import io
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+# Bytes read per call; most source files fit in a single read
+CHUNK_SIZE = 1 << 20
+# A NUL byte in this many leading bytes marks a file as binary
+BINARY_PREFIX = 8192
+# Bytes after the last line break kept to check for an unterminated last line
+TAIL_LIMIT = 4096
+# Files per task when a file list is counted on a thread pool
+FILES_PER_TASK = 256
+# '\r' before a byte that may not decode: dropping that byte in text mode
+# could join the '\r' with a following '\n'
+CR_BEFORE_NON_ASCII = re.compile(rb'\r[\x80-\xff]')
+
+
+class LineCounter:
+    """Count lines on raw bytes with the results of a text-mode read"""
+
+    @staticmethod
+    def count_lines(file_path, skip_binary=True):
+        """
+        Count the lines of a file
+
+        The count is the one iterating the file in text mode (UTF-8 with
+        errors ignored, universal newlines) gives, see count_chunks(). The
+        file is read in binary chunks instead of being decoded.
+
+        Args:
+            file_path: Path to file
+            skip_binary: Count 0 lines for files with a NUL byte in their
+                first BINARY_PREFIX bytes
+
+        Returns:
+            Number of lines in file, 0 if it cannot be read
+        """
+        try:
+            with open(file_path, 'rb') as f:
+                lines = LineCounter.count_chunks(iter(lambda: f.read(CHUNK_SIZE), b''), skip_binary)
+        except OSError:
+            return 0
+        return lines if lines is not None else LineCounter.count_text_lines(file_path)
+
+    @staticmethod
+    def count_chunks(chunks, skip_binary=True):
+        """
+        Count the lines of content given as consecutive byte strings
+
+        '\\n', '\\r' and '\\r\\n' each end a line, and trailing text
+        without a line break is a line of its own, as in a text-mode read.
+
+        Args:
+            chunks: Iterable of byte strings
+            skip_binary: Count 0 lines if the first chunk has a NUL byte in
+                its first BINARY_PREFIX bytes
+
+        Returns:
+            Number of lines, or None for the rare content with a '\\r'
+            followed by a non-ASCII byte, which must be counted in text mode
+        """
+        lines = 0
+        tail = b''
+        ends_with_cr = False
+        first = True
+        for chunk in chunks:
+            if first:
+                first = False
+                if skip_binary and b'\0' in chunk[:BINARY_PREFIX]:
+                    return 0
+            if (ends_with_cr and chunk[0] >= 0x80) or (
+                    b'\r' in chunk and CR_BEFORE_NON_ASCII.search(chunk)):
+                return None
+            lines += chunk.count(b'\n') + chunk.count(b'\r') - chunk.count(b'\r\n')
+            if ends_with_cr and chunk[:1] == b'\n':
+                # '\r\n' split across two chunks ends one line, not two
+                lines -= 1
+            ends_with_cr = chunk[-1:] == b'\r'
+
+            end = max(chunk.rfind(b'\n'), chunk.rfind(b'\r'))
+            if end >= 0:
+                tail = chunk[end + 1:end + 1 + TAIL_LIMIT]
+            elif len(tail) < TAIL_LIMIT:
+                tail += chunk[:TAIL_LIMIT - len(tail)]
+
+        # Bytes that don't decode are dropped in text mode, so an
+        # unterminated last line only counts if some of it decodes
+        if tail and tail.decode('utf-8', errors='ignore'):
+            lines += 1
+        return lines
+
+    @staticmethod
+    def count_bytes(data, skip_binary=True):
+        """
+        Count the lines of in-memory content, like count_lines() a file
+
+        Args:
+            data: File content as bytes
+            skip_binary: Count 0 lines for binary content
+
+        Returns:
+            Number of lines
+        """
+        lines = LineCounter.count_chunks((data,) if data else (), skip_binary)
+        if lines is None:
+            with io.TextIOWrapper(io.BytesIO(data), encoding='utf-8', errors='ignore') as f:
+                lines = sum(1 for _ in f)
+        return lines
+
+    @staticmethod
+    def count_text_lines(file_path):
+        """
+        Count the lines of a file by iterating it in text mode
+
+        Args:
+            file_path: Path to file
+
+        Returns:
+            Number of lines in file, 0 if it cannot be read
+        """
+        try:
+            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                return sum(1 for _ in f)
+        except (OSError, ValueError):
+            return 0
+
+    @staticmethod
+    def iter_files(root):
+        """
+        Yield the paths of the regular files under a directory
+
+        The tree is walked with os.scandir() and an explicit stack. '.git'
+        directories are skipped and symbolic links to directories are not
+        followed; symbolic links to files are yielded like os.walk() lists
+        them. Directories that cannot be read are skipped.
+
+        Args:
+            root: Directory to walk
+
+        Yields:
+            File paths
+        """
+        stack = [root]
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if entry.name != '.git':
+                                    stack.append(entry.path)
+                            elif entry.is_file():
+                                yield entry.path
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+
+    @staticmethod
+    def tally(file_paths, small_file_threshold):
+        """
+        Count the lines of a set of files
+
+        Args:
+            file_paths: Iterable of file paths
+            small_file_threshold: Maximum line count for a file to be considered "small"
+
+        Returns:
+            Tuple (total lines, lines in files with fewer than
+            small_file_threshold lines)
+        """
+        total_lines = 0
+        small_files_lines = 0
+        for file_path in file_paths:
+            line_count = LineCounter.count_lines(file_path)
+            if line_count > 0:
+                total_lines += line_count
+                if line_count < small_file_threshold:
+                    small_files_lines += line_count
+        return total_lines, small_files_lines
+
+    @staticmethod
+    def count_repo(repo_folder, small_file_threshold):
+        """
+        Count the lines of every file in a repository checkout
+
+        Args:
+            repo_folder: Root directory of the checkout
+            small_file_threshold: Maximum line count for a file to be considered "small"
+
+        Returns:
+            Tuple (total lines, lines in small files), see tally()
+        """
+        return LineCounter.tally(LineCounter.iter_files(repo_folder), small_file_threshold)
+
+    @staticmethod
+    def tally_parallel(file_paths, small_file_threshold, threads):
+        """
+        Count the lines of a large set of files on a thread pool
+
+        The file list is split into slices of FILES_PER_TASK files and the
+        per-slice counts are summed. Opening and reading files releases the
+        GIL, so the threads overlap the system calls and disk waits that
+        dominate many-file repositories; threads also work inside the worker
+        processes that analyze one repository each.
+
+        Args:
+            file_paths: List of file paths
+            small_file_threshold: Maximum line count for a file to be considered "small"
+            threads: Number of threads
+
+        Returns:
+            Tuple (total lines, lines in small files), see tally()
+        """
+        slices = [file_paths[i:i + FILES_PER_TASK] for i in range(0, len(file_paths), FILES_PER_TASK)]
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            counts = list(executor.map(LineCounter.tally, slices, [small_file_threshold] * len(slices)))
+        return sum(count[0] for count in counts), sum(count[1] for count in counts)
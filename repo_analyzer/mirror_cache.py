@@ -0,0 +1,275 @@
+"""
+Persistent cache of shallow repository mirrors
+"""
+import asyncio
+import hashlib
+import os
+import shutil
+import sqlite3
+import time
+from collections import Counter
+from logger_config import LoggerConfig
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: mirrors are only locked within one MirrorCache
+    fcntl = None
+
+logger = LoggerConfig.setup_logger('analyze_repos')
+
+
+class MirrorCache:
+    """Keep bare mirrors of repositories between runs, evicting the least recently used"""
+
+    def __init__(self, cache_dir='RepoCache', max_size_mb=2048):
+        """
+        Open (and create if needed) the mirror cache
+
+        Args:
+            cache_dir: Directory holding the mirrors and their index
+                (mirrors.db); must not be inside the analysis temp_dir,
+                which is removed after each run. Several caches, in one
+                process or several, may use the same directory: a mirror
+                is only updated, copied or evicted under its lock file
+            max_size_mb: Total size of the mirrors above which the least
+                recently used ones are removed
+        """
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self.max_bytes = max_size_mb * 1024 * 1024
+        self.fetched = 0
+        self.cloned = 0
+        self.evicted = 0
+
+        self._locks = {}
+        self._active = Counter()
+        self._conn = sqlite3.connect(os.path.join(cache_dir, 'mirrors.db'), check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS mirrors (
+                url TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+        logger.debug(f"Opened mirror cache {cache_dir}")
+
+    @staticmethod
+    def from_config(config):
+        """
+        Open the mirror cache described by an analyze_repos 'mirror_cache' entry
+
+        Args:
+            config: Dictionary with 'enabled', 'path' and 'max_size_mb', or None
+
+        Returns:
+            MirrorCache instance, or None if the cache is not enabled
+        """
+        if not config or not config.get('enabled', True):
+            return None
+        return MirrorCache(cache_dir=config.get('path', 'RepoCache'),
+                           max_size_mb=config.get('max_size_mb', 2048))
+
+    def mirror_path(self, url):
+        """Return the directory of a repository's mirror"""
+        return os.path.join(self.cache_dir, hashlib.sha256(url.encode('utf-8')).hexdigest()[:16] + '.git')
+
+    async def checkout(self, url, dest, bare=False):
+        """
+        Update the mirror of a repository and make a working copy of it
+
+        An existing mirror is brought up to date with a shallow fetch of the
+        remote HEAD, so only new objects are downloaded; otherwise it is
+        created with a shallow bare clone. The working copy is then made
+        from hardlinks of the mirror's files, see _copy().
+
+        Args:
+            url: Repository URL
+            dest: Directory of the working copy
+            bare: Make a bare working copy (for clone_mode 'bare')
+
+        Returns:
+            Tuple (success, error message or None)
+        """
+        url = url.strip()
+        lock = self._locks.setdefault(url, asyncio.Lock())
+        # Protected from eviction while waiting for and holding the lock
+        self._active[url] += 1
+        try:
+            async with lock:
+                lock_file = await asyncio.to_thread(self._lock_mirror, url)
+                try:
+                    mirror = self.mirror_path(url)
+                    error = await self._update(url, mirror)
+                    if error is None:
+                        error = await MirrorCache._copy(mirror, dest, bare)
+                        if error is None:
+                            self._touch(url, mirror)
+                finally:
+                    lock_file.close()
+        finally:
+            self._active[url] -= 1
+            if not self._active[url]:
+                del self._active[url]
+
+        # Removing mirrors can take a while; keep the event loop free meanwhile
+        await asyncio.to_thread(self.evict)
+        return error is None, error
+
+    def _lock_mirror(self, url, blocking=True):
+        """
+        Lock a mirror against the other caches using cache_dir
+
+        The lock is an exclusive flock() on '<mirror>.lock'; lock files are
+        kept when their mirror is evicted so that every cache locks the same
+        file.
+
+        Args:
+            url: Repository URL
+            blocking: Wait for the lock instead of giving up
+
+        Returns:
+            Open lock file, closing it releases the lock; None if blocking is
+            False and the lock is held elsewhere
+        """
+        lock_file = open(self.mirror_path(url) + '.lock', 'a')
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                return None
+        return lock_file
+
+    async def _update(self, url, mirror):
+        """Fetch into or create the mirror of url; returns an error message or None"""
+        if os.path.isdir(mirror):
+            code, error = await MirrorCache._git('--git-dir', mirror, 'fetch', '--quiet', '--depth', '1', url, 'HEAD')
+            if code == 0:
+                code, error = await MirrorCache._git('--git-dir', mirror, 'update-ref', 'HEAD', 'FETCH_HEAD')
+            if code == 0:
+                self.fetched += 1
+                logger.info(f"Fetched {url} into mirror {mirror}")
+                return None
+            logger.warning(f"Fetching {url} into mirror {mirror} failed, cloning again: {error}")
+            await asyncio.to_thread(shutil.rmtree, mirror, True)
+
+        code, error = await MirrorCache._git('clone', '--quiet', '--bare', '--depth', '1', url, mirror)
+        if code != 0:
+            await asyncio.to_thread(shutil.rmtree, mirror, True)
+            return error
+        self.cloned += 1
+        logger.info(f"Cloned {url} into mirror {mirror}")
+        return None
+
+    @staticmethod
+    async def _copy(mirror, dest, bare):
+        """
+        Make a working copy of a mirror; returns an error message or None
+
+        `git clone` of a local path hardlinks objects, but not from a
+        shallow repository, so the mirror's files are hardlinked here. Git
+        replaces refs, config and the shallow file through a rename and
+        never rewrites objects, so changes to either copy don't reach the
+        other. Where hardlinks are not possible (another file system) the
+        files are copied.
+        """
+        git_dir = dest if bare else os.path.join(dest, '.git')
+        try:
+            await asyncio.to_thread(shutil.copytree, mirror, git_dir, copy_function=MirrorCache._link)
+        except (OSError, shutil.Error) as e:
+            return str(e)
+        if bare:
+            return None
+
+        code, error = await MirrorCache._git('--git-dir', git_dir, 'config', 'core.bare', 'false')
+        if code == 0:
+            code, error = await MirrorCache._git('--git-dir', git_dir, '--work-tree', dest, 'reset', '--hard', '--quiet')
+        return error if code != 0 else None
+
+    @staticmethod
+    def _link(src, dst):
+        """Hardlink src to dst, copying it if that is not possible"""
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
+
+    def _touch(self, url, mirror):
+        """Record the size and last use of a mirror"""
+        size = 0
+        for root, _dirs, files in os.walk(mirror):
+            for file in files:
+                try:
+                    size += os.lstat(os.path.join(root, file)).st_size
+                except OSError:
+                    continue
+        self._conn.execute(
+            "INSERT OR REPLACE INTO mirrors (url, path, size, last_used) VALUES (?, ?, ?, ?)",
+            (url, mirror, size, time.time())
+        )
+        self._conn.commit()
+
+    def evict(self):
+        """
+        Remove least recently used mirrors until the cache fits in max_size_mb
+
+        Mirrors in use by a pending checkout() of this cache, or locked by
+        another cache using cache_dir, are kept.
+
+        Returns:
+            Number of mirrors removed
+        """
+        rows = self._conn.execute("SELECT url, path, size FROM mirrors ORDER BY last_used").fetchall()
+        total = sum(row[2] for row in rows)
+        removed = 0
+        for url, path, size in rows:
+            if total <= self.max_bytes:
+                break
+            if url in self._active:
+                continue
+            lock_file = self._lock_mirror(url, blocking=False)
+            if lock_file is None:
+                continue
+            try:
+                shutil.rmtree(path, ignore_errors=True)
+                self._conn.execute("DELETE FROM mirrors WHERE url = ?", (url,))
+            finally:
+                lock_file.close()
+            total -= size
+            removed += 1
+            logger.info(f"Evicted mirror of {url} ({size} bytes)")
+
+        if removed:
+            self._conn.commit()
+            self.evicted += removed
+        return removed
+
+    def stats(self):
+        """
+        Report cache usage
+
+        Returns:
+            Dictionary with the fetch/clone/eviction counters of this run, the
+            number of mirrors and their total size in MB
+        """
+        entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM mirrors").fetchone()
+        return {'fetched': self.fetched, 'cloned': self.cloned, 'evicted': self.evicted,
+                'entries': entries, 'size_mb': round(size / (1024 * 1024), 1)}
+
+    def close(self):
+        """Close the index database"""
+        self._conn.close()
+
+    @staticmethod
+    async def _git(*args):
+        """Run a git command; returns (exit code, stderr text)"""
+        process = await asyncio.create_subprocess_exec(
+            'git', *args,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        _stdout, stderr = await process.communicate()
+        return process.returncode, stderr.decode('utf-8', errors='ignore').strip()
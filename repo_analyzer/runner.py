@@ -1,6 +1,7 @@
 """
 Repository analysis runner
 """
+import asyncio
 import os
 import shutil
 from .excel_handler import ExcelHandler
@@ -10,26 +11,42 @@ class AnalysisRunner:
     """Run complete repository analysis pipeline"""
 
     @staticmethod
-    async def run_analysis(analyzer, cleanup=True):
+    async def run_analysis(analyzer, cleanup=True, repos_data=None, write_output=True):
         """
         Run the complete analysis pipeline
 
+        Line counting runs on a worker thread so that other coroutines, such
+        as a concurrent pipeline branch, keep running meanwhile.
+
         Args:
             analyzer: RepoAnalyzer instance
             cleanup: Whether to remove cloned repositories after analysis
+            repos_data: Repository data handed over in memory, see
+                ExcelHandler.from_email_records(); read from the input file
+                if None
+            write_output: Whether to export the results to the output file
 
         Returns:
             List of analyzed repository data
         """
-        repos_data = analyzer.read_excel_data()
-        repos_data = await analyzer.clone_all_repos(repos_data)
-        repos_data = analyzer.analyze_all_repos(repos_data)
-
-        ExcelHandler.export_results(
-            repos_data,
-            analyzer.output_file,
-            analyzer.small_file_threshold
-        )
+        if repos_data is None:
+            repos_data = analyzer.read_excel_data()
+
+        finished, outstanding = analyzer.split_journaled(repos_data)
+        outstanding = await analyzer.clone_all_repos(outstanding)
+        outstanding = await asyncio.to_thread(analyzer.analyze_all_repos, outstanding)
+        if finished:
+            repos_data = [finished.get(repo['id'], repo) for repo in repos_data]
+        else:
+            repos_data = outstanding
+
+        if write_output:
+            ExcelHandler.export_results(
+                repos_data,
+                analyzer.output_file,
+                analyzer.small_file_threshold,
+                analyzer.output_mode
+            )
 
         if cleanup and os.path.exists(analyzer.temp_dir):
             shutil.rmtree(analyzer.temp_dir)
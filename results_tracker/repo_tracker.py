@@ -28,11 +28,14 @@ class RepoTracker:
 
         analyzed = [r for r in repos_data if r['status'] == 'analyzed']
         failed = [r for r in repos_data if r['status'] == 'clone_failed']
+        analysis_failed = [r for r in repos_data if r['status'] == 'analysis_failed']
         no_url = [r for r in repos_data if r['status'] == 'no_url']
 
         f.write(f"- **Total Repositories:** {len(repos_data)}\n")
         f.write(f"- **Successfully Analyzed:** {len(analyzed)}\n")
         f.write(f"- **Clone Failed:** {len(failed)}\n")
+        if analysis_failed:
+            f.write(f"- **Analysis Failed:** {len(analysis_failed)}\n")
         f.write(f"- **No URL:** {len(no_url)}\n\n")
 
         if analyzed:
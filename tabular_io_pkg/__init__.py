@@ -0,0 +1,75 @@
+"""
+Tabular I/O Package - streaming readers and writers shared by all stages
+
+The format of a file is chosen by its extension: .xlsx (styled workbook,
+the default for files people open), .csv, .jsonl, or .parquet (requires
+pyarrow). Machine-to-machine handoffs between stages avoid the cost of
+building workbooks by using one of the columnar formats.
+"""
+from .base import TableReader, TableWriter
+from .delimited import CsvReader, CsvWriter, JsonlReader, JsonlWriter
+from .formats import FORMATS, format_of, new_reader, new_writer
+from .parquet import ParquetReader, ParquetWriter
+from .upsert import (LOG_FORMATS, LatestRowsReader, LogUpsertWriter, RewriteUpsertWriter,
+                     discard_index, open_log_reader, open_upsert_writer)
+from .xlsx import XlsxReader, XlsxWriter
+
+OUTPUT_MODES = ('overwrite', 'upsert')
+
+
+def open_reader(input_file):
+    """
+    Open a streaming reader for a tabular file
+
+    Args:
+        input_file: Path to the input file; the extension selects the format
+
+    Returns:
+        Reader with headers, index(), find(), iter_rows() and close()
+    """
+    if format_of(input_file) in LOG_FORMATS:
+        return open_log_reader(input_file)
+    return new_reader(input_file)
+
+
+def open_writer(output_file, headers, sheet_title='Sheet', column_widths=None, wrap_columns=(),
+                mode='overwrite', key='ID'):
+    """
+    Open a streaming writer for a tabular file
+
+    Sheet title, column widths and wrapping only apply to .xlsx files.
+
+    Args:
+        output_file: Path to the output file; the extension selects the format
+        headers: List of column headers
+        sheet_title: Worksheet title
+        column_widths: List of column widths, in header order
+        wrap_columns: Zero-based indexes of columns whose cells wrap text
+        mode: 'overwrite' replaces the file; 'upsert' adds new rows and
+            updates changed ones, matched on the key column (see upsert)
+        key: Header of the column identifying a row in 'upsert' mode
+
+    Returns:
+        Writer with append(), count and close(); upsert writers also count
+        added, updated and unchanged rows
+    """
+    if mode not in OUTPUT_MODES:
+        raise ValueError(f"Unknown output mode '{mode}', expected one of {OUTPUT_MODES}")
+
+    if mode == 'upsert':
+        return open_upsert_writer(output_file, headers, key, sheet_title=sheet_title,
+                                  column_widths=column_widths, wrap_columns=wrap_columns)
+
+    discard_index(output_file)
+    return new_writer(output_file, headers, sheet_title, column_widths, wrap_columns)
+
+
+__all__ = [
+    'TableReader', 'TableWriter',
+    'XlsxReader', 'XlsxWriter',
+    'CsvReader', 'CsvWriter',
+    'JsonlReader', 'JsonlWriter',
+    'ParquetReader', 'ParquetWriter',
+    'LatestRowsReader', 'LogUpsertWriter', 'RewriteUpsertWriter',
+    'FORMATS', 'OUTPUT_MODES', 'format_of', 'open_reader', 'open_writer'
+]
@@ -0,0 +1,92 @@
+"""
+Common interface of the streaming table readers and writers
+"""
+
+
+class TableReader:
+    """Read a table row by row; subclasses set headers and implement iter_rows()"""
+
+    headers = []
+
+    def index(self, name):
+        """
+        Position of a column by exact header name
+
+        Args:
+            name: Header text
+
+        Returns:
+            Zero-based column index
+
+        Raises:
+            ValueError: If no header has this name
+        """
+        return self.headers.index(name)
+
+    def find(self, predicate):
+        """
+        Position of the first column whose header satisfies a predicate
+
+        Args:
+            predicate: Callable taking the header value
+
+        Returns:
+            Zero-based column index, or None if no header matches
+        """
+        return next((i for i, header in enumerate(self.headers) if predicate(header)), None)
+
+    def iter_rows(self):
+        """
+        Iterate over the data rows below the header
+
+        Yields:
+            Tuples of cell values, as wide as headers; empty cells are None
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Release the underlying file"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class TableWriter:
+    """Write a table row by row; subclasses implement append(), close() and abort()"""
+
+    def __init__(self, output_file, headers):
+        """
+        Args:
+            output_file: Path of the output file
+            headers: List of column headers
+        """
+        self.output_file = output_file
+        self.headers = list(headers)
+        self.count = 0
+
+    def append(self, values):
+        """
+        Write one data row
+
+        Args:
+            values: Sequence of cell values in header order
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Finish writing the file"""
+
+    def abort(self):
+        """Release the file after a failed write, leaving no partial output"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
@@ -0,0 +1,180 @@
+"""
+Streaming CSV and JSON Lines readers and writers
+"""
+import csv
+import json
+import os
+from .base import TableReader, TableWriter
+
+
+def _discard_rows(path, append_from):
+    """
+    Undo an aborted write: remove a new file, or cut an appended one back
+
+    Args:
+        path: Path of the written file
+        append_from: Size of the file before rows were appended to it, or
+            None if the writer created it
+    """
+    if append_from is None:
+        os.remove(path)
+    else:
+        os.truncate(path, append_from)
+
+
+class CsvReader(TableReader):
+    """Read a CSV file with a header row"""
+
+    def __init__(self, input_file):
+        """
+        Open the file and read its header row
+
+        Args:
+            input_file: Path to the .csv file
+        """
+        self.input_file = input_file
+        self._file = open(input_file, newline='', encoding='utf-8')
+        self._reader = csv.reader(self._file)
+        self.headers = next(self._reader, [])
+
+    def iter_rows(self):
+        """
+        Iterate over the data rows below the header
+
+        CSV has no types: values are strings, and empty fields become None
+        like empty cells of a workbook.
+
+        Yields:
+            Tuples of cell values
+        """
+        width = len(self.headers)
+        for row in self._reader:
+            if len(row) < width:
+                row = row + [''] * (width - len(row))
+            yield tuple(value if value != '' else None for value in row)
+
+    def close(self):
+        """Release the file"""
+        self._file.close()
+
+
+class CsvWriter(TableWriter):
+    """Write a CSV file with a header row"""
+
+    def __init__(self, output_file, headers, append=False):
+        """
+        Create the file and write the header row
+
+        Args:
+            output_file: Path of the .csv file
+            headers: List of column headers
+            append: Add rows to the end of an existing file with the same
+                headers instead of replacing it
+        """
+        super().__init__(output_file, headers)
+        self._append_from = os.path.getsize(output_file) if append and os.path.exists(output_file) else None
+        self._file = open(output_file, 'a' if append else 'w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        if not append:
+            self._writer.writerow(self.headers)
+
+    def append(self, values):
+        """
+        Write one data row
+
+        Args:
+            values: Sequence of cell values in header order
+        """
+        self._writer.writerow(values)
+        self.count += 1
+
+    def close(self):
+        """Flush and close the file"""
+        self._file.close()
+
+    def abort(self):
+        """Close the file and remove it, or drop the rows appended to it"""
+        self._file.close()
+        _discard_rows(self.output_file, self._append_from)
+
+
+class JsonlReader(TableReader):
+    """Read a JSON Lines file of one object per row"""
+
+    def __init__(self, input_file):
+        """
+        Open the file and take the headers from the keys of the first record
+
+        Args:
+            input_file: Path to the .jsonl file
+        """
+        self.input_file = input_file
+        self._file = open(input_file, encoding='utf-8')
+        self._first = self._next_record()
+        self.headers = list(self._first) if self._first is not None else []
+
+    def _next_record(self):
+        """Return the next non-blank line as a dictionary, or None at the end"""
+        for line in self._file:
+            if line.strip():
+                return json.loads(line)
+        return None
+
+    def iter_rows(self):
+        """
+        Iterate over the records
+
+        Keys missing from a record read as None; keys not in the first
+        record are ignored.
+
+        Yields:
+            Tuples of values in header order
+        """
+        record = self._first
+        self._first = None
+        while record is not None:
+            yield tuple(record.get(header) for header in self.headers)
+            record = self._next_record()
+
+    def close(self):
+        """Release the file"""
+        self._file.close()
+
+
+class JsonlWriter(TableWriter):
+    """Write a JSON Lines file of one object per row"""
+
+    def __init__(self, output_file, headers, append=False):
+        """
+        Create the file
+
+        Args:
+            output_file: Path of the .jsonl file
+            headers: List of column headers, used as the keys of every record
+            append: Add records to the end of an existing file instead of
+                replacing it
+        """
+        super().__init__(output_file, headers)
+        self._append_from = os.path.getsize(output_file) if append and os.path.exists(output_file) else None
+        self._file = open(output_file, 'a' if append else 'w', encoding='utf-8')
+
+    def append(self, values):
+        """
+        Write one data row
+
+        Args:
+            values: Sequence of cell values in header order
+        """
+        record = dict(zip(self.headers, values))
+        self._file.write(json.dumps(record, ensure_ascii=False, default=str))
+        self._file.write('\n')
+        self.count += 1
+
+    def close(self):
+        """Flush and close the file"""
+        self._file.close()
+
+    def abort(self):
+        """Close the file and remove it, or drop the rows appended to it"""
+        self._file.close()
+        _discard_rows(self.output_file, self._append_from)
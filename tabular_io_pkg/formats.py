@@ -0,0 +1,49 @@
+"""
+File formats by extension
+"""
+import os
+from .delimited import CsvReader, CsvWriter, JsonlReader, JsonlWriter
+from .parquet import ParquetReader, ParquetWriter
+from .xlsx import XlsxReader, XlsxWriter
+
+FORMATS = {
+    '.xlsx': (XlsxReader, XlsxWriter),
+    '.csv': (CsvReader, CsvWriter),
+    '.jsonl': (JsonlReader, JsonlWriter),
+    '.parquet': (ParquetReader, ParquetWriter),
+}
+
+
+def format_of(path):
+    """
+    Determine the tabular format of a file from its extension
+
+    Args:
+        path: File path
+
+    Returns:
+        Lower-case extension, a key of FORMATS
+
+    Raises:
+        ValueError: If the extension is not a supported format
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMATS:
+        supported = ', '.join(FORMATS)
+        raise ValueError(f"Unsupported file type '{extension or path}', expected one of {supported}")
+    return extension
+
+
+def new_reader(input_file):
+    """Open the reader class of a file's format"""
+    reader_class, _ = FORMATS[format_of(input_file)]
+    return reader_class(input_file)
+
+
+def new_writer(output_file, headers, sheet_title='Sheet', column_widths=None, wrap_columns=()):
+    """Create the writer class of a file's format; layout options only apply to .xlsx"""
+    extension = format_of(output_file)
+    if extension == '.xlsx':
+        return XlsxWriter(output_file, headers, sheet_title, column_widths, wrap_columns)
+    _, writer_class = FORMATS[extension]
+    return writer_class(output_file, headers)
@@ -0,0 +1,105 @@
+"""
+Streaming Parquet reader and writer, available when pyarrow is installed
+"""
+import os
+from .base import TableReader, TableWriter
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Rows buffered per row group
+ROW_GROUP_SIZE = 10000
+
+
+def _require_pyarrow(path):
+    """Raise a clear error when a Parquet file is used without pyarrow"""
+    if pq is None:
+        raise ImportError(f"Reading or writing '{path}' requires pyarrow: pip install pyarrow")
+
+
+class ParquetReader(TableReader):
+    """Read a Parquet file one row group at a time"""
+
+    def __init__(self, input_file):
+        """
+        Open the file and read its schema
+
+        Args:
+            input_file: Path to the .parquet file
+        """
+        _require_pyarrow(input_file)
+        self.input_file = input_file
+        self._file = pq.ParquetFile(input_file)
+        self.headers = list(self._file.schema_arrow.names)
+
+    def iter_rows(self):
+        """
+        Iterate over the rows
+
+        Yields:
+            Tuples of cell values
+        """
+        for batch in self._file.iter_batches(batch_size=ROW_GROUP_SIZE):
+            columns = [column.to_pylist() for column in batch.columns]
+            yield from zip(*columns)
+
+    def close(self):
+        """Release the file"""
+        self._file.close()
+
+
+class ParquetWriter(TableWriter):
+    """Write a Parquet file, buffering rows into row groups"""
+
+    def __init__(self, output_file, headers):
+        """
+        Create the file
+
+        Columns are stored as strings: stages mix numbers with markers such
+        as 'N/A' in one column, which a typed column cannot hold.
+
+        Args:
+            output_file: Path of the .parquet file
+            headers: List of column headers
+        """
+        _require_pyarrow(output_file)
+        super().__init__(output_file, headers)
+        self._schema = pa.schema([(str(header), pa.string()) for header in self.headers])
+        self._writer = pq.ParquetWriter(output_file, self._schema)
+        self._rows = []
+
+    def append(self, values):
+        """
+        Write one data row
+
+        Args:
+            values: Sequence of cell values in header order
+        """
+        self._rows.append([None if value is None else str(value) for value in values])
+        self.count += 1
+        if len(self._rows) >= ROW_GROUP_SIZE:
+            self._flush()
+
+    def _flush(self):
+        """Write the buffered rows as one row group"""
+        columns = [list(column) for column in zip(*self._rows)] if self._rows else []
+        self._writer.write_table(pa.Table.from_arrays(columns, schema=self._schema))
+        self._rows = []
+
+    def close(self):
+        """Write the remaining rows and the file footer"""
+        if self._rows:
+            self._flush()
+        self._writer.close()
+
+    def abort(self):
+        """Close the file without the buffered rows and remove it"""
+        self._rows = []
+        try:
+            self._writer.close()
+        finally:
+            os.remove(self.output_file)
@@ -0,0 +1,402 @@
+"""
+Upsert writers: update a table keyed on one column instead of replacing it
+
+CSV and JSON Lines files are append-only logs. New and changed rows are
+appended, and a SQLite sidecar index (<file>.index.db) records the digest
+and position of the latest row of every key, so an upsert costs time in
+proportion to the rows written, not to the size of the file. Readers skip
+the superseded rows, see LatestRowsReader.
+
+Workbooks and Parquet files cannot be appended to in place, so they are
+rewritten: existing rows are streamed into a new file with the updates
+merged in, which costs time in proportion to the whole file.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+from .base import TableReader, TableWriter
+from .formats import FORMATS, format_of, new_reader, new_writer
+
+INDEX_SUFFIX = '.index.db'
+
+# Formats updated by appending to the file
+LOG_FORMATS = ('.csv', '.jsonl')
+
+# Compact a log once it holds more superseded rows than this and than live rows
+COMPACT_MIN_SUPERSEDED = 1000
+
+
+def index_path(path):
+    """Path of the sidecar index of a log file"""
+    return path + INDEX_SUFFIX
+
+
+def discard_index(path):
+    """Remove the sidecar index of a file that is being replaced"""
+    if os.path.exists(index_path(path)):
+        os.remove(index_path(path))
+
+
+def row_digest(values):
+    """
+    Digest of a row that ignores how a format stores types
+
+    CSV reads every value back as a string and empty cells as None, so
+    values are compared by their text.
+
+    Args:
+        values: Sequence of cell values
+
+    Returns:
+        Hex digest string
+    """
+    normalized = ['' if value is None else str(value) for value in values]
+    return hashlib.sha1(json.dumps(normalized, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def _temporary_path(path):
+    """Sibling path with the same extension, written before replacing path"""
+    root, extension = os.path.splitext(path)
+    return f"{root}.tmp{extension}"
+
+
+class LogIndex:
+    """SQLite sidecar index of an append-only log file"""
+
+    def __init__(self, path):
+        """
+        Open or create the index of a log file
+
+        Args:
+            path: Path of the log file
+        """
+        self.path = path
+        self.db = sqlite3.connect(index_path(path))
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS rows '
+            '(key TEXT PRIMARY KEY, seq INTEGER NOT NULL, digest TEXT NOT NULL)'
+        )
+        self.db.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)')
+
+    def meta(self, name):
+        """Value of a meta entry, or None"""
+        row = self.db.execute('SELECT value FROM meta WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, **values):
+        """Store meta entries"""
+        self.db.executemany(
+            'INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)',
+            [(name, str(value)) for name, value in values.items()]
+        )
+
+    def matches(self, headers):
+        """
+        Check that the index describes the log file as it is on disk
+
+        A log rewritten or edited without the index has a different size
+        and is re-indexed.
+
+        Args:
+            headers: Headers the log must have
+
+        Returns:
+            True if the index can be used as is
+        """
+        return (
+            os.path.exists(self.path)
+            and self.meta('size') == str(os.path.getsize(self.path))
+            and self.meta('headers') == json.dumps(list(headers))
+        )
+
+    @property
+    def rows(self):
+        """Number of rows in the log, superseded ones included"""
+        return int(self.meta('rows') or 0)
+
+    @property
+    def live(self):
+        """Number of keys, i.e. rows a reader returns"""
+        return self.db.execute('SELECT COUNT(*) FROM rows').fetchone()[0]
+
+    def live_positions(self):
+        """Set of the positions of the latest row of every key"""
+        return {seq for (seq,) in self.db.execute('SELECT seq FROM rows')}
+
+    def lookup(self, key):
+        """Digest of the latest row of a key, or None"""
+        row = self.db.execute('SELECT digest FROM rows WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def record(self, key, seq, digest):
+        """Point a key at a newly appended row"""
+        self.db.execute('INSERT OR REPLACE INTO rows (key, seq, digest) VALUES (?, ?, ?)', (key, seq, digest))
+
+    def rebuild(self, key_column):
+        """
+        Re-index the log by reading it once
+
+        Args:
+            key_column: Header of the key column
+        """
+        self.db.execute('DELETE FROM rows')
+        seq = 0
+        headers = []
+        if os.path.exists(self.path):
+            with new_reader(self.path) as reader:
+                headers = reader.headers
+                key_position = reader.index(key_column)
+                for seq, row in enumerate(reader.iter_rows(), start=1):
+                    self.record(str(row[key_position]), seq - 1, row_digest(row))
+        self.save(rows=seq, headers=headers)
+
+    def save(self, rows, headers):
+        """Record the log's row count, headers and size, and commit"""
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else -1
+        self.set_meta(rows=rows, headers=json.dumps(list(headers)), size=size)
+        self.db.commit()
+
+    def close(self):
+        """Close the database"""
+        self.db.close()
+
+
+class LatestRowsReader(TableReader):
+    """Read an upserted log file, returning only the latest row of every key"""
+
+    def __init__(self, reader, live_positions):
+        """
+        Args:
+            reader: Reader of the log file
+            live_positions: Set of the data-row positions to return
+        """
+        self._reader = reader
+        self._live = live_positions
+        self.headers = reader.headers
+
+    def iter_rows(self):
+        """
+        Iterate over the latest rows, in the order they were last written
+
+        Yields:
+            Tuples of cell values
+        """
+        for position, row in enumerate(self._reader.iter_rows()):
+            if position in self._live:
+                yield row
+
+    def close(self):
+        """Release the log file"""
+        self._reader.close()
+
+
+def open_log_reader(input_file):
+    """
+    Open a reader that hides the superseded rows of an upserted log
+
+    Args:
+        input_file: Path of a .csv or .jsonl file
+
+    Returns:
+        LatestRowsReader, or a plain reader if the file has no superseded
+        rows or no up-to-date index
+    """
+    reader = new_reader(input_file)
+    if not os.path.exists(index_path(input_file)):
+        return reader
+
+    index = LogIndex(input_file)
+    try:
+        if index.matches(reader.headers) and index.live < index.rows:
+            return LatestRowsReader(reader, index.live_positions())
+        return reader
+    finally:
+        index.close()
+
+
+class UpsertWriter(TableWriter):
+    """Common counters of the upsert writers"""
+
+    def __init__(self, output_file, headers, key):
+        """
+        Args:
+            output_file: Path of the output file
+            headers: List of column headers
+            key: Header of the column identifying a row
+        """
+        super().__init__(output_file, headers)
+        self.key = key
+        self._key_position = self.headers.index(key)
+        self.added = 0
+        self.updated = 0
+        self.unchanged = 0
+
+
+class LogUpsertWriter(UpsertWriter):
+    """Upsert rows into a CSV or JSON Lines file by appending"""
+
+    def __init__(self, output_file, headers, key='ID'):
+        """
+        Open the log and its index, re-indexing it if the index is stale
+
+        Args:
+            output_file: Path of the .csv or .jsonl file
+            headers: List of column headers; an existing file must have the same
+            key: Header of the column identifying a row
+        """
+        super().__init__(output_file, headers, key)
+        self._index = LogIndex(output_file)
+        if not self._index.matches(self.headers):
+            self._index.rebuild(key)
+        self._seq = self._index.rows
+
+        _, writer_class = FORMATS[format_of(output_file)]
+        self._writer = writer_class(output_file, self.headers, append=os.path.exists(output_file))
+
+    def append(self, values):
+        """
+        Add a row, replace the row with the same key, or skip it if unchanged
+
+        Args:
+            values: Sequence of cell values in header order
+        """
+        self.count += 1
+        key = str(values[self._key_position])
+        digest = row_digest(values)
+        previous = self._index.lookup(key)
+
+        if previous == digest:
+            self.unchanged += 1
+            return
+
+        self._writer.append(values)
+        self._index.record(key, self._seq, digest)
+        self._seq += 1
+        if previous is None:
+            self.added += 1
+        else:
+            self.updated += 1
+
+    def close(self):
+        """Flush the log, commit the index and compact a log of mostly old rows"""
+        self._writer.close()
+        self._index.save(rows=self._seq, headers=self.headers)
+
+        superseded = self._seq - self._index.live
+        if superseded > max(COMPACT_MIN_SUPERSEDED, self._index.live):
+            self._compact()
+        self._index.close()
+
+    def abort(self):
+        """Drop the rows appended to the log and leave the index uncommitted"""
+        self._writer.abort()
+        self._index.close()
+
+    def _compact(self):
+        """Rewrite the log without superseded rows and re-index it"""
+        temporary = _temporary_path(self.output_file)
+        with open_log_reader(self.output_file) as reader:
+            with new_writer(temporary, self.headers) as writer:
+                for row in reader.iter_rows():
+                    writer.append(row)
+        os.replace(temporary, self.output_file)
+        self._index.rebuild(self.key)
+
+
+class RewriteUpsertWriter(UpsertWriter):
+    """Upsert rows into a workbook or Parquet file by rewriting it"""
+
+    def __init__(self, output_file, headers, key='ID', **layout):
+        """
+        Collect upserted rows; the file is rewritten by close()
+
+        Args:
+            output_file: Path of the output file
+            headers: List of column headers. Columns of an existing file that
+                are not in headers are dropped, missing ones are left empty
+            key: Header of the column identifying a row
+            **layout: sheet_title, column_widths and wrap_columns for .xlsx
+        """
+        super().__init__(output_file, headers, key)
+        self._layout = layout
+        self._pending = {}
+
+    def append(self, values):
+        """
+        Queue a row for the rewrite
+
+        Args:
+            values: Sequence of cell values in header order
+        """
+        self.count += 1
+        self._pending[str(values[self._key_position])] = list(values)
+
+    def close(self):
+        """Stream the existing rows into a new file with the updates merged in"""
+        temporary = _temporary_path(self.output_file)
+        with new_writer(temporary, self.headers, **self._layout) as writer:
+            if os.path.exists(self.output_file):
+                if format_of(self.output_file) in LOG_FORMATS:
+                    reader = open_log_reader(self.output_file)
+                else:
+                    reader = new_reader(self.output_file)
+                with reader:
+                    self._merge(reader, writer)
+            for values in self._pending.values():
+                writer.append(values)
+                self.added += 1
+        self._pending = {}
+        os.replace(temporary, self.output_file)
+        discard_index(self.output_file)
+
+    def abort(self):
+        """Drop the queued rows; output_file is only rewritten by close()"""
+        self._pending = {}
+
+    def _merge(self, reader, writer):
+        """Copy the existing rows, replacing those with a queued update"""
+        positions = [reader.headers.index(h) if h in reader.headers else None for h in self.headers]
+        key_position = reader.find(lambda header: header == self.key)
+
+        for row in reader.iter_rows():
+            values = [row[p] if p is not None else None for p in positions]
+            update = None
+            if key_position is not None:
+                update = self._pending.pop(str(row[key_position]), None)
+
+            if update is None:
+                writer.append(values)
+            elif row_digest(update) == row_digest(values):
+                self.unchanged += 1
+                writer.append(values)
+            else:
+                self.updated += 1
+                writer.append(update)
+
+
+def open_upsert_writer(output_file, headers, key='ID', **layout):
+    """
+    Open the upsert writer suited to a file's format
+
+    Logs whose headers changed (e.g. a new small-file threshold) cannot be
+    appended to, so they are rewritten once.
+
+    Args:
+        output_file: Path to the output file
+        headers: List of column headers
+        key: Header of the column identifying a row
+        **layout: sheet_title, column_widths and wrap_columns for .xlsx
+
+    Returns:
+        LogUpsertWriter or RewriteUpsertWriter
+    """
+    if format_of(output_file) in LOG_FORMATS:
+        existing = None
+        if os.path.exists(output_file):
+            with new_reader(output_file) as reader:
+                existing = reader.headers
+        if existing is None or existing == list(headers):
+            return LogUpsertWriter(output_file, headers, key)
+
+    return RewriteUpsertWriter(output_file, headers, key, **layout)
@@ -0,0 +1,110 @@
+"""
+Streaming Excel readers and writers
+"""
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment, PatternFill
+from openpyxl.utils import get_column_letter
+from .base import TableReader, TableWriter
+
+HEADER_FILL = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
+HEADER_FONT = Font(bold=True, color='FFFFFF')
+HEADER_ALIGNMENT = Alignment(horizontal='center', vertical='center')
+WRAP_ALIGNMENT = Alignment(wrap_text=True, vertical='top')
+
+
+class XlsxReader(TableReader):
+    """Read the active sheet of a workbook row by row in read-only mode"""
+
+    def __init__(self, input_file):
+        """
+        Open the workbook and read its header row
+
+        Args:
+            input_file: Path to the .xlsx file
+        """
+        self.input_file = input_file
+        self._wb = load_workbook(input_file, read_only=True)
+        self._ws = self._wb.active
+        # Do not trust the stored sheet dimensions, some writers get them wrong
+        self._ws.reset_dimensions()
+        first = next(self._ws.iter_rows(min_row=1, max_row=1, values_only=True), ())
+        self.headers = list(first)
+
+    def iter_rows(self):
+        """
+        Iterate over the data rows below the header
+
+        Read-only sheets drop trailing empty cells, so rows are padded to the
+        header width and can always be indexed by header position.
+
+        Yields:
+            Tuples of cell values
+        """
+        width = len(self.headers)
+        for row in self._ws.iter_rows(min_row=2, values_only=True):
+            if len(row) < width:
+                row = row + (None,) * (width - len(row))
+            yield row
+
+    def close(self):
+        """Release the workbook file"""
+        self._wb.close()
+
+
+class XlsxWriter(TableWriter):
+    """Write a single styled sheet row by row in write-only mode"""
+
+    def __init__(self, output_file, headers, sheet_title='Sheet', column_widths=None, wrap_columns=()):
+        """
+        Start the workbook and write the styled header row
+
+        Args:
+            output_file: Path of the .xlsx file written by close()
+            headers: List of column headers
+            sheet_title: Worksheet title
+            column_widths: List of column widths, in header order
+            wrap_columns: Zero-based indexes of columns whose data cells wrap text
+        """
+        super().__init__(output_file, headers)
+        self._wrap_columns = frozenset(wrap_columns)
+
+        self._wb = Workbook(write_only=True)
+        self._ws = self._wb.create_sheet(sheet_title)
+
+        for position, width in enumerate(column_widths or [], start=1):
+            self._ws.column_dimensions[get_column_letter(position)].width = width
+
+        header_row = []
+        for header in self.headers:
+            cell = WriteOnlyCell(self._ws, value=header)
+            cell.fill = HEADER_FILL
+            cell.font = HEADER_FONT
+            cell.alignment = HEADER_ALIGNMENT
+            header_row.append(cell)
+        self._ws.append(header_row)
+
+    def append(self, values):
+        """
+        Write one data row
+
+        Args:
+            values: Sequence of cell values in header order
+        """
+        if self._wrap_columns:
+            values = list(values)
+            for position in self._wrap_columns:
+                cell = WriteOnlyCell(self._ws, value=values[position])
+                cell.alignment = WRAP_ALIGNMENT
+                values[position] = cell
+        self._ws.append(values)
+        self.count += 1
+
+    def close(self):
+        """Save the workbook to output_file"""
+        self._wb.save(self.output_file)
+
+    def abort(self):
+        """Drop the workbook; output_file is only written by close()"""
+        self._wb = None
+        self._ws = None
@@ -0,0 +1,197 @@
+"""
+Round-trip tests of the upsert writers in tabular_io_pkg.upsert
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from tabular_io_pkg import open_reader, open_writer
+from tabular_io_pkg.formats import new_writer
+from tabular_io_pkg.parquet import pq
+from tabular_io_pkg.upsert import (COMPACT_MIN_SUPERSEDED, LogIndex, LogUpsertWriter, RewriteUpsertWriter,
+                                   index_path, open_upsert_writer)
+
+HEADERS = ['ID', 'Name', 'Status']
+
+
+def write(path, rows, mode='upsert', headers=HEADERS):
+    """Write rows through open_writer() and return the closed writer"""
+    writer = open_writer(path, headers, mode=mode)
+    for row in rows:
+        writer.append(row)
+    writer.close()
+    return writer
+
+
+def read(path):
+    """Read a file through open_reader(); returns (headers, list of row tuples)"""
+    with open_reader(path) as reader:
+        return reader.headers, list(reader.iter_rows())
+
+
+class UpsertRoundTrip:
+    """Tests shared by every format; subclasses set EXTENSION"""
+
+    EXTENSION = None
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='upsert_test_')
+        self.path = os.path.join(self.directory, 'table' + self.EXTENSION)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_add_to_new_file(self):
+        writer = write(self.path, [('1', 'a', 'new'), ('2', 'b', 'new')])
+
+        self.assertEqual((writer.added, writer.updated, writer.unchanged), (2, 0, 0))
+        self.assertEqual(read(self.path), (HEADERS, [('1', 'a', 'new'), ('2', 'b', 'new')]))
+
+    def test_add_update_and_unchanged(self):
+        write(self.path, [('1', 'a', 'new'), ('2', 'b', 'new')])
+        writer = write(self.path, [('2', 'b', 'done'), ('1', 'a', 'new'), ('3', 'c', 'new')])
+
+        self.assertEqual((writer.added, writer.updated, writer.unchanged), (1, 1, 1))
+        _, rows = read(self.path)
+        self.assertEqual(sorted(rows), [('1', 'a', 'new'), ('2', 'b', 'done'), ('3', 'c', 'new')])
+
+    def test_upsert_after_overwrite(self):
+        write(self.path, [('1', 'a', 'new'), ('2', 'b', 'new')])
+        write(self.path, [('5', 'e', 'new')], mode='overwrite')
+        writer = write(self.path, [('5', 'e', 'new'), ('1', 'a', 'done')])
+
+        self.assertEqual((writer.added, writer.updated, writer.unchanged), (1, 0, 1))
+        _, rows = read(self.path)
+        self.assertEqual(sorted(rows), [('1', 'a', 'done'), ('5', 'e', 'new')])
+
+    def test_changed_headers_rewrite_the_file(self):
+        write(self.path, [('1', 'a'), ('2', 'b')], headers=['ID', 'Name'])
+        writer = open_upsert_writer(self.path, HEADERS)
+        self.assertIsInstance(writer, RewriteUpsertWriter)
+        writer.append(('2', 'b', 'done'))
+        writer.close()
+
+        self.assertEqual((writer.added, writer.updated, writer.unchanged), (0, 1, 0))
+        self.assertEqual(read(self.path), (HEADERS, [('1', 'a', None), ('2', 'b', 'done')]))
+        self.assertFalse(os.path.exists(index_path(self.path)))
+
+    def test_failed_upsert_keeps_the_file(self):
+        write(self.path, [('1', 'a', 'new'), ('2', 'b', 'new')])
+        with self.assertRaises(RuntimeError):
+            with open_writer(self.path, HEADERS, mode='upsert') as writer:
+                writer.append(('1', 'a', 'done'))
+                writer.append(('3', 'c', 'new'))
+                raise RuntimeError('interrupted')
+
+        self.assertEqual(read(self.path), (HEADERS, [('1', 'a', 'new'), ('2', 'b', 'new')]))
+        writer = write(self.path, [('1', 'a', 'done')])
+        self.assertEqual((writer.added, writer.updated, writer.unchanged), (0, 1, 0))
+
+
+class LogUpsertRoundTrip(UpsertRoundTrip):
+    """Tests of the append-only log formats and their sidecar index"""
+
+    def test_log_writer_is_used(self):
+        write(self.path, [('1', 'a', 'new')])
+        writer = open_upsert_writer(self.path, HEADERS)
+        writer.close()
+
+        self.assertIsInstance(writer, LogUpsertWriter)
+
+    def test_failed_write_removes_the_new_file(self):
+        with self.assertRaises(RuntimeError):
+            with open_writer(self.path, HEADERS, mode='overwrite') as writer:
+                writer.append(('1', 'a', 'new'))
+                raise RuntimeError('interrupted')
+
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_index_records_superseded_rows(self):
+        write(self.path, [('1', 'a', 'new'), ('2', 'b', 'new')])
+        write(self.path, [('1', 'a', 'done')])
+
+        index = LogIndex(self.path)
+        try:
+            self.assertTrue(index.matches(HEADERS))
+            self.assertEqual((index.rows, index.live), (3, 2))
+            self.assertEqual(index.live_positions(), {1, 2})
+        finally:
+            index.close()
+
+    def test_stale_index_after_external_edit(self):
+        write(self.path, [('1', 'a', 'new'), ('2', 'b', 'new')])
+        # Replace the log without going through the upsert writer
+        with new_writer(self.path, HEADERS) as writer:
+            writer.append(('2', 'b', 'edited'))
+            writer.append(('4', 'd', 'new'))
+
+        index = LogIndex(self.path)
+        try:
+            self.assertFalse(index.matches(HEADERS))
+        finally:
+            index.close()
+
+        writer = write(self.path, [('2', 'b', 'edited'), ('1', 'a', 'new')])
+        self.assertEqual((writer.added, writer.updated, writer.unchanged), (1, 0, 1))
+        _, rows = read(self.path)
+        self.assertEqual(sorted(rows), [('1', 'a', 'new'), ('2', 'b', 'edited'), ('4', 'd', 'new')])
+
+    def test_rebuild_keeps_the_latest_row_of_each_key(self):
+        write(self.path, [('1', 'a', 'new'), ('2', 'b', 'new')])
+        write(self.path, [('1', 'a', 'done')])
+        os.remove(index_path(self.path))
+
+        index = LogIndex(self.path)
+        try:
+            index.rebuild('ID')
+            self.assertEqual((index.rows, index.live), (3, 2))
+            self.assertEqual(index.live_positions(), {1, 2})
+        finally:
+            index.close()
+
+    def test_compaction_past_min_superseded(self):
+        keys = [str(key) for key in range(10)]
+        write(self.path, [(key, 'name', '0') for key in keys])
+        rounds = COMPACT_MIN_SUPERSEDED // len(keys) + 1
+        for version in range(1, rounds + 1):
+            write(self.path, [(key, 'name', str(version)) for key in keys])
+
+        index = LogIndex(self.path)
+        try:
+            self.assertEqual((index.rows, index.live), (len(keys), len(keys)))
+            self.assertTrue(index.matches(HEADERS))
+        finally:
+            index.close()
+        self.assertEqual(read(self.path), (HEADERS, [(key, 'name', str(rounds)) for key in keys]))
+
+    def test_no_compaction_below_min_superseded(self):
+        keys = [str(key) for key in range(10)]
+        for version in range(3):
+            write(self.path, [(key, 'name', str(version)) for key in keys])
+
+        index = LogIndex(self.path)
+        try:
+            self.assertEqual((index.rows, index.live), (30, 10))
+        finally:
+            index.close()
+
+
+class CsvUpsertTest(LogUpsertRoundTrip, unittest.TestCase):
+    EXTENSION = '.csv'
+
+
+class JsonlUpsertTest(LogUpsertRoundTrip, unittest.TestCase):
+    EXTENSION = '.jsonl'
+
+
+class XlsxUpsertTest(UpsertRoundTrip, unittest.TestCase):
+    EXTENSION = '.xlsx'
+
+
+@unittest.skipIf(pq is None, 'pyarrow is not installed')
+class ParquetUpsertTest(UpsertRoundTrip, unittest.TestCase):
+    EXTENSION = '.parquet'
+
+
+if __name__ == '__main__':
+    unittest.main()